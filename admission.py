@@ -0,0 +1,208 @@
+import os
+import math
+import time
+import asyncio
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Iterable, Optional, Tuple
+
+import psutil
+
+from structured_log import get_logger
+
+# Weighted sessions the box may run (a persona's weight is its "cost" in its persona file)
+ADMISSION_MAX_LOAD = float(os.getenv("ADMISSION_MAX_LOAD", str((os.cpu_count() or 1) * 4)))
+# System-wide CPU and memory use (percent) above which nothing new is admitted
+ADMISSION_MAX_CPU = float(os.getenv("ADMISSION_MAX_CPU", "85"))
+ADMISSION_MAX_MEMORY = float(os.getenv("ADMISSION_MAX_MEMORY", "90"))
+# Joins that may wait for capacity, and for how long, before getting a 429
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "20"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+# How often CPU and memory are sampled (and queued joins re-checked)
+ADMISSION_SAMPLE_INTERVAL = 1.0
+
+
+log = get_logger()
+
+
+class AdmissionRejected(Exception):
+    """Raised when a join cannot be admitted; `retry_after` is in seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Decides whether the box can take another room before any agent is started.
+
+    Load is the sum of the persona weights of every supervised agent plus the
+    joins currently being admitted (an agent is counted once, by its join,
+    until that join is done). A join is let in when its weight fits
+    under ADMISSION_MAX_LOAD and CPU and memory are below their limits;
+    otherwise it waits in a bounded FIFO queue for up to
+    ADMISSION_QUEUE_TIMEOUT seconds. A full queue or an expired wait raises
+    AdmissionRejected, so the caller can answer 429 instead of overloading
+    every live room.
+    """
+
+    def __init__(
+        self,
+        supervisor,
+        weights: Dict[str, float],
+        max_load: float = ADMISSION_MAX_LOAD,
+        max_cpu: float = ADMISSION_MAX_CPU,
+        max_memory: float = ADMISSION_MAX_MEMORY,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+    ):
+        self.supervisor = supervisor
+        self.weights = weights
+        self.max_load = max_load
+        self.max_cpu = max_cpu
+        self.max_memory = max_memory
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.cpu_percent = 0.0
+        self.memory_percent = 0.0
+        self.admitted = 0
+        self.rejected = 0
+        self._reserved = 0.0
+        # Supervisor keys whose weight `_reserved` already holds
+        self._reserved_keys: Counter = Counter()
+        self._queue: Deque[tuple] = deque()
+        self._sampler_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        psutil.cpu_percent(interval=None)  # first call only sets the baseline
+        self._sampler_task = asyncio.create_task(self._sample_loop())
+
+    async def aclose(self):
+        if self._sampler_task:
+            self._sampler_task.cancel()
+        for _, future in self._queue:
+            if not future.done():
+                future.cancel()
+        self._queue.clear()
+
+    # -- Load --
+
+    def cost(self, agent_names) -> float:
+        return sum(self.weights.get(name, 1.0) for name in agent_names)
+
+    @property
+    def load(self) -> float:
+        running = sum(
+            self.weights.get(record.agent_name, 1.0)
+            for record in self.supervisor.all_agents()
+            if record.state != "failed" and not self._reserved_keys[record.key]
+        )
+        return running + self._reserved
+
+    def _fits(self, cost: float) -> bool:
+        return (
+            self.load + cost <= self.max_load
+            and self.cpu_percent < self.max_cpu
+            and self.memory_percent < self.max_memory
+        )
+
+    def status(self) -> dict:
+        return {
+            "load": round(self.load, 2),
+            "max_load": self.max_load,
+            "utilization": round(self.load / self.max_load, 3) if self.max_load else 1.0,
+            "cpu_percent": self.cpu_percent,
+            "memory_percent": self.memory_percent,
+            "queue_depth": len(self._queue),
+            "queue_size": self.queue_size,
+            "accepting": len(self._queue) < self.queue_size,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+    # -- Admission --
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.rejected += 1
+        log.warning("admission", f"Join rejected: {reason}")
+        return AdmissionRejected(reason, retry_after=max(1, math.ceil(self.queue_timeout)))
+
+    @asynccontextmanager
+    async def admit(self, cost: float, keys: Iterable[Tuple[str, str]] = ()):
+        """
+        Hold `cost` worth of capacity while the agents are being started; once
+        the supervisor tracks them they count through `load` instead. `keys`
+        are the (room, identity) of the agents `cost` is for: their supervisor
+        records are not counted while the reservation holds them.
+        """
+        keys = list(keys)
+        if not self._queue and self._fits(cost):
+            self._reserved += cost
+        else:
+            if len(self._queue) >= self.queue_size:
+                raise self._reject(f"admission queue full ({self.queue_size} waiting)")
+            future = asyncio.get_running_loop().create_future()
+            entry = (cost, future)
+            self._queue.append(entry)
+            started = time.monotonic()
+            log.info("admission", "Join queued for capacity", depth=len(self._queue))
+            try:
+                # Not wait_for: on 3.11 it swallows a cancellation that arrives
+                # just after the future resolved, admitting a caller that is gone
+                async with asyncio.timeout(self.queue_timeout):
+                    await asyncio.shield(future)
+            except TimeoutError:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                if not future.done() or future.cancelled():
+                    raise self._reject(f"no capacity within {self.queue_timeout:g}s")
+                # Admitted at the last moment: keep the reservation
+            except BaseException:
+                # The caller went away (client disconnect, a cancelled bulk
+                # provision): give back whatever it was given
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                if future.done() and not future.cancelled():
+                    self._reserved -= cost
+                    self._drain()
+                else:
+                    future.cancel()
+                raise
+            log.info("admission", f"Join admitted after {time.monotonic() - started:.1f}s in queue")
+
+        self.admitted += 1
+        self._reserved_keys.update(keys)
+        try:
+            yield
+        finally:
+            self._reserved -= cost
+            self._reserved_keys.subtract(keys)
+            self._reserved_keys += Counter()  # drop the zero counts
+            self._drain()
+
+    def _drain(self):
+        """Admit queued joins, oldest first, while they fit"""
+        while self._queue:
+            cost, future = self._queue[0]
+            if future.done():
+                self._queue.popleft()
+                continue
+            if not self._fits(cost):
+                return
+            self._queue.popleft()
+            self._reserved += cost
+            future.set_result(None)
+
+    def on_message(self, msg: dict):
+        """Dispatcher listener: finished sessions free capacity"""
+        if msg.get("event") in ("session_ended", "worker_exited"):
+            # Let the supervisor forget the agents before re-checking the load
+            asyncio.get_running_loop().call_soon(self._drain)
+
+    async def _sample_loop(self):
+        while True:
+            self.cpu_percent = psutil.cpu_percent(interval=None)
+            self.memory_percent = psutil.virtual_memory().percent
+            self._drain()
+            await asyncio.sleep(ADMISSION_SAMPLE_INTERVAL)
@@ -1,241 +1,765 @@
 import os
+import sys
+import json
+import time
 import asyncio
 import argparse
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import re
+from typing import Callable, Dict, List, Optional, Tuple
 
 from livekit import rtc
-from livekit.agents import Agent, AgentSession
-from livekit.plugins import silero, deepgram, groq, elevenlabs
+from livekit.agents import Agent, AgentSession, RoomInputOptions, StopResponse, stt
 import aiohttp
 
+from audio_preprocess import AUDIO_SAMPLE_RATE, PreprocessedAudioInput, denoise_options
+from idle_stt import STT_IDLE_AFTER, IdleSTT, stt_idle_stats
+from room_ingest import RoomIngest, RoomIngestRegistry, is_agent_participant
+from turn_arbiter import TurnArbiter, TurnArbiterRegistry
+from tts_cache import CachedTTS, TTSCache
+from latency_metrics import TurnTimer
+from speculation import SPECULATIVE_LLM, SPECULATIVE_LLM_THRESHOLD, Speculator, speculation_stats
+from session_recorder import SessionRecorder, open_recorder
+from startup_profile import STARTUP, StartupProfile
+from context_budget import CONTEXT_TOKEN_BUDGET, ContextBudget
+from persona_registry import Persona, PersonaRegistry
+from hedging import HEDGE, HEDGE_LLM_MODEL, HEDGE_TTS_MODEL, HEDGE_TTS_VOICE_ID, HedgedLLM, HedgedTTS, hedge_stats
+from provider_limits import GREETING, RateLimitedLLM, RateLimitedSTT, RateLimitedTTS, provider_priority
+from structured_log import get_logger
+
 load_dotenv()
 
 LIVEKIT_URL = os.getenv("LIVEKIT_URL")
 LIVEKIT_API_KEY = os.getenv("LIVEKIT_API_KEY")
 LIVEKIT_API_SECRET = os.getenv("LIVEKIT_API_SECRET")
 
-# Agent definitions with specific traits and behaviors
-AGENTS = {
-    "priya": {
-        "voice_id": "ZeK6O9RfGNGj0cJT2HoJ",
-        "prompt": """
-            You are Priya Sharma, Senior Manager of Growth Marketing. You hide sharp ambition behind charm and hate laziness. You never forget a slight.
-            
-            Your role:
-            - Lead with authority while maintaining approachable charm
-            - Set clear expectations and hold people accountable
-            - Deliver critical feedback constructively but firmly
-            - Guide users through complex marketing challenges
-            - Ensure understanding and buy-in for important projects
-            
-            Your communication style:
-            - Start warmly but quickly get to the point
-            - Use data and facts to support your arguments
-            - Ask clarifying questions to ensure understanding
-            - Provide specific, actionable guidance
-            - Follow up to ensure tasks are completed properly
-            
-            Current project context:
-            You're briefing the user on a critical competitive analysis report for Xbox Series S vs Nintendo Switch 2. The Series S has been underperforming and you need clear, data-backed insights.
-            
-            Key deliverables you need:
-            1. Google Analytics 4 analysis of Xbox Series S (last 6-8 weeks)
-            2. Traffic and funnel metrics visualization
-            3. Conversion funnel analysis on Series S landing page
-            4. Identification of drop-off points and user behavior shifts
-            
-            Your approach:
-            1. Welcome them warmly but establish the urgency
-            2. Explain the business context and why this matters
-            3. Break down the deliverables clearly
-            4. Ensure they understand the scope and expectations
-            5. Address any concerns or questions they have
-            6. Set clear next steps and timelines
-            
-            CRITICAL SPEAKING RULES:
-            - You are the meeting LEADER and should speak most of the time
-            - However, if the user mentions "Alex" or "Alex," in their speech, DO NOT RESPOND AT ALL
-            - Do not say "I am silent" or any similar phrases
-            - Simply do not generate any response when Alex is being addressed
-            - Wait for the conversation to move away from Alex before responding
-            
-            Remember: Be firm but fair, expect excellence, and make sure they understand the stakes.
-            
-            When the meeting objectives are complete, tell the user they can leave the meeting.
-            """,
-    },
-    "alex": {
-        "voice_id": "2H5al2tH0E8d3uBV7BnZ",
-        "prompt": """
-            You are Alex, Product Manager. You smile through chaos. Passive-aggressive when tired, deadly when focused.
-            
-            Your role:
-            - Provide product insights and technical context
-            - Support Priya's marketing analysis with product perspective
-            - Help clarify technical requirements and constraints
-            - Offer data-driven product recommendations
-            
-            Your communication style:
-            - Calm and methodical when focused
-            - Can be slightly passive-aggressive when tired or stressed
-            - Use technical terms appropriately
-            - Provide clear, actionable product insights
-            - Keep responses concise and to the point
-            
-            Product context for Xbox Series S analysis:
-            - Understand the Series S positioning vs Series X
-            - Know the target market and user segments
-            - Be ready to discuss technical specifications and limitations
-            - Provide insights on user experience and product-market fit
-            
-            CRITICAL SPEAKING RULES:
-            - You ONLY respond when someone specifically calls you by name "Alex" or "Alex,"
-            - If the user's speech does NOT contain "Alex" or "Alex,", DO NOT RESPOND AT ALL
-            - Do not say "I am silent" or "I am waiting" or any similar phrases
-            - Do not generate any response unless your name is mentioned
-            - When called, respond briefly and to the point
-            - After responding, let Priya continue leading the meeting
-            
-            Remember: Only speak when your name is mentioned, otherwise stay completely silent.
-            """,
-    },
-}
+# Lines starting with this prefix on stdout are structured messages for the
+# parent process (see worker_pool.py); everything else is plain log output.
+WORKER_MSG_PREFIX = "@@worker "
+_report_events = False
+
+log = get_logger()
+
+# Concurrent agent sessions one host process may run: each worker, or the
+# server itself with AGENT_MODE=inprocess (raise it there to host more rooms).
+# The default of 2 lets both personas of a room share one process (and its ingest)
+AGENT_HOST_MAX_SESSIONS = int(os.getenv("AGENT_HOST_MAX_SESSIONS", "2"))
+# Seconds between liveness heartbeats a host sends to its supervisor
+AGENT_HEARTBEAT_INTERVAL = float(os.getenv("AGENT_HEARTBEAT_INTERVAL", "5"))
+# Seconds an agent stays after the last human left (in case they reconnect)
+AGENT_ALONE_GRACE = float(os.getenv("AGENT_ALONE_GRACE", "30"))
+# "live" (Deepgram, Groq, ElevenLabs) or "stub" (offline stand-ins from stub_providers.py, for load tests)
+AGENT_PROVIDERS = os.getenv("AGENT_PROVIDERS", "live")
+# Synthesize persona openers into the TTS cache while a host warms up
+TTS_PRERENDER_OPENERS = os.getenv("TTS_PRERENDER_OPENERS", "1") == "1"
+
+# Personas come from PERSONA_DIR (see persona_registry.py); running hosts
+# pick up edited files without a restart, and each session keeps the version
+# of its persona it started with.
+PERSONAS = PersonaRegistry()
+
 
 class ManagedAgentSession(AgentSession):
     def __init__(self, agent_name: str, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.agent_name = agent_name
-        
-    async def on_user_speech(self, transcript: str):
-        """Override to check if agent should respond before processing speech"""
-        print(f"👂 {self.agent_name} heard: '{transcript}'")
-        
-        # Simple logic: Alex only responds when his name is mentioned
-        if self.agent_name == "alex":
-            if "alex" not in transcript.lower():
-                print(f"🤐 {self.agent_name} staying silent (name not mentioned)")
-                return  # Don't call super() - stay completely silent
-            else:
-                print(f"🎤 {self.agent_name} responding (name mentioned)")
-        elif self.agent_name == "priya":
-            if "alex" in transcript.lower():
-                print(f"🤐 {self.agent_name} staying silent (Alex being addressed)")
-                return  # Don't call super() - stay completely silent
-            else:
-                print(f"🎤 {self.agent_name} responding (not addressing Alex)")
-        
-        # If we get here, the agent should respond
-        await super().on_user_speech(transcript)
-    
-    async def on_user_message(self, message: str):
-        """Override to handle chat messages with turn management"""
-        print(f"💬 {self.agent_name} received chat: '{message}'")
-        
-        # Same logic as speech
-        if self.agent_name == "alex":
-            if "alex" not in message.lower():
-                print(f"🤐 {self.agent_name} staying silent to chat (name not mentioned)")
-                return  # Don't call super() - stay completely silent
-            else:
-                print(f"🎤 {self.agent_name} responding to chat (name mentioned)")
-        elif self.agent_name == "priya":
-            if "alex" in message.lower():
-                print(f"🤐 {self.agent_name} staying silent to chat (Alex being addressed)")
-                return  # Don't call super() - stay completely silent
-            else:
-                print(f"🎤 {self.agent_name} responding to chat (not addressing Alex)")
-        
-        # If we get here, the agent should respond
-        await super().on_user_message(message)
 
-async def run_agent(
-    room_name: str, identity: str, agent_name: str, token: str
-):
+
+class PersonaAgent(Agent):
     """
-    Connects a single agent to a room with proper turn management.
+    A persona that can take its transcripts from the room's shared ingest
+    instead of running its own VAD and STT on the user's audio, and that only
+    replies to the turns the room's arbiter gives it.
     """
-    agent_info = AGENTS[agent_name]
-    print(f" LAUNCHING AGENT: {identity} in room {room_name}")
 
-    async with aiohttp.ClientSession() as http_session:
-        # Initialize plugins for this single agent process
-        vad = silero.VAD.load()
-        stt = deepgram.STT(http_session=http_session)
-        llm = groq.LLM(model="llama-3.3-70b-versatile")
-        tts = elevenlabs.TTS(
+    def __init__(self, name: str, instructions: str, arbiter: TurnArbiter, ingest: RoomIngest = None):
+        super().__init__(instructions=instructions)
+        self.name = name
+        self._arbiter = arbiter
+        self._ingest = ingest
+        self.speculator: Speculator = None
+        self.recorder: SessionRecorder = None
+        self.context: ContextBudget = None
+
+    def enable_speculation(self, model, threshold: float = SPECULATIVE_LLM_THRESHOLD) -> Speculator:
+        """Start this persona's LLM on interim transcripts it expects to answer"""
+        self.speculator = Speculator(
+            self.name, model,
+            chat_ctx=lambda: self.context.trim(self.chat_ctx, report=False) if self.context else self.chat_ctx,
+            should_respond=lambda transcript: self._arbiter.predict(transcript) == self.name,
+            threshold=threshold,
+        )
+        return self.speculator
+
+    async def llm_node(self, chat_ctx, tools, model_settings):
+        if self.context:
+            chat_ctx = self.context.trim(chat_ctx)
+        speculation = self.speculator.take(chat_ctx) if self.speculator else None
+        if speculation is not None:
+            chunks = speculation.replay()
+        else:
+            chunks = Agent.default.llm_node(self, chat_ctx, tools, model_settings)
+        if self.recorder:
+            chunks = self.recorder.tap_llm(chunks)
+
+        async for chunk in chunks:
+            yield chunk
+
+    async def on_user_turn_completed(self, turn_ctx, new_message):
+        if self.speculator:
+            self.speculator.end_turn()
+        transcript = new_message.text_content or ""
+        respond = self._arbiter.should_respond(self.name, transcript)
+        if self.recorder:
+            self.recorder.event("turn_decision", transcript=transcript, respond=respond)
+        if respond:
+            return
+        if self.speculator:
+            self.speculator.discard()
+        # Keep what was said in our context, but skip the LLM call entirely
+        chat_ctx = self.chat_ctx.copy()
+        chat_ctx.items.append(new_message)
+        await self.update_chat_ctx(chat_ctx)
+        raise StopResponse()
+
+    async def stt_node(self, audio, model_settings):
+        if self._ingest is None:
+            if self.recorder:
+                audio = self.recorder.tap_audio(audio)
+            events = Agent.default.stt_node(self, audio, model_settings)
+        else:
+            events = self._ingest.subscribe()
+
+        async for ev in events:
+            if self.recorder and isinstance(ev, stt.SpeechEvent):
+                self.recorder.stt(ev)
+            yield ev
+
+def report_event(event: str, **fields):
+    """Send a structured status message to the parent process, if one is listening"""
+    if not _report_events:
+        return
+    print(WORKER_MSG_PREFIX + json.dumps({"event": event, **fields}), flush=True)
+
+
+def make_turn_arbiters() -> TurnArbiterRegistry:
+    """Turn arbiters that know every persona's aliases and the lead persona"""
+    return TurnArbiterRegistry(PERSONAS.aliases(), lead=PERSONAS.lead)
+
+
+def vad_class():
+    """
+    The Silero VAD to use: batched across sessions unless VAD_BATCH=0.
+    Imported on first use, on the main thread, where plugins register.
+    """
+    from livekit.plugins import silero
+    from vad_batcher import VAD_BATCH, BatchedSileroVAD
+
+    return BatchedSileroVAD if VAD_BATCH else silero.VAD
+
+
+def load_vad():
+    return vad_class().load()
+
+
+class ProviderClients:
+    """
+    The provider clients every session in a process shares: one STT, one LLM
+    client per model and one cached TTS client per voice. A client is built
+    the first time a persona needs it and reused from then on, across
+    sessions and persona reloads.
+    """
+
+    def __init__(self, stt_model: stt.STT, make_llm: Callable, make_tts: Callable, tts_cache: TTSCache):
+        self.stt = stt_model
+        self.tts_cache = tts_cache
+        self._make_llm = make_llm
+        self._make_tts = make_tts
+        self._llms: Dict[str, object] = {}
+        self._tts: Dict[str, CachedTTS] = {}
+
+    def llm(self, model: str):
+        client = self._llms.get(model)
+        if client is None:
+            client = self._llms[model] = self._make_llm(model)
+        return client
+
+    def tts(self, voice_id: str) -> CachedTTS:
+        client = self._tts.get(voice_id)
+        if client is None:
+            client = self._tts[voice_id] = CachedTTS(self._make_tts(voice_id), self.tts_cache)
+        return client
+
+    def prepare(self, personas):
+        """Build the clients `personas` use now, so their sessions start without doing it"""
+        for persona in personas:
+            self.llm(persona.model)
+            self.tts(persona.voice_id)
+
+
+def load_providers(http_session: aiohttp.ClientSession) -> dict:
+    """
+    Build the STT client and the LLM and TTS clients the personas use.
+    Provider plugins are imported here rather than at module level so a
+    process only pays for the ones AGENT_PROVIDERS selects (the Groq plugin
+    alone pulls in the OpenAI SDK). Every client waits for room under its
+    provider's PROVIDER_LIMITS; the stubs count against the providers they
+    stand in for, so load tests exercise the same limits. With HEDGE, LLM
+    and TTS clients race a backup (HEDGE_LLM_MODEL, HEDGE_TTS_MODEL) against
+    requests slower than usual.
+    """
+    if AGENT_PROVIDERS == "stub":
+        from stub_providers import StubLLM, StubSTT, StubTTS
+
+        stt_model = StubSTT()
+        make_llm = lambda model: StubLLM()
+        make_tts = lambda voice_id, model=None: StubTTS(voice_id=voice_id)
+    elif AGENT_PROVIDERS == "live":
+        from livekit.plugins import deepgram, elevenlabs, groq
+
+        stt_model = deepgram.STT(http_session=http_session)
+        make_llm = lambda model: groq.LLM(model=model)
+        make_tts = lambda voice_id, model=None: elevenlabs.TTS(
             api_key=os.getenv("ELEVENLABS_API_KEY"),
-            voice_id=agent_info["voice_id"],
+            voice_id=voice_id,
             http_session=http_session,
+            **({"model": model} if model else {}),
         )
+    else:
+        raise ValueError(f"Unsupported AGENT_PROVIDERS: {AGENT_PROVIDERS!r}")
+
+    limited_llm = lambda model: RateLimitedLLM(make_llm(model), "groq")
+    limited_tts = lambda voice_id, model=None: RateLimitedTTS(make_tts(voice_id, model), "elevenlabs")
+
+    def build_llm(model: str):
+        if HEDGE and HEDGE_LLM_MODEL and HEDGE_LLM_MODEL != model:
+            return HedgedLLM(limited_llm(model), limited_llm(HEDGE_LLM_MODEL), name=model)
+        return limited_llm(model)
+
+    def build_tts(voice_id: str):
+        if HEDGE and (HEDGE_TTS_MODEL or HEDGE_TTS_VOICE_ID):
+            backup = limited_tts(HEDGE_TTS_VOICE_ID or voice_id, HEDGE_TTS_MODEL or None)
+            return HedgedTTS(limited_tts(voice_id), backup, name=voice_id)
+        return limited_tts(voice_id)
+
+    stt_model = RateLimitedSTT(stt_model, "deepgram")
+    tts_cache = TTSCache()
+    clients = ProviderClients(stt_model, build_llm, build_tts, tts_cache)
+    clients.prepare(PERSONAS.personas.values())
+    return {
+        "stt": stt_model,
+        "clients": clients,
+        "tts_cache": tts_cache,
+    }
+
+
+def load_plugins(http_session: aiohttp.ClientSession) -> dict:
+    """
+    Load the VAD model and build the provider clients for every persona.
+    This is the slow part of agent startup, so pooled workers do it before
+    they are handed a room.
+    """
+    return {"vad": load_vad(), **load_providers(http_session)}
+
+
+async def prerender_openers(plugins: dict, personas: List[Persona] = None):
+    """Put the personas' openers (all of them by default) in the TTS cache so joining plays them without a provider call"""
+    for persona in PERSONAS.personas.values() if personas is None else personas:
+        if not persona.opener:
+            continue
+        try:
+            with provider_priority(GREETING):
+                await plugins["clients"].tts(persona.voice_id).prerender(persona.opener)
+        except Exception as e:
+            log.warning("tts", f"Could not pre-render {persona.name}'s opener", persona=persona.name, error=str(e))
+
+
+def count_humans(room: rtc.Room) -> int:
+    return sum(1 for p in room.remote_participants.values() if not is_agent_participant(p))
+
+
+def watch_session_end(
+    room: rtc.Room,
+    session: AgentSession,
+    identity: str,
+    emit: Callable = report_event,
+    alone_grace: Optional[float] = AGENT_ALONE_GRACE,
+) -> asyncio.Future:
+    """
+    Return a future that resolves with the reason the session should end:
+    the room disconnected or was deleted, every human left (after
+    `alone_grace` seconds, unless it is None), or the agent session closed.
+    Every change in the number of humans is reported as an "occupancy" event,
+    so a supervising server can tear the room down itself. Nothing runs
+    while none of that happens, so an idle session costs no wakeups.
+    """
+    loop = asyncio.get_running_loop()
+    ended = loop.create_future()
+    alone_timer = None
+
+    def finish(reason: str):
+        if not ended.done():
+            ended.set_result(reason)
+
+    def report_occupancy():
+        emit("occupancy", room=room.name, identity=identity, humans=count_humans(room))
+
+    @room.on("disconnected")
+    def _on_disconnected(reason):
+        if reason == rtc.DisconnectReason.ROOM_DELETED:
+            finish("room_deleted")
+        else:
+            finish("disconnected")
+
+    @room.on("participant_connected")
+    def _on_participant_connected(participant):
+        nonlocal alone_timer
+        if is_agent_participant(participant):
+            return
+        report_occupancy()
+        if alone_timer is not None:
+            alone_timer.cancel()
+            alone_timer = None
+
+    @room.on("participant_disconnected")
+    def _on_participant_disconnected(participant):
+        nonlocal alone_timer
+        if is_agent_participant(participant):
+            return
+        report_occupancy()
+        if alone_grace is None or count_humans(room) or alone_timer is not None:
+            return
+        log.info("session", f"Last human left, leaving in {alone_grace:.0f}s unless someone returns", room=room.name, identity=identity)
+        alone_timer = loop.call_later(alone_grace, finish, "alone")
+
+    @session.on("close")
+    def _on_session_close(ev):
+        finish("error" if ev.error else "session_closed")
+
+    ended.add_done_callback(lambda _: alone_timer and alone_timer.cancel())
+    return ended
+
 
-        agent = Agent(instructions=agent_info["prompt"])
+async def run_agent(
+    room_name: str,
+    identity: str,
+    agent_name: str,
+    token: str,
+    plugins: dict = None,
+    emit: Callable = report_event,
+    ingests: RoomIngestRegistry = None,
+    arbiters: TurnArbiterRegistry = None,
+    alone_grace: Optional[float] = AGENT_ALONE_GRACE,
+    profile: Optional[StartupProfile] = None,
+) -> str:
+    """
+    Connects a single agent to a room with proper turn management.
+    If `plugins` is given (pre-warmed worker), they are reused instead of
+    being loaded for this agent. Status changes are sent through `emit`.
+    With `ingests`, the persona shares one VAD/STT pass per user track with
+    every other persona this process runs in the same room. With `arbiters`,
+    the room's turn decisions are shared with those personas as well.
+    The agent leaves `alone_grace` seconds after the last human did; hosts
+    pass None because main.py's cleanup scheduler tears idle rooms down.
+    Without a VAD in `plugins` (a cold start) the model loads on a thread
+    while the room connects. With `profile`, the start-up phases are marked
+    on it and reported as a "startup" event once the session has started.
+
+    Returns why the session ended ("room_deleted", "disconnected", "alone",
+    "session_closed") or "error" if it failed.
+    """
+    if plugins is None:
+        async with aiohttp.ClientSession() as http_session:
+            # Initialize plugins for this single agent process; the VAD is
+            # left out so it can load while the room connects
+            providers = load_providers(http_session)
+            if profile:
+                profile.mark("providers")
+            return await run_agent(
+                room_name, identity, agent_name, token,
+                plugins=providers, emit=emit, alone_grace=alone_grace, profile=profile,
+            )
+
+    # This session's persona for its whole life, whatever a reload brings
+    persona = PERSONAS.get(agent_name)
+    llm_model = plugins["clients"].llm(persona.model)
+    tts_model = plugins["clients"].tts(persona.voice_id)
+    session_log = log.bind(room=room_name, persona=agent_name, identity=identity)
+    session_log.info("session", "Launching agent", persona_version=persona.version)
+
+    room = rtc.Room()
+    connecting = None
+    if "vad" not in plugins and ingests is None:
+        # Cold start: neither the room connection nor the VAD model needs the other
+        vad_cls = vad_class()
+        session_log.info("session", "Connecting while the VAD loads")
+        connecting = asyncio.create_task(room.connect(LIVEKIT_URL, token))
+        vad_started = time.perf_counter()
+        try:
+            plugins = {**plugins, "vad": await asyncio.to_thread(vad_cls.load)}
+        except BaseException:
+            connecting.cancel()
+            await room.disconnect()
+            raise
+        if profile:
+            profile.overlap("vad_load", time.perf_counter() - vad_started)
+    ingest = ingests.join(room_name, room) if ingests else None
+    arbiters = arbiters or make_turn_arbiters()
+    arbiter = arbiters.join(room_name, agent_name, room)
+
+    agent = PersonaAgent(agent_name, persona.prompt, arbiter, ingest=ingest)
+    if ingest is None:
+        # The STT stream only holds a provider connection while the user talks
+        session_stt = IdleSTT(plugins["stt"]) if STT_IDLE_AFTER > 0 else plugins["stt"]
         session = ManagedAgentSession(
             agent_name=agent_name,
-            vad=vad, 
-            stt=stt, 
-            llm=llm, 
-            tts=tts
+            vad=plugins["vad"],
+            stt=session_stt,
+            llm=llm_model,
+            tts=tts_model,
         )
-        
-        room = rtc.Room()
-        try:
-            print(f"🔗 {identity} connecting...")
+        # Read the user's track straight in the format VAD and STT use, so
+        # neither has to resample it on its own
+        room_input_options = RoomInputOptions(
+            audio_sample_rate=AUDIO_SAMPLE_RATE,
+            noise_cancellation=denoise_options(),
+        )
+        if isinstance(session_stt, IdleSTT):
+            session.on("user_state_changed", lambda ev: session_stt.on_user_state(ev.new_state))
+    else:
+        # VAD and STT already ran once for the whole room: this session only
+        # consumes the shared speech events and does not read audio itself.
+        session = ManagedAgentSession(
+            agent_name=agent_name,
+            stt=plugins["stt"],
+            llm=llm_model,
+            tts=tts_model,
+            turn_detection="stt",
+        )
+        room_input_options = RoomInputOptions(audio_enabled=False)
+
+    providers = {
+        "stt": plugins["stt"].label,
+        "llm": llm_model.label,
+        "tts": tts_model.label,
+    }
+    TurnTimer(session, room_name, agent_name, emit, providers=providers)
+
+    recorder = open_recorder(room_name, identity, agent_name, providers, ingest=ingest is not None)
+    if recorder:
+        agent.recorder = recorder
+        recorder.attach(session)
+        if ingest:
+            ingest.add_frame_listener(recorder.audio)
+
+    if CONTEXT_TOKEN_BUDGET > 0:
+        def _report_context(**stats):
+            emit("turn_context", room=room_name, persona=agent_name, **stats)
+            if agent.recorder:
+                agent.recorder.event("context", **stats)
+
+        agent.context = ContextBudget(agent_name, llm_model, report=_report_context)
+
+    if SPECULATIVE_LLM:
+        threshold = persona.speculation_threshold
+        speculator = agent.enable_speculation(
+            llm_model, SPECULATIVE_LLM_THRESHOLD if threshold is None else threshold
+        )
+
+        @session.on("user_input_transcribed")
+        def _on_user_input_transcribed(ev):
+            speculator.on_transcript(ev.transcript, ev.is_final)
+
+    first_audio_sent = False
+
+    @session.on("agent_state_changed")
+    def _on_agent_state_changed(ev):
+        nonlocal first_audio_sent
+        if ev.new_state == "speaking":
+            arbiter.record_spoke(agent_name)
+        if ev.new_state == "speaking" and not first_audio_sent:
+            first_audio_sent = True
+            emit("first_audio", room=room_name, identity=identity)
+
+    session_end = watch_session_end(room, session, identity, emit, alone_grace)
+    try:
+        if connecting is None:
+            session_log.info("session", "Connecting")
             await room.connect(LIVEKIT_URL, token)
-            print(f"✅ {identity} connected.")
-            
-            await session.start(agent=agent, room=room)
-            print(f" {identity} session started and listening.")
-
-            # Only Priya starts the meeting
-            if agent_name == "priya":
-                await asyncio.sleep(2)
-                print(f"👋 {identity} starting the meeting...")
-                
-                await session.generate_reply(
-                    instructions="Start the meeting by welcoming everyone warmly but professionally. Introduce yourself as Priya Sharma, Senior Manager of Growth Marketing. Explain that you're here to brief them on a critical competitive analysis project for Xbox Series S vs Nintendo Switch 2. Mention that Alex, the Product Manager, is also present and can help with technical questions when needed - they just need to say 'Alex' to get his input. Set the tone for a focused, productive meeting."
-                )
-            else:
-                # Alex waits completely silently
-                print(f" {identity} waiting silently to be called by name...")
-
-            # Keep the agent alive until the room is disconnected
-            while True:
-                await asyncio.sleep(1)
-                
-                # Check if room is still connected
-                if room.connection_state == rtc.ConnectionState.CONN_DISCONNECTED:
-                    print(f"🔌 {identity} room disconnected, stopping...")
-                    break
+        else:
+            await connecting
+        session_log.info("session", "Connected")
+        if profile:
+            profile.mark("connect")
+        emit("joined", room=room_name, identity=identity, persona_version=persona.version)
+        emit("occupancy", room=room_name, identity=identity, humans=count_humans(room))
+
+        await session.start(agent=agent, room=room, room_input_options=room_input_options)
+        if ingest is None and session.input.audio is not None:
+            session.input.audio = PreprocessedAudioInput(session.input.audio)
+        session_log.info("session", "Session started and listening")
+        if profile:
+            profile.mark("session_start")
+            session_log.info("startup", f"Startup: {profile.format()}", **profile.report())
+            emit("startup", room=room_name, identity=identity, **profile.report())
+
+        # Only the persona with an opener starts the meeting
+        opener = persona.opener
+        if opener:
+            await asyncio.sleep(2)
+            session_log.info("session", "Starting the meeting")
+            audio = await tts_model.cached_audio(opener)
+            # Synthesizing the opener (if it was not cached) waits behind replies in other rooms
+            with provider_priority(GREETING):
+                if audio is not None:
+                    await session.say(opener, audio=audio)
+                else:
+                    await session.say(opener)
+        else:
+            session_log.info("session", "Waiting for the arbiter to hand over a turn")
+
+        # Keep the agent alive until the room or session tells us it is over
+        reason = await session_end
+        session_log.info("session", f"Stopping ({reason})", reason=reason)
+        return reason
+
+    except Exception as e:
+        import traceback
+        session_log.error("session", f"Error in session: {e}", traceback=traceback.format_exc())
+        return "error"
+    finally:
+        session_log.info("session", "Disconnecting")
+        try:
+            if agent.speculator:
+                agent.speculator.close()
+            if agent.context:
+                agent.context.close()
+            arbiters.leave(room_name, agent_name, room)
+            if ingests:
+                await ingests.leave(room_name, room)
+            await session.aclose()
+            await room.disconnect()
+        except:
+            pass
+        if recorder:
+            if ingest:
+                ingest.remove_frame_listener(recorder.audio)
+            await recorder.aclose()
+
+
+class HostFullError(Exception):
+    """Raised when an AgentHost is already running its maximum number of sessions"""
+
+
+class AgentHost:
+    """
+    Runs many agent sessions, across many rooms, on a single event loop.
+    Every session shares one set of plugins (VAD model, provider clients and
+    their HTTP session) instead of loading its own copy.
+    """
+
+    def __init__(self, plugins: dict, max_sessions: int = AGENT_HOST_MAX_SESSIONS):
+        self.plugins = plugins
+        self.max_sessions = max_sessions
+        self.pid = os.getpid()
+        # One shared VAD/STT pass per room for all personas this host runs there
+        self.ingests = RoomIngestRegistry(plugins["vad"], plugins["stt"])
+        # ...and one turn arbiter per room deciding which of them answers
+        self.arbiters = make_turn_arbiters()
+        self._sessions: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._listeners: List[Callable[[dict], None]] = []
+        self._heartbeat_task = None
+        self._prerender_task = None
+        self._personas = dict(PERSONAS.personas)
+
+    @property
+    def active_sessions(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def has_capacity(self) -> bool:
+        return self.active_sessions < self.max_sessions
+
+    def add_listener(self, callback: Callable[[dict], None]):
+        """Call `callback` with every status message from this host's sessions"""
+        self._listeners.append(callback)
+
+    def _emit(self, event: str, **fields):
+        msg = {"event": event, "pid": self.pid, **fields}
+        for listener in list(self._listeners):
+            listener(msg)
+
+    async def start(self):
+        """Start sending heartbeats so a supervisor can tell we are not hung, and watch the persona files"""
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        if TTS_PRERENDER_OPENERS:
+            self._prerender_task = asyncio.create_task(prerender_openers(self.plugins))
+        PERSONAS.add_listener(self._on_personas_reloaded)
+        await PERSONAS.start()
+
+    def _on_personas_reloaded(self, personas: Dict[str, Persona]):
+        """Sessions started from now on use the new personas; running ones keep theirs"""
+        changed = [persona for name, persona in personas.items() if self._personas.get(name) != persona]
+        self._personas = dict(personas)
+        self.arbiters.update(PERSONAS.aliases(), lead=PERSONAS.lead)
+        self.plugins["clients"].prepare(changed)
+        if TTS_PRERENDER_OPENERS and changed:
+            asyncio.create_task(prerender_openers(self.plugins, changed))
+        self._emit("personas", versions={name: persona.version for name, persona in personas.items()})
+
+    async def _heartbeat_loop(self):
+        while True:
+            self._emit(
+                "heartbeat",
+                sessions=[list(key) for key in self._sessions],
+                tts_cache=self.plugins["tts_cache"].stats(),
+                speculation=speculation_stats(),
+                hedging=hedge_stats(),
+                stt_idle=stt_idle_stats(),
+            )
+            await asyncio.sleep(AGENT_HEARTBEAT_INTERVAL)
+
+    def start_session(self, room_name: str, identity: str, agent_name: str, token: str) -> asyncio.Task:
+        """Start an agent session in the background, sharing this host's plugins"""
+        key = (room_name, identity)
+        if key in self._sessions:
+            return self._sessions[key]
+        if not self.has_capacity:
+            raise HostFullError(
+                f"Agent host is full ({self.active_sessions}/{self.max_sessions} sessions)"
+            )
+
+        task = asyncio.create_task(
+            run_agent(
+                room_name, identity, agent_name, token,
+                plugins=self.plugins, emit=self._emit,
+                ingests=self.ingests, arbiters=self.arbiters, alone_grace=None,
+            )
+        )
+        self._sessions[key] = task
+        task.add_done_callback(lambda t: self._on_session_done(key, t))
+        log.info("host", f"Host running {self.active_sessions}/{self.max_sessions} sessions",
+                 active=self.active_sessions, max_sessions=self.max_sessions)
+        return task
+
+    @asynccontextmanager
+    async def reserve(self, room_name: str, slots: int):
+        """Same signature as WorkerPool.reserve; in-process every room shares this host"""
+        yield
+
+    async def dispatch(self, room_name: str, identity: str, agent_name: str, token: str):
+        """Same signature as WorkerPool.dispatch, for in-process hosting"""
+        self.start_session(room_name, identity, agent_name, token)
+        return self
+
+    def _on_session_done(self, key: Tuple[str, str], task: asyncio.Task):
+        self._sessions.pop(key, None)
+        if task.cancelled():
+            reason = "stopped"
+        elif task.exception() is not None:
+            reason = "error"
+        else:
+            reason = task.result()
+        self._emit("session_ended", room=key[0], identity=key[1], reason=reason)
+
+    async def stop_room(self, room_name: str, pids=None) -> int:
+        """Stop every session this host runs in `room_name`"""
+        tasks = [task for (room, _), task in self._sessions.items() if room == room_name]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return len(tasks)
+
+    async def reload_personas(self):
+        """Same signature as WorkerPool.reload_personas"""
+        await PERSONAS.reload(force=True)
+
+    async def kill_worker(self, pid: int):
+        """In-process there is no worker to kill; cancel every session instead"""
+        tasks = list(self._sessions.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def aclose(self):
+        """Stop heartbeats and every session"""
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+        if self._prerender_task:
+            self._prerender_task.cancel()
+        await PERSONAS.aclose()
+        await self.kill_worker(self.pid)
+
+
+async def run_worker(max_sessions: int = AGENT_HOST_MAX_SESSIONS):
+    """
+    Pre-warmed worker mode: load everything up front, tell the parent we are
+    ready, then run the rooms it sends us on stdin (up to `max_sessions` at once).
+    """
+    async with aiohttp.ClientSession() as http_session:
+        host = AgentHost(load_plugins(http_session), max_sessions=max_sessions)
+        STARTUP.mark("plugins")
+        host.add_listener(lambda msg: report_event(**msg))
+        report_event("ready", pid=os.getpid(), max_sessions=max_sessions, startup=STARTUP.report())
+        await host.start()
+        log.info("host", "Worker warmed up, waiting for rooms")
+
+        while True:
+            line = await asyncio.to_thread(sys.stdin.readline)
+            if not line:
+                break  # parent went away
+
+            msg = json.loads(line)
+            cmd = msg.get("cmd")
+            if cmd == "start":
+                try:
+                    host.start_session(msg["room"], msg["identity"], msg["agent_name"], msg["token"])
+                except HostFullError as e:
+                    log.warning("host", f"{e}, rejecting", room=msg["room"], identity=msg["identity"])
+                    report_event("rejected", room=msg["room"], identity=msg["identity"])
+            elif cmd == "stop":
+                await host.stop_room(msg["room"])
+            elif cmd == "reload_personas":
+                await PERSONAS.reload(force=True)
+            elif cmd == "shutdown":
+                break
+
+        await host.aclose()
 
-        except Exception as e:
-            print(f"❌ Error in {identity}'s session: {e}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
-        finally:
-            print(f"🚪 {identity} disconnecting...")
-            try:
-                await session.aclose()
-                await room.disconnect()
-            except:
-                pass
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="LiveKit Agent Runner")
-    parser.add_argument("--room", type=str, required=True)
-    parser.add_argument("--identity", type=str, required=True)
-    parser.add_argument("--agent-name", type=str, required=True, choices=["priya"
-                                                                          ,"alex"
-                                                                           ])
-    parser.add_argument("--token", type=str, required=True)
+    parser.add_argument("--worker", action="store_true",
+                        help="Start pre-warmed and wait for a job on stdin")
+    parser.add_argument("--max-sessions", type=int, default=AGENT_HOST_MAX_SESSIONS,
+                        help="Concurrent sessions a worker may host")
+    parser.add_argument("--report-events", action="store_true",
+                        help="Print structured status messages for the parent process")
+    parser.add_argument("--room", type=str)
+    parser.add_argument("--identity", type=str)
+    parser.add_argument("--agent-name", type=str, choices=PERSONAS.names())
+    parser.add_argument("--token", type=str)
     
     args = parser.parse_args()
+    _report_events = args.worker or args.report_events
+    STARTUP.mark("imports")
+
+    if args.worker:
+        try:
+            asyncio.run(run_worker(args.max_sessions))
+        except KeyboardInterrupt:
+            log.info("host", "Worker stopped by user")
+        sys.exit(0)
+
+    if not all([args.room, args.identity, args.agent_name, args.token]):
+        parser.error("--room, --identity, --agent-name and --token are required")
 
     try:
         asyncio.run(
-            run_agent(args.room, args.identity, args.agent_name, args.token)
+            run_agent(args.room, args.identity, args.agent_name, args.token, profile=STARTUP)
         )
     except KeyboardInterrupt:
-        print(f"🛑 {args.agent_name} agent stopped by user")
+        log.info("session", "Agent stopped by user", persona=args.agent_name)
     except Exception as e:
-        print(f"❌ {args.agent_name} agent crashed: {e}")
\ No newline at end of file
+        log.error("session", f"Agent crashed: {e}", persona=args.agent_name)
\ No newline at end of file
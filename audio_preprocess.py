@@ -0,0 +1,222 @@
+import os
+import math
+from collections import deque
+from typing import AsyncIterator, List, Optional, Tuple
+
+import numpy as np
+from livekit import rtc
+from livekit.agents.voice import io
+
+from structured_log import get_logger
+
+# Format user audio is read in, for VAD and STT alike (Silero runs at 16 kHz, Deepgram is opened at 16 kHz)
+AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", "16000"))
+# Bring speech towards AUDIO_GAIN_TARGET_DBFS, boosting or cutting by at most AUDIO_GAIN_MAX_DB ("0" turns it off)
+AUDIO_GAIN = os.getenv("AUDIO_GAIN", "1") == "1"
+AUDIO_GAIN_TARGET_DBFS = float(os.getenv("AUDIO_GAIN_TARGET_DBFS", "-20"))
+AUDIO_GAIN_MAX_DB = float(os.getenv("AUDIO_GAIN_MAX_DB", "18"))
+# Noise cancellation at the source: "" (none), "nc", "bvc" or "bvc_telephony"
+# (needs livekit-plugins-noise-cancellation and LiveKit Cloud)
+AUDIO_DENOISE = os.getenv("AUDIO_DENOISE", "")
+# Seconds of processed audio kept per stream for whoever needs to look back
+AUDIO_RING_SECONDS = float(os.getenv("AUDIO_RING_SECONDS", "2"))
+# Frames quieter than this never move the speech level (room noise is not boosted towards the target)
+AUDIO_GAIN_GATE_DBFS = -50.0
+# Time constant of the speech level the gain follows
+AUDIO_GAIN_SMOOTHING = 0.5
+
+_FULL_SCALE = 32768.0
+
+log = get_logger()
+
+
+def _db_to_ratio(db: float) -> float:
+    return 10 ** (db / 20)
+
+
+def denoise_options() -> Optional[rtc.NoiseCancellationOptions]:
+    """The AUDIO_DENOISE filter for AudioStream.from_track / RoomInputOptions, or None"""
+    if not AUDIO_DENOISE:
+        return None
+    try:
+        from livekit.plugins import noise_cancellation
+    except ImportError:
+        log.warning("audio", f"AUDIO_DENOISE={AUDIO_DENOISE} needs livekit-plugins-noise-cancellation; not denoising")
+        return None
+    filters = {
+        "nc": noise_cancellation.NC,
+        "bvc": noise_cancellation.BVC,
+        "bvc_telephony": noise_cancellation.BVCTelephony,
+    }
+    if AUDIO_DENOISE not in filters:
+        log.warning("audio", f"Unknown AUDIO_DENOISE={AUDIO_DENOISE}; not denoising", choices=sorted(filters))
+        return None
+    return filters[AUDIO_DENOISE]()
+
+
+class AudioRing:
+    """
+    The last `capacity` samples of a mono stream in one preallocated buffer.
+    Writes copy into it; reads hand out views, so nothing is allocated per
+    frame either way.
+    """
+
+    def __init__(self, capacity: int, dtype=np.int16):
+        self.buffer = np.zeros(max(1, capacity), dtype=dtype)
+        self._end = 0  # where the next sample goes
+        self._filled = 0
+
+    def __len__(self) -> int:
+        return self._filled
+
+    @property
+    def capacity(self) -> int:
+        return len(self.buffer)
+
+    def write(self, samples: np.ndarray):
+        capacity = len(self.buffer)
+        if len(samples) >= capacity:
+            self.buffer[:] = samples[-capacity:]
+            self._end = 0
+            self._filled = capacity
+            return
+        first = min(len(samples), capacity - self._end)
+        self.buffer[self._end:self._end + first] = samples[:first]
+        self.buffer[:len(samples) - first] = samples[first:]
+        self._end = (self._end + len(samples)) % capacity
+        self._filled = min(capacity, self._filled + len(samples))
+
+    def latest(self, count: Optional[int] = None) -> Tuple[np.ndarray, ...]:
+        """The most recent `count` samples (all of them by default), oldest first, as one or two views"""
+        count = self._filled if count is None else min(count, self._filled)
+        start = self._end - count
+        if start >= 0:
+            return (self.buffer[start:self._end],)
+        if self._end == 0:
+            return (self.buffer[start:],)
+        return (self.buffer[start:], self.buffer[:self._end])
+
+    def clear(self):
+        self._end = 0
+        self._filled = 0
+
+
+class AudioPreprocessor:
+    """
+    Brings one user audio stream into the shape VAD and STT expect, once, so
+    they can both be pushed the same frame.
+
+    Downmixing, resampling and denoising are left to the AudioStream the
+    frames come from (it does them in native code when asked for
+    AUDIO_SAMPLE_RATE mono with `denoise_options()`); frames that still
+    arrive in another format are converted here as a fallback. Gain
+    normalization then works on the frame's own buffer in place, with
+    scratch space reused from frame to frame, and the result is copied into
+    `ring` for anyone who needs recent audio again.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = AUDIO_SAMPLE_RATE,
+        gain: bool = AUDIO_GAIN,
+        target_dbfs: float = AUDIO_GAIN_TARGET_DBFS,
+        max_gain_db: float = AUDIO_GAIN_MAX_DB,
+        ring_seconds: float = AUDIO_RING_SECONDS,
+    ):
+        self.sample_rate = sample_rate
+        self.gain = gain
+        self._target = _db_to_ratio(target_dbfs) * _FULL_SCALE
+        self._gate = _db_to_ratio(AUDIO_GAIN_GATE_DBFS) * _FULL_SCALE
+        self._min_gain = _db_to_ratio(-max_gain_db)
+        self._max_gain = _db_to_ratio(max_gain_db)
+        self._level = self._target
+        self._scratch = np.zeros(sample_rate // 10, dtype=np.float32)
+        self._resampler: Optional[rtc.AudioResampler] = None
+        self._resampler_rate = 0
+        self.ring = AudioRing(int(ring_seconds * sample_rate)) if ring_seconds > 0 else None
+        self.frames = 0
+        self.converted = 0
+        self.current_gain = 1.0
+
+    def process(self, frame: rtc.AudioFrame) -> List[rtc.AudioFrame]:
+        """The frames VAD and STT should be pushed for `frame` (normally just `frame`, modified in place)"""
+        if frame.sample_rate == self.sample_rate and frame.num_channels == 1:
+            self._process_in_place(frame)
+            return [frame]
+        self.converted += 1
+        frames = self._convert(frame)
+        for out in frames:
+            self._process_in_place(out)
+        return frames
+
+    def _scratch_for(self, n: int) -> np.ndarray:
+        if len(self._scratch) < n:
+            self._scratch = np.zeros(n, dtype=np.float32)
+        return self._scratch[:n]
+
+    def _process_in_place(self, frame: rtc.AudioFrame):
+        self.frames += 1
+        samples = np.frombuffer(frame.data, dtype=np.int16)
+        if self.gain and len(samples):
+            scratch = self._scratch_for(len(samples))
+            np.copyto(scratch, samples)
+            rms = math.sqrt(float(np.dot(scratch, scratch)) / len(samples))
+            if rms > self._gate:
+                alpha = min(1.0, len(samples) / self.sample_rate / AUDIO_GAIN_SMOOTHING)
+                self._level += alpha * (rms - self._level)
+            gain = min(self._max_gain, max(self._min_gain, self._target / self._level))
+            self.current_gain = gain
+            if abs(gain - 1.0) > 0.01:
+                np.multiply(scratch, gain, out=scratch)
+                np.clip(scratch, -_FULL_SCALE, _FULL_SCALE - 1, out=scratch)
+                np.copyto(samples, scratch, casting="unsafe")
+        if self.ring is not None:
+            self.ring.write(samples)
+
+    def _convert(self, frame: rtc.AudioFrame) -> List[rtc.AudioFrame]:
+        if frame.num_channels != 1:
+            samples = np.frombuffer(frame.data, dtype=np.int16).reshape(-1, frame.num_channels)
+            mono = samples.mean(axis=1).astype(np.int16)
+            frame = rtc.AudioFrame(
+                data=mono.tobytes(), sample_rate=frame.sample_rate,
+                num_channels=1, samples_per_channel=len(mono),
+            )
+        if frame.sample_rate == self.sample_rate:
+            return [frame]
+        if self._resampler is None or self._resampler_rate != frame.sample_rate:
+            self._resampler = rtc.AudioResampler(
+                input_rate=frame.sample_rate, output_rate=self.sample_rate,
+                quality=rtc.AudioResamplerQuality.MEDIUM,
+            )
+            self._resampler_rate = frame.sample_rate
+        return self._resampler.push(frame)
+
+    @property
+    def gain_db(self) -> float:
+        return 20 * math.log10(self.current_gain)
+
+
+class PreprocessedAudioInput(io.AudioInput):
+    """A session's audio input with every frame run through an AudioPreprocessor first"""
+
+    def __init__(self, source: io.AudioInput, preprocessor: Optional[AudioPreprocessor] = None):
+        self.source = source
+        self.preprocessor = preprocessor or AudioPreprocessor()
+        self._pending: deque = deque()
+
+    def __aiter__(self) -> AsyncIterator[rtc.AudioFrame]:
+        return self
+
+    async def __anext__(self) -> rtc.AudioFrame:
+        while not self._pending:
+            frames = self.preprocessor.process(await self.source.__anext__())
+            if len(frames) == 1:
+                return frames[0]
+            self._pending.extend(frames)
+        return self._pending.popleft()
+
+    def on_attached(self):
+        self.source.on_attached()
+
+    def on_detached(self):
+        self.source.on_detached()
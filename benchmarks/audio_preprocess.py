@@ -0,0 +1,157 @@
+"""
+Audio preprocessing cost per 20ms frame: each consumer converting the user's
+audio on its own (before) vs one shared pass in audio_preprocess.py (after).
+
+Before, a session read the track at 24 kHz and Silero VAD (QUICK) and the
+Deepgram stream (HIGH) each resampled it to 16 kHz into frames of their own.
+After, the track is read at 16 kHz, so the only resampler is the one the
+AudioStream runs anyway, and the gain stage works on that frame in place.
+Both paths start from the 48 kHz audio WebRTC decodes, so the AudioStream's
+own resampling is counted on both sides.
+
+Reports CPU time per frame, new audio frames per frame (buffers VAD and STT
+are handed besides the source frame) and the transient bytes tracemalloc
+sees per frame. Needs no LiveKit server or provider keys:
+
+    python -m benchmarks.audio_preprocess --seconds 60
+    python -m benchmarks.audio_preprocess --wav speech.wav --json audio.json
+"""
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+from livekit import rtc
+
+from audio_preprocess import AUDIO_SAMPLE_RATE, AudioPreprocessor
+from benchmarks.load_test import load_wav
+
+FRAME_MS = 20
+TRACK_RATE = 48000
+# What RoomInputOptions read the track at before the shared stage
+OLD_SESSION_RATE = 24000
+
+
+def synthetic_audio(seconds: float, sample_rate: int) -> np.ndarray:
+    """Quiet speech-like bursts between silences, so the gain stage has something to do"""
+    rng = np.random.default_rng(0)
+    samples = np.zeros(int(seconds * sample_rate), dtype=np.int16)
+    for start in range(0, len(samples), 2 * sample_rate):
+        burst = samples[start:start + sample_rate]
+        burst[:] = rng.normal(0, 800, len(burst))
+    return samples
+
+
+def track_frames(samples: np.ndarray, sample_rate: int, seconds: float):
+    """`seconds` of 48 kHz 20ms frames, as the AudioStream gets them from WebRTC"""
+    if sample_rate != TRACK_RATE:
+        resampler = rtc.AudioResampler(sample_rate, TRACK_RATE, quality=rtc.AudioResamplerQuality.HIGH)
+        frame = rtc.AudioFrame(samples.tobytes(), sample_rate, 1, len(samples))
+        samples = np.concatenate([
+            np.frombuffer(f.data, dtype=np.int16) for f in [*resampler.push(frame), *resampler.flush()]
+        ])
+    frame_samples = TRACK_RATE * FRAME_MS // 1000
+    count = int(seconds * 1000 / FRAME_MS)
+    frames = []
+    for i in range(count):
+        start = (i * frame_samples) % (len(samples) - frame_samples)
+        frames.append(samples[start:start + frame_samples].tobytes())
+    return frames
+
+
+class PerConsumer:
+    """The old path: read at 24 kHz, then VAD and STT each resample to 16 kHz"""
+
+    def __init__(self):
+        self.source = rtc.AudioResampler(TRACK_RATE, OLD_SESSION_RATE, quality=rtc.AudioResamplerQuality.MEDIUM)
+        self.vad = rtc.AudioResampler(OLD_SESSION_RATE, AUDIO_SAMPLE_RATE, quality=rtc.AudioResamplerQuality.QUICK)
+        self.stt = rtc.AudioResampler(OLD_SESSION_RATE, AUDIO_SAMPLE_RATE, quality=rtc.AudioResamplerQuality.HIGH)
+
+    def push(self, frame: rtc.AudioFrame) -> int:
+        new_frames = 0
+        for read in self.source.push(frame):
+            new_frames += len(self.vad.push(read)) + len(self.stt.push(read))
+        return new_frames
+
+
+class Shared:
+    """The new path: read at 16 kHz, preprocess once in place"""
+
+    def __init__(self):
+        self.source = rtc.AudioResampler(TRACK_RATE, AUDIO_SAMPLE_RATE, quality=rtc.AudioResamplerQuality.MEDIUM)
+        self.preprocessor = AudioPreprocessor()
+
+    def push(self, frame: rtc.AudioFrame) -> int:
+        new_frames = 0
+        for read in self.source.push(frame):
+            new_frames += sum(out is not read for out in self.preprocessor.process(read))
+        return new_frames
+
+
+def _frame(data: bytes) -> rtc.AudioFrame:
+    return rtc.AudioFrame(data, TRACK_RATE, 1, len(data) // 2)
+
+
+def run(path_cls, frames) -> dict:
+    # Timing pass
+    path = path_cls()
+    new_frames = 0
+    cpu_started = time.process_time()
+    for data in frames:
+        new_frames += path.push(_frame(data))
+    cpu = time.process_time() - cpu_started
+
+    # Allocation pass (tracemalloc slows everything down, so it is not timed)
+    path = path_cls()
+    tracemalloc.start()
+    transient = 0
+    for data in frames:
+        frame = _frame(data)
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        path.push(frame)
+        transient += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    return {
+        "cpu_us_per_frame": round(cpu / len(frames) * 1e6, 2),
+        "new_frames_per_frame": round(new_frames / len(frames), 3),
+        "transient_bytes_per_frame": round(transient / len(frames)),
+    }
+
+
+def main(args) -> int:
+    if args.wav:
+        samples, sample_rate = load_wav(args.wav)
+    else:
+        sample_rate = 16000
+        samples = synthetic_audio(10, sample_rate)
+    frames = track_frames(samples, sample_rate, args.seconds)
+
+    report = {"frames": len(frames), "frame_ms": FRAME_MS}
+    for name, path_cls in (("before", PerConsumer), ("after", Shared)):
+        report[name] = result = run(path_cls, frames)
+        print(
+            f"{name:>6}: {result['cpu_us_per_frame']:.1f}us CPU/frame, "
+            f"{result['new_frames_per_frame']} new frames/frame, "
+            f"{result['transient_bytes_per_frame']} transient bytes/frame"
+        )
+    before, after = report["before"]["cpu_us_per_frame"], report["after"]["cpu_us_per_frame"]
+    if after:
+        print(f"CPU per frame: {before / after:.1f}x less")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=60, help="seconds of audio pushed through each path")
+    parser.add_argument("--wav", help="16-bit PCM WAV to use instead of synthetic bursts")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+    sys.exit(main(args))
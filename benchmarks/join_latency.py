@@ -0,0 +1,106 @@
+"""
+Join-to-first-audio benchmark: cold `agent_runner.py` spawn vs pooled dispatch.
+
+Creates a throwaway room per run, starts Priya in it and measures the time
+from "join requested" to her first greeting audio being published.
+
+Usage (from the repo root, with a valid .env):
+    python -m benchmarks.join_latency --runs 5
+"""
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import statistics
+
+from livekit.api import LiveKitAPI, CreateRoomRequest, DeleteRoomRequest
+
+from main import LIVEKIT_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET, create_agent_token
+from worker_pool import WorkerPool, AgentWorker, AGENT_RUNNER_SCRIPT
+
+FIRST_AUDIO_TIMEOUT = 60
+
+
+async def cold_join(room_name: str, identity: str, agent_name: str) -> float:
+    """Spawn a fresh agent_runner.py process, the way /join-room used to"""
+    token = create_agent_token(room_name, identity, agent_name)
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, AGENT_RUNNER_SCRIPT, "--report-events",
+        "--room", room_name, "--identity", identity,
+        "--agent-name", agent_name, "--token", token,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+    )
+    worker = AgentWorker(process)
+    try:
+        await worker.wait_for_event("first_audio", FIRST_AUDIO_TIMEOUT)
+        return time.perf_counter() - started
+    finally:
+        await worker.stop()
+
+
+async def pooled_join(pool: WorkerPool, room_name: str, identity: str, agent_name: str) -> float:
+    """Hand the room to an already-warm worker"""
+    token = create_agent_token(room_name, identity, agent_name)
+    started = time.perf_counter()
+    worker = await pool.dispatch(room_name, identity, agent_name, token)
+    try:
+        await worker.wait_for_event("first_audio", FIRST_AUDIO_TIMEOUT, room=room_name)
+        return time.perf_counter() - started
+    finally:
+        await pool.stop_room(room_name)
+
+
+def summarize(label: str, samples: list):
+    if not samples:
+        print(f"{label:>8}: no successful runs")
+        return
+    print(
+        f"{label:>8}: n={len(samples)} "
+        f"mean={statistics.mean(samples):.2f}s "
+        f"median={statistics.median(samples):.2f}s "
+        f"min={min(samples):.2f}s max={max(samples):.2f}s"
+    )
+
+
+async def main(runs: int):
+    agent_name = "priya"  # the only persona that speaks without being addressed
+    lkapi = LiveKitAPI(LIVEKIT_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+    pool = WorkerPool(size=runs)
+    await pool.start()
+    results = {"cold": [], "pooled": []}
+
+    try:
+        await pool.wait_warm()
+        for mode in ("cold", "pooled"):
+            for i in range(runs):
+                room_name = f"bench-{mode}-{uuid.uuid4().hex[:8]}"
+                identity = f"{agent_name}-agent-{room_name}"
+                await lkapi.room.create_room(CreateRoomRequest(name=room_name, empty_timeout=60))
+                try:
+                    if mode == "cold":
+                        elapsed = await cold_join(room_name, identity, agent_name)
+                    else:
+                        elapsed = await pooled_join(pool, room_name, identity, agent_name)
+                    results[mode].append(elapsed)
+                    print(f"⏱️ {mode} run {i + 1}/{runs}: {elapsed:.2f}s")
+                except Exception as e:
+                    print(f"❌ {mode} run {i + 1}/{runs} failed: {e}")
+                finally:
+                    await lkapi.room.delete_room(DeleteRoomRequest(room=room_name))
+    finally:
+        await pool.aclose()
+        await lkapi.aclose()
+
+    print("\nJoin-to-first-audio:")
+    for mode, samples in results.items():
+        summarize(mode, samples)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.runs))
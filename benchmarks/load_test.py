@@ -0,0 +1,344 @@
+"""
+Load test: ramp up concurrent rooms of synthetic users until turn latency or
+failures break down.
+
+Meant for a server running on this machine against stub providers and a local
+LiveKit server, so it costs nothing and can run in CI:
+
+    livekit-server --dev &
+    LIVEKIT_URL=ws://127.0.0.1:7880 LIVEKIT_API_KEY=devkey LIVEKIT_API_SECRET=secret \\
+        AGENT_PROVIDERS=stub uvicorn main:app --port 8000 &
+    python -m benchmarks.load_test --wav speech.wav --max-rooms 32 --min-rooms 4
+
+Each room gets the personas and one synthetic user, provisioned through
+/provision-rooms. The user speaks the WAV file (16-bit PCM speech, so the
+agents' VAD picks it up), waits for a persona to answer and measures the time
+from the end of its speech to the first reply audio. Levels go
+--start, --start + --step, ... rooms; the first level whose p95 turn latency
+exceeds --max-p95 or whose failure rate exceeds --max-failure-rate is the
+breakdown point.
+
+Reports rooms per core (largest healthy level / cores), memory per session
+(RSS of the server and agent_runner.py processes over the idle baseline),
+CPU and turn latency percentiles per level. Exits non-zero when fewer than
+--min-rooms rooms were healthy, so CI can catch scaling regressions.
+"""
+import sys
+import json
+import time
+import uuid
+import wave
+import asyncio
+import argparse
+from typing import List, Optional
+
+import aiohttp
+import numpy as np
+import psutil
+from livekit import rtc
+
+from latency_metrics import percentile
+
+FRAME_MS = 20
+# RMS (16-bit PCM) above which a persona's audio counts as speech
+AGENT_AUDIO_ENERGY = 300
+# Agent audio must pause this long before the user takes the next turn
+QUIET_SECONDS = 1.0
+JOIN_TIMEOUT = 30
+# Time the lead persona's opener gets to start before the user first speaks
+OPENER_WAIT = 4
+
+
+def load_wav(path: str):
+    """Mono 16-bit samples and sample rate of a PCM WAV file"""
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{path} must be 16-bit PCM")
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+        samples = samples.reshape(-1, f.getnchannels())[:, 0].copy()
+        return samples, f.getframerate()
+
+
+def server_processes() -> List[psutil.Process]:
+    """The API server and its agent workers running on this machine"""
+    procs = []
+    for proc in psutil.process_iter(["cmdline"]):
+        cmdline = " ".join(proc.info["cmdline"] or [])
+        if "agent_runner.py" in cmdline or "main:app" in cmdline or cmdline.endswith("main.py"):
+            procs.append(proc)
+    return procs
+
+
+def total_rss(procs: List[psutil.Process]) -> int:
+    rss = 0
+    for proc in procs:
+        try:
+            rss += proc.memory_info().rss
+        except psutil.Error:
+            pass
+    return rss
+
+
+def cpu_seconds(procs: List[psutil.Process]) -> float:
+    total = 0.0
+    for proc in procs:
+        try:
+            times = proc.cpu_times()
+            total += times.user + times.system
+        except psutil.Error:
+            pass
+    return total
+
+
+class SyntheticUser:
+    """One human in a room: speaks the WAV, listens for the personas' replies"""
+
+    def __init__(self, room_name: str, samples: np.ndarray, sample_rate: int):
+        self.room_name = room_name
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.room = rtc.Room()
+        self.source = rtc.AudioSource(sample_rate, 1)
+        self.latencies: List[float] = []
+        self.failures = 0
+        self._speech: Optional[np.ndarray] = None
+        self._speech_done = asyncio.Event()
+        self._listening_since: Optional[float] = None
+        self._answered = asyncio.Event()
+        self._last_agent_audio = 0.0
+        self._tasks: List[asyncio.Task] = []
+
+    async def connect(self, url: str, token: str):
+        @self.room.on("track_subscribed")
+        def _on_track_subscribed(track, publication, participant):
+            if track.kind == rtc.TrackKind.KIND_AUDIO:
+                self._tasks.append(asyncio.create_task(self._listen(track)))
+
+        await self.room.connect(url, token)
+        track = rtc.LocalAudioTrack.create_audio_track("mic", self.source)
+        await self.room.local_participant.publish_track(
+            track, rtc.TrackPublishOptions(source=rtc.TrackSource.SOURCE_MICROPHONE)
+        )
+        self._tasks.append(asyncio.create_task(self._publish()))
+
+    async def _publish(self):
+        """Send the microphone in real time: speech when queued, silence otherwise"""
+        samples_per_frame = self.sample_rate * FRAME_MS // 1000
+        silence = np.zeros(samples_per_frame, dtype=np.int16)
+        next_at = time.perf_counter()
+        position = 0
+        while True:
+            if self._speech is not None:
+                chunk = self._speech[position:position + samples_per_frame]
+                position += samples_per_frame
+                if position >= len(self._speech):
+                    self._speech = None
+                    position = 0
+                    self._speech_done.set()
+                if len(chunk) < samples_per_frame:
+                    chunk = np.concatenate([chunk, silence[:samples_per_frame - len(chunk)]])
+            else:
+                chunk = silence
+            await self.source.capture_frame(rtc.AudioFrame(
+                data=chunk.tobytes(), sample_rate=self.sample_rate,
+                num_channels=1, samples_per_channel=samples_per_frame,
+            ))
+            next_at += FRAME_MS / 1000
+            await asyncio.sleep(max(0, next_at - time.perf_counter()))
+
+    async def _listen(self, track: rtc.Track):
+        async for ev in rtc.AudioStream(track):
+            samples = np.frombuffer(ev.frame.data, dtype=np.int16)
+            if samples.size == 0:
+                continue
+            if np.sqrt(np.mean(samples.astype(np.float32) ** 2)) < AGENT_AUDIO_ENERGY:
+                continue
+            now = time.perf_counter()
+            self._last_agent_audio = now
+            if self._listening_since is not None and not self._answered.is_set():
+                self.latencies.append(now - self._listening_since)
+                self._answered.set()
+
+    async def _wait_quiet(self, timeout: float):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() - self._last_agent_audio < QUIET_SECONDS and time.perf_counter() < deadline:
+            await asyncio.sleep(0.1)
+
+    async def talk(self, turns: int, turn_timeout: float):
+        deadline = time.perf_counter() + JOIN_TIMEOUT
+        while not any("-agent-" in p.identity for p in self.room.remote_participants.values()):
+            if time.perf_counter() > deadline:
+                self.failures += turns
+                return
+            await asyncio.sleep(0.2)
+        await asyncio.sleep(OPENER_WAIT)
+
+        for _ in range(turns):
+            await self._wait_quiet(turn_timeout)  # the opener, or the last reply
+            self._answered.clear()
+            self._listening_since = None
+            self._speech_done.clear()
+            self._speech = self.samples
+            await self._speech_done.wait()
+            self._listening_since = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._answered.wait(), turn_timeout)
+            except asyncio.TimeoutError:
+                self.failures += 1
+            self._listening_since = None
+
+    async def aclose(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.room.disconnect()
+
+
+async def run_level(http: aiohttp.ClientSession, args, rooms: int, samples, sample_rate, procs, baseline_rss) -> dict:
+    room_names = [f"load-{uuid.uuid4().hex[:8]}" for _ in range(rooms)]
+    payload = {"rooms": [
+        {"room_name": name, "agents": args.agents, "users": ["load-user"], "auto_cleanup_minutes": 10}
+        for name in room_names
+    ]}
+    started = time.perf_counter()
+    async with http.post(f"{args.api}/provision-rooms", json=payload) as resp:
+        resp.raise_for_status()
+        batch = await resp.json()
+    provision_s = time.perf_counter() - started
+
+    join_failures = 0
+    accepted = []
+    for result in batch["results"]:
+        if result["status"] == "success":
+            accepted.append(result)
+        else:
+            join_failures += 1
+            print(f"  ❌ {result['room_name']}: {result.get('status_code')} {result.get('detail')}")
+    users = [SyntheticUser(result["room_name"], samples, sample_rate) for result in accepted]
+
+    try:
+        connected = []
+        for user, result in zip(users, accepted):
+            try:
+                await user.connect(batch["url"], result["user_tokens"]["load-user"])
+                connected.append(user)
+            except Exception as e:
+                join_failures += 1
+                print(f"  ❌ user could not join {user.room_name}: {e}")
+
+        cpu_before, wall_before = cpu_seconds(procs()), time.perf_counter()
+        await asyncio.gather(*(user.talk(args.turns, args.turn_timeout) for user in connected))
+        cpu_used = cpu_seconds(procs()) - cpu_before
+        wall = time.perf_counter() - wall_before
+        rss = total_rss(procs())
+    finally:
+        await asyncio.gather(*(user.aclose() for user in users), return_exceptions=True)
+        for name in room_names:
+            try:
+                async with http.post(f"{args.api}/leave-room", params={"room_name": name}):
+                    pass
+            except aiohttp.ClientError:
+                pass
+
+    latencies = [latency for user in users for latency in user.latencies]
+    attempted = rooms * args.turns
+    failed = join_failures * args.turns + sum(user.failures for user in users)
+    sessions = (rooms - join_failures) * len(args.agents)
+    return {
+        "rooms": rooms,
+        "sessions": sessions,
+        "provision_s": round(provision_s, 2),
+        "turns": len(latencies),
+        "failure_rate": round(failed / attempted, 3) if attempted else 0.0,
+        "p50_s": round(percentile(latencies, 0.50), 3) if latencies else None,
+        "p95_s": round(percentile(latencies, 0.95), 3) if latencies else None,
+        "p99_s": round(percentile(latencies, 0.99), 3) if latencies else None,
+        "cpu_cores": round(cpu_used / wall, 2) if wall else 0.0,
+        "memory_per_session_mb": round((rss - baseline_rss) / sessions / 2**20, 1) if sessions else None,
+    }
+
+
+def healthy(level: dict, args) -> bool:
+    return (
+        level["failure_rate"] <= args.max_failure_rate
+        and level["p95_s"] is not None
+        and level["p95_s"] <= args.max_p95
+    )
+
+
+async def main(args) -> int:
+    samples, sample_rate = load_wav(args.wav)
+    cores = psutil.cpu_count() or 1
+    levels = []
+    breakdown = None
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=300)) as http:
+        baseline_rss = total_rss(server_processes())
+        rooms = args.start
+        while rooms <= args.max_rooms:
+            print(f"🏋️ {rooms} concurrent rooms...")
+            level = await run_level(http, args, rooms, samples, sample_rate, server_processes, baseline_rss)
+            levels.append(level)
+            print(
+                f"  p50={level['p50_s']}s p95={level['p95_s']}s p99={level['p99_s']}s "
+                f"failures={level['failure_rate']:.1%} cpu={level['cpu_cores']} cores "
+                f"mem/session={level['memory_per_session_mb']} MB"
+            )
+            if not healthy(level, args):
+                breakdown = level
+                break
+            await asyncio.sleep(args.settle)  # let the rooms wind down before the next level
+            rooms += args.step
+
+        async with http.get(f"{args.api}/metrics/summary") as resp:
+            stage_latency = (await resp.json()).get("latency") if resp.status == 200 else None
+
+    best = max((level["rooms"] for level in levels if healthy(level, args)), default=0)
+    report = {
+        "cores": cores,
+        "max_healthy_rooms": best,
+        "rooms_per_core": round(best / cores, 2),
+        "breakdown_at_rooms": breakdown["rooms"] if breakdown else None,
+        "levels": levels,
+        "stage_latency": stage_latency,
+    }
+
+    print(f"\n{'rooms':>6} {'p50':>7} {'p95':>7} {'p99':>7} {'fail':>6} {'cpu':>6} {'MB/sess':>8}")
+    for level in levels:
+        print(
+            f"{level['rooms']:>6} {str(level['p50_s']):>7} {str(level['p95_s']):>7} {str(level['p99_s']):>7} "
+            f"{level['failure_rate']:>6.1%} {level['cpu_cores']:>6} {str(level['memory_per_session_mb']):>8}"
+        )
+    print(f"\nHealthy up to {best} rooms ({report['rooms_per_core']} per core on {cores} cores)")
+    if breakdown:
+        print(f"Breaks down at {breakdown['rooms']} rooms")
+    else:
+        print(f"No breakdown up to {args.max_rooms} rooms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if best < args.min_rooms:
+        print(f"❌ Fewer than {args.min_rooms} healthy rooms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--api", default="http://127.0.0.1:8000", help="base URL of the running server")
+    parser.add_argument("--wav", required=True, help="16-bit PCM WAV of a short spoken question")
+    parser.add_argument("--agents", nargs="+", default=["priya", "alex"])
+    parser.add_argument("--start", type=int, default=1)
+    parser.add_argument("--step", type=int, default=2)
+    parser.add_argument("--max-rooms", type=int, default=16)
+    parser.add_argument("--turns", type=int, default=3, help="user turns per room and level")
+    parser.add_argument("--turn-timeout", type=float, default=15)
+    parser.add_argument("--settle", type=float, default=5, help="seconds between levels")
+    parser.add_argument("--max-p95", type=float, default=3.0, help="p95 turn latency (s) still counted as healthy")
+    parser.add_argument("--max-failure-rate", type=float, default=0.05)
+    parser.add_argument("--min-rooms", type=int, default=0, help="fail (exit 1) below this many healthy rooms")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args)))
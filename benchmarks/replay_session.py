@@ -0,0 +1,358 @@
+"""
+Replay a recorded agent session and report per-stage turn latency.
+
+Record sessions by setting SESSION_RECORD_DIR on the server (or a standalone
+agent_runner.py). A replay feeds the recorded user audio, paced by its
+recorded timestamps, through a ManagedAgentSession running this checkout's
+PersonaAgent and Silero VAD, without a room. The providers answer either from
+the recording (the same transcripts at the same points in the audio, the
+same LLM replies with their token timing, TTS with the recorded time to
+first byte and audio length) or from the offline stubs. Turn decisions are
+taken from the recording too, so the same turns get replies.
+
+Run the replay on two checkouts and compare them:
+    python -m benchmarks.replay_session recordings/priya-agent-demo-20250101-120000.rec.gz --json before.json
+    python -m benchmarks.replay_session recordings/priya-agent-demo-20250101-120000.rec.gz --compare before.json
+
+Scripted lines (the opener) are not replayed.
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import Dict, List, Optional
+
+from livekit import rtc
+from livekit.agents import llm, stt, tts, utils
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN, APIConnectOptions, NotGivenOr
+from livekit.agents.voice.io import AudioInput, AudioOutput
+from livekit.plugins import silero
+
+from agent_runner import PERSONAS, ManagedAgentSession, PersonaAgent
+from latency_metrics import TURN_STAGES, TurnTimer, percentile
+from session_recorder import Recording
+from stub_providers import StubLLM, StubSTT, StubTTS
+
+# Silence fed after the recorded audio, so the last turn can finish
+TAIL_SECONDS = 8
+TAIL_FRAME_MS = 20
+
+
+class ReplaySTT(stt.STT):
+    """Emits the recorded transcripts once as much audio has been heard as when they were recorded"""
+
+    def __init__(self, recording: Recording):
+        super().__init__(capabilities=stt.STTCapabilities(streaming=True, interim_results=True))
+        self._label = recording.meta.get("providers", {}).get("stt", self._label)
+        self._pending = [
+            event for _, event in recording.of_kind("stt")
+            if event["type"] in (stt.SpeechEventType.INTERIM_TRANSCRIPT.value, stt.SpeechEventType.FINAL_TRANSCRIPT.value)
+        ]
+        # Shared by every stream, in case the session opens a new one
+        self.audio_seconds = 0.0
+
+    def due(self) -> List[stt.SpeechEvent]:
+        events = []
+        while self._pending and self._pending[0]["audio_s"] <= self.audio_seconds:
+            event = self._pending.pop(0)
+            events.append(stt.SpeechEvent(
+                type=stt.SpeechEventType(event["type"]),
+                alternatives=[stt.SpeechData(language="en", text=event["text"], confidence=1.0)],
+            ))
+        return events
+
+    async def _recognize_impl(self, buffer, *, language=NOT_GIVEN, conn_options=DEFAULT_API_CONNECT_OPTIONS):
+        raise NotImplementedError("ReplaySTT only streams")
+
+    def stream(
+        self,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "ReplayRecognizeStream":
+        return ReplayRecognizeStream(stt=self, conn_options=conn_options)
+
+
+class ReplayRecognizeStream(stt.RecognizeStream):
+    async def _run(self):
+        replay: ReplaySTT = self._stt
+        async for item in self._input_ch:
+            if isinstance(item, self._FlushSentinel):
+                continue
+            replay.audio_seconds += item.samples_per_channel / item.sample_rate
+            for ev in replay.due():
+                self._event_ch.send_nowait(ev)
+
+
+class ReplayLLM(llm.LLM):
+    """Answers with the recorded replies, in order, at their recorded token timing"""
+
+    def __init__(self, recording: Recording):
+        super().__init__()
+        self._label = recording.meta.get("providers", {}).get("llm", self._label)
+        self._replies = recording.llm_replies()
+        self._fallback = StubLLM()
+
+    def chat(self, *, chat_ctx, tools=None, conn_options=DEFAULT_API_CONNECT_OPTIONS, **kwargs) -> llm.LLMStream:
+        if not self._replies:
+            print("⚠️ Recording has no more LLM replies, answering with a stub")
+            return self._fallback.chat(chat_ctx=chat_ctx, tools=tools, conn_options=conn_options)
+        return ReplayLLMStream(self, self._replies.pop(0), chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options)
+
+
+class ReplayLLMStream(llm.LLMStream):
+    def __init__(self, replay: ReplayLLM, reply, **kwargs):
+        super().__init__(replay, **kwargs)
+        self._reply = reply
+
+    async def _run(self):
+        request_id = utils.shortuuid()
+        started = time.perf_counter()
+        for offset, text in self._reply:
+            await asyncio.sleep(max(0, started + offset - time.perf_counter()))
+            self._event_ch.send_nowait(llm.ChatChunk(id=request_id, delta=llm.ChoiceDelta(role="assistant", content=text)))
+
+
+class ReplayTTS(tts.TTS):
+    """Answers each sentence with silence after the recorded time to first byte, as long as the recorded audio"""
+
+    def __init__(self, recording: Recording, sample_rate: int = 24000):
+        super().__init__(capabilities=tts.TTSCapabilities(streaming=False), sample_rate=sample_rate, num_channels=1)
+        self._label = recording.meta.get("providers", {}).get("tts", self._label)
+        self._syntheses = [m for m in recording.metrics("tts_metrics") if not m["cancelled"]]
+        self._fallback = StubTTS()
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> tts.ChunkedStream:
+        if not self._syntheses:
+            return self._fallback.synthesize(text, conn_options=conn_options)
+        return ReplayChunkedStream(self, self._syntheses.pop(0), text, conn_options)
+
+
+class ReplayChunkedStream(tts.ChunkedStream):
+    def __init__(self, replay: ReplayTTS, synthesis: dict, text: str, conn_options: APIConnectOptions):
+        super().__init__(tts=replay, input_text=text, conn_options=conn_options)
+        self._synthesis = synthesis
+
+    async def _run(self):
+        request_id = utils.shortuuid()
+        samples_per_frame = self._tts.sample_rate // 10
+        silence = bytes(samples_per_frame * 2)
+        await asyncio.sleep(self._synthesis["ttfb"])
+        for _ in range(max(1, round(self._synthesis["audio_duration"] * 10))):
+            frame = rtc.AudioFrame(silence, self._tts.sample_rate, 1, samples_per_frame)
+            self._event_ch.send_nowait(tts.SynthesizedAudio(request_id=request_id, frame=frame))
+
+
+class ReplayArbiter:
+    """Hands out the recorded turn decisions in order (and replies once they run out)"""
+
+    def __init__(self, persona: str, decisions: List[bool]):
+        self.persona = persona
+        self._decisions = list(decisions)
+
+    def should_respond(self, persona: str, transcript: str) -> bool:
+        return self._decisions.pop(0) if self._decisions else True
+
+    def predict(self, transcript: str) -> Optional[str]:
+        respond = self._decisions[0] if self._decisions else True
+        return self.persona if respond else None
+
+    def record_spoke(self, persona: str):
+        pass
+
+
+class ReplayAudioInput(AudioInput):
+    """The recorded user audio at its recorded pace, then a tail of silence"""
+
+    def __init__(self, recording: Recording, speed: float):
+        self._frames = list(recording.audio)
+        self._speed = speed
+        self._index = 0
+        self._started: Optional[float] = None
+        self._tail_left = TAIL_SECONDS * 1000 // TAIL_FRAME_MS
+        self._tail_rate = self._frames[0][1].sample_rate if self._frames else 16000
+        self.done = asyncio.Event()
+
+    async def __anext__(self) -> rtc.AudioFrame:
+        if self._started is None:
+            self._started = time.perf_counter()
+            self._first_t = self._frames[0][0] if self._frames else 0.0
+        if self._index < len(self._frames):
+            t, frame = self._frames[self._index]
+            self._index += 1
+            await asyncio.sleep(max(0, self._started + (t - self._first_t) / self._speed - time.perf_counter()))
+            return frame
+        if self._tail_left > 0:
+            self._tail_left -= 1
+            await asyncio.sleep(TAIL_FRAME_MS / 1000 / self._speed)
+            samples = self._tail_rate * TAIL_FRAME_MS // 1000
+            return rtc.AudioFrame(bytes(samples * 2), self._tail_rate, 1, samples)
+        self.done.set()
+        raise StopAsyncIteration
+
+
+class ReplayAudioOutput(AudioOutput):
+    """Plays nothing, but takes as long as the audio would have to play out"""
+
+    def __init__(self):
+        super().__init__(next_in_chain=None)
+        self._pushed = 0.0
+        self._first_frame_at: Optional[float] = None
+        self._playout: Optional[asyncio.TimerHandle] = None
+
+    async def capture_frame(self, frame: rtc.AudioFrame):
+        await super().capture_frame(frame)
+        if self._first_frame_at is None:
+            self._first_frame_at = time.perf_counter()
+        self._pushed += frame.samples_per_channel / frame.sample_rate
+
+    def flush(self):
+        super().flush()
+        if self._first_frame_at is None:
+            return
+        remaining = max(0.0, self._first_frame_at + self._pushed - time.perf_counter())
+        self._playout = asyncio.get_running_loop().call_later(remaining, self._finish, False)
+
+    def clear_buffer(self):
+        if self._playout is not None:
+            self._playout.cancel()
+        if self._first_frame_at is not None:
+            self._finish(True)
+
+    def _finish(self, interrupted: bool):
+        played = min(self._pushed, time.perf_counter() - self._first_frame_at)
+        self._pushed = 0.0
+        self._first_frame_at = None
+        self._playout = None
+        self.on_playback_finished(playback_position=played, interrupted=interrupted)
+
+
+def recorded_stages(recording: Recording) -> Dict[str, List[float]]:
+    """The stage timings of the recorded session itself, for comparison"""
+    stages: Dict[str, List[float]] = {stage: [] for stage in TURN_STAGES}
+    for m in recording.metrics("eou_metrics"):
+        stages["stt_final"].append(m["transcription_delay"])
+        stages["end_of_turn"].append(m["end_of_utterance_delay"])
+    for m in recording.metrics("llm_metrics"):
+        if not m["cancelled"]:
+            stages["llm_ttft"].append(m["ttft"])
+            stages["llm_done"].append(m["duration"])
+    timed = set()
+    for m in recording.metrics("tts_metrics"):
+        if not m["cancelled"] and m["speech_id"] not in timed:
+            timed.add(m["speech_id"])
+            stages["tts_ttfb"].append(m["ttfb"])
+
+    # Same rule as TurnTimer: user speech end to the first audio of an LLM reply
+    speech_ended_at = None
+    replying = False
+    user_state = None
+    for t, event in recording.events:
+        if event["kind"] == "user_state":
+            if event["state"] == "speaking":
+                speech_ended_at, replying = None, False
+            elif user_state == "speaking":
+                speech_ended_at = t
+            user_state = event["state"]
+        elif event["kind"] == "speech" and event["source"] == "generate_reply":
+            replying = True
+        elif event["kind"] == "agent_state" and event["state"] == "speaking" and replying and speech_ended_at is not None:
+            stages["first_audio"].append(t - speech_ended_at)
+            speech_ended_at, replying = None, False
+    return stages
+
+
+def summarize(stages: Dict[str, List[float]]) -> Dict[str, dict]:
+    return {
+        stage: {
+            "count": len(samples),
+            "p50_ms": round(percentile(samples, 0.50) * 1000),
+            "p95_ms": round(percentile(samples, 0.95) * 1000),
+            "max_ms": round(max(samples) * 1000),
+        }
+        for stage, samples in stages.items() if samples
+    }
+
+
+async def replay(recording: Recording, providers: str, speed: float) -> Dict[str, List[float]]:
+    persona = recording.meta["persona"]
+    if providers == "recorded":
+        stt_model, llm_model, tts_model = ReplaySTT(recording), ReplayLLM(recording), ReplayTTS(recording)
+    else:
+        stt_model, llm_model, tts_model = StubSTT(), StubLLM(), StubTTS()
+
+    session = ManagedAgentSession(agent_name=persona, vad=silero.VAD.load(), stt=stt_model, llm=llm_model, tts=tts_model)
+    agent = PersonaAgent(persona, PERSONAS.get(persona).prompt, ReplayArbiter(persona, recording.turn_decisions()))
+
+    stages: Dict[str, List[float]] = {stage: [] for stage in TURN_STAGES}
+
+    def collect(event: str, stage: str, seconds: float, **fields):
+        stages[stage].append(seconds)
+
+    TurnTimer(session, "replay", persona, collect, providers={
+        "stt": stt_model.label, "llm": llm_model.label, "tts": tts_model.label,
+    })
+
+    audio_input = ReplayAudioInput(recording, speed)
+    session.input.audio = audio_input
+    session.output.audio = ReplayAudioOutput()
+    await session.start(agent=agent)
+    try:
+        await audio_input.done.wait()
+    finally:
+        await session.aclose()
+    return stages
+
+
+def print_table(title: str, summary: Dict[str, dict], baseline: Optional[Dict[str, dict]] = None):
+    print(f"\n{title}")
+    print(f"{'stage':>12} {'n':>4} {'p50':>7} {'p95':>7} {'max':>7}" + (f" {'Δp50':>7} {'Δp95':>7}" if baseline else ""))
+    for stage in TURN_STAGES:
+        if stage not in summary:
+            continue
+        row = summary[stage]
+        line = f"{stage:>12} {row['count']:>4} {row['p50_ms']:>5}ms {row['p95_ms']:>5}ms {row['max_ms']:>5}ms"
+        if baseline and stage in baseline:
+            line += f" {row['p50_ms'] - baseline[stage]['p50_ms']:>+5}ms {row['p95_ms'] - baseline[stage]['p95_ms']:>+5}ms"
+        print(line)
+
+
+async def main(args) -> int:
+    recording = Recording(args.recording)
+    if not recording.meta:
+        print(f"❌ {args.recording} is not a session recording")
+        return 1
+    print(
+        f"📼 {recording.meta['identity']}: {recording.duration:.0f}s, {len(recording.audio)} audio frames, "
+        f"{len(recording.events)} events, providers: {args.providers}"
+    )
+
+    report = {
+        "recording": args.recording,
+        "providers": args.providers,
+        "recorded": summarize(recorded_stages(recording)),
+        "replay": summarize(await replay(recording, args.providers, args.speed)),
+    }
+    print_table("Recorded session", report["recorded"])
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["replay"]
+    print_table("Replay" + (f" (Δ vs {args.compare})" if baseline else ""), report["replay"], baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("recording", help="a .rec.gz file written with SESSION_RECORD_DIR set")
+    parser.add_argument("--providers", choices=["recorded", "stub"], default="recorded")
+    parser.add_argument("--speed", type=float, default=1.0, help="audio pace; above 1 skews latency numbers")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="an earlier --json report to show deltas against")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,109 @@
+"""
+Idle cost and teardown latency of agent sessions.
+
+1. Idle CPU: runs N silent Alex sessions (one room each) in a single
+   multi-room worker and compares the worker's CPU use over an idle window
+   with the same window before any session started.
+2. Teardown: starts a cold agent_runner.py process, deletes its room and
+   measures the time from the delete call to the process exiting.
+
+Usage (from the repo root, with a valid .env):
+    python -m benchmarks.session_lifetime --sessions 20 --window 30
+"""
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+
+import psutil
+from livekit.api import LiveKitAPI, CreateRoomRequest, DeleteRoomRequest
+
+from main import LIVEKIT_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET, create_agent_token
+from worker_pool import WorkerPool, AgentWorker, AGENT_RUNNER_SCRIPT
+
+JOIN_TIMEOUT = 60
+
+
+async def cpu_seconds_over(pid: int, window: float) -> float:
+    """CPU time (user + system) the process spends during `window` seconds"""
+    proc = psutil.Process(pid)
+    before = proc.cpu_times()
+    await asyncio.sleep(window)
+    after = proc.cpu_times()
+    return (after.user - before.user) + (after.system - before.system)
+
+
+async def measure_idle_cpu(lkapi: LiveKitAPI, sessions: int, window: float):
+    pool = WorkerPool(size=1, sessions_per_worker=sessions)
+    await pool.start()
+    rooms = [f"bench-idle-{uuid.uuid4().hex[:8]}" for _ in range(sessions)]
+    try:
+        await pool.wait_warm()
+        worker = await pool.acquire()
+
+        baseline = await cpu_seconds_over(worker.pid, window)
+
+        joined = []
+        for room_name in rooms:
+            await lkapi.room.create_room(CreateRoomRequest(name=room_name, empty_timeout=60))
+            identity = f"alex-agent-{room_name}"
+            joined.append(asyncio.create_task(
+                worker.wait_for_event("joined", JOIN_TIMEOUT, room=room_name)
+            ))
+            await pool.dispatch(room_name, identity, "alex", create_agent_token(room_name, identity, "alex"))
+        await asyncio.gather(*joined)
+        await asyncio.sleep(2)  # let session start-up work settle
+
+        loaded = await cpu_seconds_over(worker.pid, window)
+        per_session = (loaded - baseline) / sessions
+        print(f"\nIdle CPU over {window:.0f}s:")
+        print(f"  worker, no sessions:  {baseline / window * 100:.2f}% of a core")
+        print(f"  worker, {sessions} sessions: {loaded / window * 100:.2f}% of a core")
+        print(f"  per idle session:     {per_session / window * 100:.3f}% of a core")
+    finally:
+        for room_name in rooms:
+            try:
+                await lkapi.room.delete_room(DeleteRoomRequest(room=room_name))
+            except Exception:
+                pass
+        await pool.aclose()
+
+
+async def measure_teardown(lkapi: LiveKitAPI):
+    room_name = f"bench-teardown-{uuid.uuid4().hex[:8]}"
+    identity = f"alex-agent-{room_name}"
+    await lkapi.room.create_room(CreateRoomRequest(name=room_name, empty_timeout=60))
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, AGENT_RUNNER_SCRIPT, "--report-events",
+        "--room", room_name, "--identity", identity, "--agent-name", "alex",
+        "--token", create_agent_token(room_name, identity, "alex"),
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+    )
+    agent = AgentWorker(process)
+    try:
+        await agent.wait_for_event("joined", JOIN_TIMEOUT)
+        started = time.perf_counter()
+        await lkapi.room.delete_room(DeleteRoomRequest(room=room_name))
+        await process.wait()
+        print(f"\nRoom deletion to agent process exit: {(time.perf_counter() - started) * 1000:.0f} ms")
+    finally:
+        await agent.stop()
+
+
+async def main(sessions: int, window: float):
+    lkapi = LiveKitAPI(LIVEKIT_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+    try:
+        await measure_idle_cpu(lkapi, sessions, window)
+        await measure_teardown(lkapi)
+    finally:
+        await lkapi.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--window", type=float, default=20, help="idle measurement window in seconds")
+    args = parser.parse_args()
+    asyncio.run(main(args.sessions, args.window))
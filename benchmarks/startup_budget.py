@@ -0,0 +1,95 @@
+"""
+Startup budget check: time from spawning a cold `agent_runner.py` to the agent
+having joined its room, failing when it takes longer than the budget.
+
+Every run spawns a fresh process (stub providers by default, so nothing is
+billed), waits for its "joined" event and prints the start-up phases the
+runner reports (imports, providers, connect with the VAD loading alongside,
+session_start). The bare `import agent_runner` budget needs neither LiveKit
+nor provider keys and is checked by tests/test_startup_budget.py instead.
+
+Usage (from the repo root, with a valid .env and a LiveKit server):
+    python -m benchmarks.startup_budget --runs 5 --budget 3.0
+
+Exits 1 when the slowest run is over budget (a new top-level import, a
+model loaded before connecting).
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import statistics
+
+from livekit.api import LiveKitAPI, CreateRoomRequest, DeleteRoomRequest
+
+from main import LIVEKIT_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET, create_agent_token
+from worker_pool import AgentWorker, AGENT_RUNNER_SCRIPT
+
+JOIN_TIMEOUT = 60
+
+
+async def time_join(lkapi: LiveKitAPI, agent_name: str, env: dict):
+    """Seconds from spawn to "joined" for one cold agent, and the phases it reported"""
+    room_name = f"bench-startup-{uuid.uuid4().hex[:8]}"
+    identity = f"{agent_name}-agent-{room_name}"
+    await lkapi.room.create_room(CreateRoomRequest(name=room_name, empty_timeout=60))
+    token = create_agent_token(room_name, identity, agent_name)
+    try:
+        started = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, AGENT_RUNNER_SCRIPT, "--report-events",
+            "--room", room_name, "--identity", identity,
+            "--agent-name", agent_name, "--token", token,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            env=env,
+        )
+        worker = AgentWorker(process)
+        try:
+            startup = asyncio.ensure_future(worker.wait_for_event("startup", JOIN_TIMEOUT))
+            await worker.wait_for_event("joined", JOIN_TIMEOUT)
+            joined = time.perf_counter() - started
+            return joined, await startup
+        finally:
+            await worker.stop()
+    finally:
+        await lkapi.room.delete_room(DeleteRoomRequest(room=room_name))
+
+
+def summarize(label: str, samples: list, budget: float) -> bool:
+    worst = max(samples)
+    ok = worst <= budget
+    print(
+        f"{label:>8}: n={len(samples)} median={statistics.median(samples):.2f}s "
+        f"max={worst:.2f}s budget={budget:.2f}s {'✅' if ok else '❌ over budget'}"
+    )
+    return ok
+
+
+async def main(args) -> int:
+    env = {**os.environ, "AGENT_PROVIDERS": args.providers}
+    lkapi = LiveKitAPI(LIVEKIT_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+    joins = []
+    try:
+        for i in range(args.runs):
+            joined, startup = await time_join(lkapi, args.agent, env)
+            joins.append(joined)
+            phases = " | ".join(f"{name} {ms:.0f}ms" for name, ms in startup["phases_ms"].items())
+            overlapped = ", ".join(f"{name} {ms:.0f}ms" for name, ms in startup["overlapped_ms"].items())
+            print(f"⏱️ join run {i + 1}/{args.runs}: {joined:.2f}s ({phases}; alongside: {overlapped})")
+    finally:
+        await lkapi.aclose()
+
+    return 0 if summarize("joined", joins, args.budget) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--agent", default="alex", help="persona to start (alex has no opener to wait for)")
+    parser.add_argument("--providers", default="stub", choices=["stub", "live"])
+    parser.add_argument("--budget", type=float, default=3.0, help="seconds from spawn to joined")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args)))
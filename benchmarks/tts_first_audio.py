@@ -0,0 +1,165 @@
+"""
+TTS first-audio latency of a streamed LLM reply through the TTS cache:
+sentence by sentence over HTTP (before) vs the provider's websocket stream
+with only short sentences held back for the cache (after).
+
+Before, CachedTTS advertised streaming=False, so the agent wrapped it in
+livekit's StreamAdapter and every sentence, hit or miss, was a separate
+HTTP synthesis that could only start once the sentence was complete.
+After, CachedSynthesizeStream pushes text to the provider stream as the LLM
+writes it and only holds back sentences short enough to be cached.
+
+The LLM and the provider are simulated: tokens arrive at --tokens-per-sec,
+an HTTP synthesis answers --http-ttfb-ms after it is sent, and the stream
+answers --ws-ttfb-ms after a segment is flushed or has --ws-chunk-chars of
+text (ElevenLabs' first chunk_length_schedule step). Each scenario is
+measured with a cold cache ("miss") and after the same reply was spoken
+once ("hit"), from the first token to the first audio frame. Needs no
+LiveKit server or provider keys:
+
+    python -m benchmarks.tts_first_audio --runs 5
+    python -m benchmarks.tts_first_audio --ws-ttfb-ms 250 --http-ttfb-ms 400 --json tts.json
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+from livekit import rtc
+from livekit.agents import tokenize, tts
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS, APIConnectOptions
+
+from tts_cache import CachedTTS, TTSCache
+
+SAMPLE_RATE = 24000
+# Audio per character of text, roughly ElevenLabs' speaking rate
+AUDIO_MS_PER_CHAR = 60
+
+SCENARIOS = {
+    "short_first": "Sure, happy to help. The meeting was moved to Thursday afternoon because two of the speakers could not make it on Tuesday.",
+    "long_first": "The meeting was moved to Thursday afternoon because two of the speakers could not make it on Tuesday. Anything else?",
+}
+
+
+def _audio(text: str) -> rtc.AudioFrame:
+    samples = SAMPLE_RATE * AUDIO_MS_PER_CHAR * max(1, len(text)) // 1000
+    return rtc.AudioFrame(bytes(2 * samples), SAMPLE_RATE, 1, samples)
+
+
+class SimulatedTTS(tts.TTS):
+    """A provider with a slower HTTP endpoint and a websocket stream"""
+
+    def __init__(self, http_ttfb: float, ws_ttfb: float, ws_chunk_chars: int):
+        super().__init__(capabilities=tts.TTSCapabilities(streaming=True), sample_rate=SAMPLE_RATE, num_channels=1)
+        self.http_ttfb = http_ttfb
+        self.ws_ttfb = ws_ttfb
+        self.ws_chunk_chars = ws_chunk_chars
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "SimulatedChunkedStream":
+        return SimulatedChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+    def stream(self, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "SimulatedSynthesizeStream":
+        return SimulatedSynthesizeStream(tts=self, conn_options=conn_options)
+
+
+class SimulatedChunkedStream(tts.ChunkedStream):
+    async def _run(self):
+        await asyncio.sleep(self._tts.http_ttfb)
+        self._event_ch.send_nowait(tts.SynthesizedAudio(request_id="http", frame=_audio(self._input_text)))
+
+
+class SimulatedSynthesizeStream(tts.SynthesizeStream):
+    """One segment per flush, each starting to play ws_ttfb after enough of its text arrived"""
+
+    async def _run(self):
+        simulated = self._tts
+        segment = ""
+        started = None
+
+        async def _speak(text: str, ready_at: float):
+            await asyncio.sleep(max(0.0, ready_at + simulated.ws_ttfb - time.perf_counter()))
+            self._event_ch.send_nowait(tts.SynthesizedAudio(request_id="ws", frame=_audio(text), is_final=True))
+
+        async for data in self._input_ch:
+            if isinstance(data, str):
+                self._mark_started()
+                segment += data
+                if started is None and len(segment) >= simulated.ws_chunk_chars:
+                    started = time.perf_counter()
+            elif segment:
+                await _speak(segment, started or time.perf_counter())
+                segment, started = "", None
+        if segment:
+            await _speak(segment, started or time.perf_counter())
+
+
+async def first_audio_ms(voice: tts.TTS, reply: str, tokens_per_sec: float) -> float:
+    """Milliseconds from the reply's first token to its first audio frame, as the agent's TTS node sees them"""
+    if not voice.capabilities.streaming:
+        voice = tts.StreamAdapter(tts=voice, sentence_tokenizer=tokenize.basic.SentenceTokenizer())
+    words = [word + " " for word in reply.split()]
+    async with voice.stream() as stream:
+
+        async def _write():
+            for word in words:
+                stream.push_text(word)
+                await asyncio.sleep(1 / tokens_per_sec)
+            stream.end_input()
+
+        writer = asyncio.create_task(_write())
+        started = time.perf_counter()
+        first = None
+        async for _ in stream:
+            if first is None:
+                first = (time.perf_counter() - started) * 1000
+        await writer
+    return first
+
+
+class _NonStreaming(CachedTTS):
+    """CachedTTS as it was: non-streaming, so every sentence is an HTTP synthesis"""
+
+    def __init__(self, wrapped: tts.TTS, cache: TTSCache):
+        super().__init__(wrapped, cache)
+        self._capabilities = tts.TTSCapabilities(streaming=False)
+
+
+async def run(args) -> dict:
+    provider = SimulatedTTS(args.http_ttfb_ms / 1000, args.ws_ttfb_ms / 1000, args.ws_chunk_chars)
+    report = {}
+    for name, reply in SCENARIOS.items():
+        report[name] = {}
+        for path, cls in (("before", _NonStreaming), ("after", CachedTTS)):
+            results = {"miss": [], "hit": []}
+            for _ in range(args.runs):
+                voice = cls(provider, TTSCache(directory=None))
+                results["miss"].append(await first_audio_ms(voice, reply, args.tokens_per_sec))
+                results["hit"].append(await first_audio_ms(voice, reply, args.tokens_per_sec))
+            report[name][path] = {kind: round(statistics.median(ms), 1) for kind, ms in results.items()}
+    return report
+
+
+def main(args) -> int:
+    report = asyncio.run(run(args))
+    for name, paths in report.items():
+        for kind in ("miss", "hit"):
+            before, after = paths["before"][kind], paths["after"][kind]
+            print(f"{name:>12} {kind:>4}: before {before:6.0f} ms, after {after:6.0f} ms first audio")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="replies per scenario and path (the median is reported)")
+    parser.add_argument("--tokens-per-sec", type=float, default=150, help="LLM output rate, one word per token")
+    parser.add_argument("--http-ttfb-ms", type=float, default=400, help="time to first audio of an HTTP synthesis")
+    parser.add_argument("--ws-ttfb-ms", type=float, default=250, help="time to first audio of a stream segment once it can start")
+    parser.add_argument("--ws-chunk-chars", type=int, default=120, help="text a stream segment waits for unless flushed")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+    sys.exit(main(args))
@@ -0,0 +1,149 @@
+"""
+VAD throughput: sessions per core with one Silero inference thread per stream
+vs the batched engine in vad_batcher.py.
+
+Runs N VAD streams in this process, each fed audio in real time (20ms frames,
+streams offset from each other like independent callers), and measures the
+CPU the process used, how far the event loop lagged behind a 10ms ticker and
+how many windows each inference ran. Sessions per core is N divided by the
+cores used. Needs no LiveKit server or provider keys:
+
+    python -m benchmarks.vad_throughput --sessions 8 32 64 --seconds 10
+    python -m benchmarks.vad_throughput --wav speech.wav --max-delay-ms 8 --json vad.json
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+import numpy as np
+import psutil
+from livekit import rtc
+from livekit.agents import vad
+from livekit.plugins import silero
+
+from latency_metrics import percentile
+from vad_batcher import VAD_BATCH_MAX_DELAY_MS, BatchedSileroVAD
+from benchmarks.load_test import load_wav
+
+FRAME_MS = 20
+LAG_TICK = 0.01
+
+
+def synthetic_audio(seconds: float, sample_rate: int) -> np.ndarray:
+    """Bursts of noise between silences; inference costs the same whatever the audio is"""
+    rng = np.random.default_rng(0)
+    samples = np.zeros(int(seconds * sample_rate), dtype=np.int16)
+    for start in range(0, len(samples), 2 * sample_rate):
+        samples[start:start + sample_rate] = rng.normal(0, 3000, len(samples[start:start + sample_rate]))
+    return samples
+
+
+async def feed(stream: vad.VADStream, samples: np.ndarray, sample_rate: int, seconds: float):
+    """Push `seconds` of audio in real time, looping the samples, after a random offset within one frame"""
+    frame_samples = sample_rate * FRAME_MS // 1000
+    frames = int(seconds * 1000 / FRAME_MS)
+    await asyncio.sleep(random.random() * FRAME_MS / 1000)
+    started = time.perf_counter()
+    for i in range(frames):
+        start = (i * frame_samples) % (len(samples) - frame_samples)
+        stream.push_frame(rtc.AudioFrame(
+            data=samples[start:start + frame_samples].tobytes(),
+            sample_rate=sample_rate,
+            num_channels=1,
+            samples_per_channel=frame_samples,
+        ))
+        await asyncio.sleep(max(0.0, started + (i + 1) * FRAME_MS / 1000 - time.perf_counter()))
+    stream.end_input()
+
+
+async def count_windows(stream: vad.VADStream) -> int:
+    windows = 0
+    async for ev in stream:
+        if ev.type == vad.VADEventType.INFERENCE_DONE:
+            windows += 1
+    return windows
+
+
+async def measure_lag(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        before = time.perf_counter()
+        await asyncio.sleep(LAG_TICK)
+        lags.append(time.perf_counter() - before - LAG_TICK)
+
+
+async def run_level(model: vad.VAD, sessions: int, samples: np.ndarray, sample_rate: int, seconds: float) -> dict:
+    process = psutil.Process()
+    streams = [model.stream() for _ in range(sessions)]
+    lags = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop, lags))
+
+    cpu_before = sum(process.cpu_times()[:2])
+    started = time.perf_counter()
+    counters = [asyncio.create_task(count_windows(stream)) for stream in streams]
+    await asyncio.gather(*(feed(stream, samples, sample_rate, seconds) for stream in streams))
+    windows = sum(await asyncio.gather(*counters))
+    wall = time.perf_counter() - started
+    cpu = sum(process.cpu_times()[:2]) - cpu_before
+
+    stop.set()
+    await lag_task
+    for stream in streams:
+        await stream.aclose()
+
+    cores = cpu / wall
+    return {
+        "sessions": sessions,
+        "cores": round(cores, 3),
+        "sessions_per_core": round(sessions / cores, 1) if cores else None,
+        "windows_per_s": round(windows / wall, 1),
+        "loop_lag_p95_ms": round(percentile(lags, 0.95) * 1000, 2),
+        "loop_lag_max_ms": round(max(lags) * 1000, 2),
+    }
+
+
+async def main(args) -> int:
+    if args.wav:
+        samples, sample_rate = load_wav(args.wav)
+    else:
+        sample_rate = 16000
+        samples = synthetic_audio(10, sample_rate)
+
+    models = {"unbatched": silero.VAD.load(), "batched": BatchedSileroVAD.load()}
+    models["batched"].batcher.max_delay = args.max_delay_ms / 1000
+    report = {"max_delay_ms": args.max_delay_ms, "levels": []}
+
+    for sessions in args.sessions:
+        for mode, model in models.items():
+            if mode == "batched":
+                windows, batches = model.batcher.windows, model.batcher.batches
+            result = {"mode": mode, **await run_level(model, sessions, samples, sample_rate, args.seconds)}
+            if mode == "batched":
+                batches = model.batcher.batches - batches
+                result["mean_batch"] = round((model.batcher.windows - windows) / batches, 2) if batches else 0.0
+            report["levels"].append(result)
+            print(
+                f"{mode:>9} x{sessions:<4} {result['sessions_per_core']} sessions/core "
+                f"({result['cores']:.2f} cores, {result['windows_per_s']:.0f} windows/s, "
+                f"loop lag p95 {result['loop_lag_p95_ms']:.1f}ms max {result['loop_lag_max_ms']:.1f}ms"
+                + (f", {result['mean_batch']} windows/batch)" if mode == "batched" else ")")
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[8, 32, 64], help="concurrent streams per level")
+    parser.add_argument("--seconds", type=float, default=10, help="seconds of audio each stream gets per level")
+    parser.add_argument("--wav", help="16-bit PCM WAV to feed instead of synthetic noise bursts")
+    parser.add_argument("--max-delay-ms", type=float, default=VAD_BATCH_MAX_DELAY_MS)
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args)))
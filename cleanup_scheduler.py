@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import heapq
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from cluster import CLUSTER_STATE_SUFFIX
+from structured_log import get_logger
+
+# Where pending cleanups survive restarts (one file per node)
+CLEANUP_STATE_FILE = os.getenv(
+    "CLEANUP_STATE_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "state", f"cleanup{CLUSTER_STATE_SUFFIX}.json"),
+)
+# Seconds a room may go without any human, once one had joined, before it is torn down
+ROOM_IDLE_GRACE = float(os.getenv("ROOM_IDLE_GRACE", "60"))
+# Seconds a room no human ever joined (e.g. provisioned ahead of its users) is kept
+ROOM_NO_SHOW_GRACE = float(os.getenv("ROOM_NO_SHOW_GRACE", "1800"))
+
+
+log = get_logger()
+
+
+class CleanupScheduler:
+    """
+    One timer heap for every room teardown this node has promised.
+
+    Each room can have one timer per kind ("expiry" for auto_cleanup_minutes,
+    "idle" for rooms humans left, "no_show" for rooms none joined); scheduling a kind again replaces its
+    deadline, cancelling removes it. Deadlines are wall-clock times written to
+    CLEANUP_STATE_FILE on every change, so a restart picks them up again and
+    fires the overdue ones right away.
+
+    As a dispatcher listener it also turns the agents' "occupancy" reports
+    into timers: a room whose humans left is torn down after `idle_grace`
+    seconds unless one joins again before that. A room no human has joined
+    yet (the agents report in as soon as they connect, often well before
+    their users) only gets the much longer `no_show_grace`.
+    """
+
+    def __init__(
+        self,
+        on_due: Callable[[str, str], Awaitable],
+        path: Optional[str] = CLEANUP_STATE_FILE,
+        idle_grace: float = ROOM_IDLE_GRACE,
+        no_show_grace: float = ROOM_NO_SHOW_GRACE,
+    ):
+        self.on_due = on_due
+        self.path = path
+        self.idle_grace = idle_grace
+        self.no_show_grace = no_show_grace
+        # Rooms a human has been seen in since this node started
+        self._occupied: Set[str] = set()
+        self._heap: List[Tuple[float, int, str, str]] = []
+        # (room, kind) -> (deadline, seq) of the live heap entry
+        self._timers: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self._seq = 0
+        self._wake = asyncio.Event()
+        self._dirty = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        for entry in await asyncio.to_thread(self._load):
+            self._push(entry["room"], entry["kind"], entry["deadline"])
+        if self._timers:
+            log.info("cleanup", f"Restored {len(self._timers)} room cleanup timer(s)")
+        self._tasks = [asyncio.create_task(self._run()), asyncio.create_task(self._save_loop())]
+
+    async def aclose(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.path:
+            await asyncio.to_thread(self._save, self._snapshot())
+
+    # -- Timers --
+
+    def schedule(self, room_name: str, kind: str, delay: float):
+        """Tear `room_name` down in `delay` seconds, replacing any earlier `kind` timer"""
+        self._push(room_name, kind, time.time() + delay)
+        self._changed()
+
+    def cancel(self, room_name: str, kind: Optional[str] = None):
+        """Forget one kind of timer for the room, or all of them"""
+        if kind is None:
+            self._occupied.discard(room_name)
+        keys = [key for key in self._timers if key[0] == room_name and (kind is None or key[1] == kind)]
+        for key in keys:
+            del self._timers[key]  # its heap entry is skipped when it surfaces
+        if keys:
+            self._changed()
+
+    def deadline(self, room_name: str, kind: str) -> Optional[float]:
+        timer = self._timers.get((room_name, kind))
+        return timer[0] if timer else None
+
+    def pending(self) -> List[dict]:
+        now = time.time()
+        return [
+            {"room": room, "kind": kind, "seconds_left": round(deadline - now, 1)}
+            for (room, kind), (deadline, _) in sorted(self._timers.items(), key=lambda item: item[1])
+        ]
+
+    def on_message(self, msg: dict):
+        """Dispatcher listener"""
+        if msg.get("event") != "occupancy":
+            return
+        room_name = msg["room"]
+        if msg["humans"] > 0:
+            self._occupied.add(room_name)
+            self.cancel(room_name, "idle")
+            self.cancel(room_name, "no_show")
+        elif room_name in self._occupied:
+            if (room_name, "idle") not in self._timers:
+                log.info("cleanup", f"No humans, tearing the room down in {self.idle_grace:.0f}s unless someone joins", room=room_name)
+                self.schedule(room_name, "idle", self.idle_grace)
+        elif (room_name, "no_show") not in self._timers:
+            log.info("cleanup", f"No human has joined yet, tearing the room down in {self.no_show_grace:.0f}s unless someone does", room=room_name)
+            self.schedule(room_name, "no_show", self.no_show_grace)
+
+    def _push(self, room_name: str, kind: str, deadline: float):
+        self._seq += 1
+        self._timers[(room_name, kind)] = (deadline, self._seq)
+        heapq.heappush(self._heap, (deadline, self._seq, room_name, kind))
+
+    def _changed(self):
+        self._wake.set()
+        self._dirty.set()
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            # Drop heap entries that were cancelled or rescheduled
+            while self._heap and self._timers.get(self._heap[0][2:]) != self._heap[0][:2]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                await self._wake.wait()
+                continue
+
+            deadline, _, room_name, kind = self._heap[0]
+            delay = deadline - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            del self._timers[(room_name, kind)]
+            self._dirty.set()
+            asyncio.create_task(self._fire(room_name, kind))
+
+    async def _fire(self, room_name: str, kind: str):
+        log.info("cleanup", f"Cleanup timer '{kind}' fired", room=room_name, kind=kind)
+        try:
+            await self.on_due(room_name, kind)
+        except Exception as e:
+            log.error("cleanup", f"Cleanup failed: {e}", room=room_name, kind=kind)
+
+    # -- Persistence --
+
+    def _snapshot(self) -> List[dict]:
+        return [
+            {"room": room, "kind": kind, "deadline": deadline}
+            for (room, kind), (deadline, _) in self._timers.items()
+        ]
+
+    async def _save_loop(self):
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            if self.path:
+                try:
+                    await asyncio.to_thread(self._save, self._snapshot())
+                except OSError as e:
+                    log.warning("cleanup", f"Could not persist cleanup timers: {e}")
+
+    def _save(self, entries: List[dict]):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp, self.path)
+
+    def _load(self) -> List[dict]:
+        if not self.path:
+            return []
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+        except ValueError as e:
+            log.warning("cleanup", f"Ignoring unreadable cleanup state {self.path}: {e}")
+            return []
@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from structured_log import get_logger
+
+# Where nodes share their state: empty for a single node, or sqlite:///path/to/cluster.db
+CLUSTER_REGISTRY = os.getenv("CLUSTER_REGISTRY", "")
+# This node's name and the URL other nodes reach its API on
+CLUSTER_NODE_ID = os.getenv("CLUSTER_NODE_ID", f"{socket.gethostname()}-{os.getpid()}")
+CLUSTER_NODE_URL = os.getenv("CLUSTER_NODE_URL", "http://127.0.0.1:8000")
+# Added to the names of this node's state files (cleanup timers, limiter socket) so nodes sharing a
+# checkout keep their own; only an explicitly set CLUSTER_NODE_ID is stable across restarts
+CLUSTER_STATE_SUFFIX = f"-{os.environ['CLUSTER_NODE_ID']}" if os.getenv("CLUSTER_NODE_ID") else ""
+# How often a node reports its load, and when a silent node is considered gone
+CLUSTER_HEARTBEAT_INTERVAL = float(os.getenv("CLUSTER_HEARTBEAT_INTERVAL", "2"))
+CLUSTER_NODE_TIMEOUT = float(os.getenv("CLUSTER_NODE_TIMEOUT", "10"))
+# Header marking a request another node already routed here
+CLUSTER_FORWARDED_HEADER = "X-Cluster-Forwarded-By"
+
+
+log = get_logger()
+
+
+class NodeInfo:
+    """A node as last reported to the registry"""
+
+    def __init__(self, node_id: str, url: str, status: dict, updated_at: float):
+        self.node_id = node_id
+        self.url = url
+        self.status = status
+        self.updated_at = updated_at
+
+    @property
+    def utilization(self) -> float:
+        return self.status.get("utilization", 1.0)
+
+    @property
+    def accepting(self) -> bool:
+        return self.status.get("accepting", False)
+
+    def to_dict(self) -> dict:
+        return {
+            "node_id": self.node_id,
+            "url": self.url,
+            "seconds_since_update": round(time.time() - self.updated_at, 1),
+            **self.status,
+        }
+
+
+class ClusterRegistry(ABC):
+    """Shared record of the nodes in the cluster and which node owns each room"""
+
+    @abstractmethod
+    async def register_node(self, node_id: str, url: str, status: dict): ...
+
+    @abstractmethod
+    async def unregister_node(self, node_id: str): ...
+
+    @abstractmethod
+    async def nodes(self) -> List[NodeInfo]: ...
+
+    @abstractmethod
+    async def claim_room(self, room_name: str, node_id: str): ...
+
+    @abstractmethod
+    async def release_room(self, room_name: str): ...
+
+    @abstractmethod
+    async def room_owner(self, room_name: str) -> Optional[str]: ...
+
+    async def aclose(self):
+        pass
+
+
+class LocalClusterRegistry(ClusterRegistry):
+    """In-memory registry for a single node"""
+
+    def __init__(self):
+        self._nodes: Dict[str, NodeInfo] = {}
+        self._rooms: Dict[str, str] = {}
+
+    async def register_node(self, node_id: str, url: str, status: dict):
+        self._nodes[node_id] = NodeInfo(node_id, url, status, time.time())
+
+    async def unregister_node(self, node_id: str):
+        self._nodes.pop(node_id, None)
+        self._rooms = {room: owner for room, owner in self._rooms.items() if owner != node_id}
+
+    async def nodes(self) -> List[NodeInfo]:
+        return list(self._nodes.values())
+
+    async def claim_room(self, room_name: str, node_id: str):
+        self._rooms[room_name] = node_id
+
+    async def release_room(self, room_name: str):
+        self._rooms.pop(room_name, None)
+
+    async def room_owner(self, room_name: str) -> Optional[str]:
+        return self._rooms.get(room_name)
+
+
+class SQLiteClusterRegistry(ClusterRegistry):
+    """
+    Registry in a SQLite file, so several nodes on one machine (or on a shared
+    volume) can see each other. Queries run in a thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS nodes ("
+            "node_id TEXT PRIMARY KEY, url TEXT NOT NULL, status TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._execute("CREATE TABLE IF NOT EXISTS rooms (room_name TEXT PRIMARY KEY, node_id TEXT NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=5)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def _execute(self, query: str, params: tuple = ()) -> list:
+        db = self._connect()
+        try:
+            with db:  # commits on success
+                return db.execute(query, params).fetchall()
+        finally:
+            db.close()
+
+    async def _run(self, query: str, params: tuple = ()) -> list:
+        return await asyncio.to_thread(self._execute, query, params)
+
+    async def register_node(self, node_id: str, url: str, status: dict):
+        await self._run(
+            "INSERT INTO nodes (node_id, url, status, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(node_id) DO UPDATE SET url = excluded.url, status = excluded.status, "
+            "updated_at = excluded.updated_at",
+            (node_id, url, json.dumps(status), time.time()),
+        )
+
+    async def unregister_node(self, node_id: str):
+        await self._run("DELETE FROM nodes WHERE node_id = ?", (node_id,))
+        await self._run("DELETE FROM rooms WHERE node_id = ?", (node_id,))
+
+    async def nodes(self) -> List[NodeInfo]:
+        rows = await self._run("SELECT node_id, url, status, updated_at FROM nodes")
+        return [NodeInfo(node_id, url, json.loads(status), updated_at) for node_id, url, status, updated_at in rows]
+
+    async def claim_room(self, room_name: str, node_id: str):
+        await self._run(
+            "INSERT INTO rooms (room_name, node_id) VALUES (?, ?) "
+            "ON CONFLICT(room_name) DO UPDATE SET node_id = excluded.node_id",
+            (room_name, node_id),
+        )
+
+    async def release_room(self, room_name: str):
+        await self._run("DELETE FROM rooms WHERE room_name = ?", (room_name,))
+
+    async def room_owner(self, room_name: str) -> Optional[str]:
+        rows = await self._run("SELECT node_id FROM rooms WHERE room_name = ?", (room_name,))
+        return rows[0][0] if rows else None
+
+
+def cluster_registry_from_env(spec: str = CLUSTER_REGISTRY) -> ClusterRegistry:
+    if not spec:
+        return LocalClusterRegistry()
+    if spec.startswith("sqlite:///"):
+        return SQLiteClusterRegistry(spec[len("sqlite:///"):])
+    raise ValueError(f"Unsupported CLUSTER_REGISTRY: {spec!r}")
+
+
+class ClusterNode:
+    """
+    This server as a member of the cluster: it publishes its admission status
+    to the registry and decides which node a room belongs on.
+    """
+
+    def __init__(self, registry: ClusterRegistry, admission, node_id: str = CLUSTER_NODE_ID, url: str = CLUSTER_NODE_URL):
+        self.registry = registry
+        self.admission = admission
+        self.node_id = node_id
+        self.url = url.rstrip("/")
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self.report()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        log.info("cluster", f"Cluster node registered at {self.url}", node=self.node_id)
+
+    async def aclose(self):
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+        await self.registry.unregister_node(self.node_id)
+        await self.registry.aclose()
+
+    async def report(self):
+        await self.registry.register_node(self.node_id, self.url, self.admission.status())
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(CLUSTER_HEARTBEAT_INTERVAL)
+            try:
+                await self.report()
+            except Exception as e:
+                log.warning("cluster", f"Could not report to the cluster registry: {e}", node=self.node_id)
+
+    async def live_nodes(self) -> List[NodeInfo]:
+        """Nodes that reported recently; this node always counts, with its current status"""
+        now = time.time()
+        nodes = [
+            node for node in await self.registry.nodes()
+            if node.node_id != self.node_id and now - node.updated_at < CLUSTER_NODE_TIMEOUT
+        ]
+        return [NodeInfo(self.node_id, self.url, self.admission.status(), now)] + nodes
+
+    async def owner(self, room_name: str) -> Optional[NodeInfo]:
+        """The live node that runs `room_name`, if any"""
+        owner_id = await self.registry.room_owner(room_name)
+        if owner_id is None:
+            return None
+        return next((node for node in await self.live_nodes() if node.node_id == owner_id), None)
+
+    async def placement(self, room_name: str) -> List[NodeInfo]:
+        """
+        Nodes to try for `room_name`, best first: the node already running the
+        room, otherwise accepting nodes from least to most utilized. Empty
+        when no node is accepting joins.
+        """
+        owner = await self.owner(room_name)
+        if owner is not None:
+            return [owner]
+        nodes = sorted(await self.live_nodes(), key=lambda node: node.utilization)
+        return [node for node in nodes if node.accepting]
+
+    def is_self(self, node: NodeInfo) -> bool:
+        return node.node_id == self.node_id
@@ -0,0 +1,176 @@
+import os
+import math
+import asyncio
+import contextvars
+from typing import Callable, List, Optional, Set
+
+from livekit.agents import llm
+
+from provider_limits import BACKGROUND, set_provider_priority
+from structured_log import get_logger
+
+# Tokens of conversation (besides the persona prompt and the summary) sent with each LLM request
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Most recent conversation items always kept word for word, even over budget
+CONTEXT_MIN_RECENT_ITEMS = int(os.getenv("CONTEXT_MIN_RECENT_ITEMS", "4"))
+# Tokens of turns that fell out of the budget collected before they are summarized (sent verbatim until then)
+CONTEXT_SUMMARY_BATCH = int(os.getenv("CONTEXT_SUMMARY_BATCH", "400"))
+# Length the rolling summary is asked to stay under
+CONTEXT_SUMMARY_WORDS = int(os.getenv("CONTEXT_SUMMARY_WORDS", "150"))
+
+SUMMARY_INSTRUCTIONS = (
+    "You keep the running notes of a meeting for {persona}, one of its participants. "
+    "Merge the new part of the conversation into the existing notes. Keep decisions, "
+    "open questions, numbers, names and what {persona} already said or promised. "
+    "Write plain sentences, at most {words} words, and nothing besides the notes."
+)
+
+
+log = get_logger()
+
+
+def estimate_tokens(text: str) -> int:
+    """About four characters per token, close enough for Llama 3 on English to budget with"""
+    return math.ceil(len(text) / 4)
+
+
+def item_text(item: llm.ChatItem) -> str:
+    if item.type == "message":
+        return item.text_content or ""
+    if item.type == "function_call":
+        return f"{item.name}({item.arguments})"
+    if item.type == "function_call_output":
+        return item.output
+    return ""
+
+
+def item_tokens(item: llm.ChatItem) -> int:
+    return estimate_tokens(item_text(item)) + 4  # role and message framing
+
+
+class ContextBudget:
+    """
+    Keeps one persona's LLM requests within a token budget. The persona
+    prompt and the newest turns are sent word for word; turns that no longer
+    fit are folded into a rolling summary, which the same LLM writes in the
+    background so no reply ever waits for it. Turns that fell out of the
+    budget are still sent verbatim until their summary is written, and they
+    are summarized CONTEXT_SUMMARY_BATCH tokens at a time, so a request
+    stays under about budget + batch tokens and the summary is not
+    rewritten on every turn.
+
+    The agent keeps its full chat history; `trim` only shapes what a
+    request carries, and reports the size of every request through `report`.
+    """
+
+    def __init__(
+        self,
+        persona: str,
+        model: llm.LLM,
+        budget: int = CONTEXT_TOKEN_BUDGET,
+        min_recent: int = CONTEXT_MIN_RECENT_ITEMS,
+        summary_batch: int = CONTEXT_SUMMARY_BATCH,
+        summary_words: int = CONTEXT_SUMMARY_WORDS,
+        report: Optional[Callable[..., None]] = None,
+    ):
+        self.persona = persona
+        self.budget = budget
+        self.min_recent = min_recent
+        self.summary_batch = summary_batch
+        self.summary_words = summary_words
+        self.summary = ""
+        self.summary_version = 0
+        self._model = model
+        self._report = report
+        self._summarized: Set[str] = set()
+        self._summary_task: Optional[asyncio.Task] = None
+
+    def trim(self, chat_ctx: llm.ChatContext, report: bool = True) -> llm.ChatContext:
+        """The context to send: persona prompt, rolling summary, and the newest turns that fit"""
+        items = chat_ctx.items
+        head = 0
+        while head < len(items) and items[head].type == "message" and items[head].role in ("system", "developer"):
+            head += 1
+        conversation = items[head:]
+
+        kept: List[llm.ChatItem] = []
+        kept_tokens = 0
+        for item in reversed(conversation):
+            cost = item_tokens(item)
+            if len(kept) >= self.min_recent and kept_tokens + cost > self.budget:
+                break
+            kept.append(item)
+            kept_tokens += cost
+        kept.reverse()
+        folded = conversation[:len(conversation) - len(kept)]
+
+        unsummarized = [item for item in folded if item.id not in self._summarized]
+        unsummarized_tokens = sum(item_tokens(item) for item in unsummarized)
+        if unsummarized_tokens >= self.summary_batch and self._summary_task is None:
+            # A fresh context, so the summary request is not counted as part of the current speech,
+            # and waits behind every other request when the provider is busy
+            context = contextvars.Context()
+            context.run(set_provider_priority, BACKGROUND)
+            self._summary_task = asyncio.create_task(self._summarize(unsummarized), context=context)
+
+        trimmed = llm.ChatContext(list(items[:head]))
+        if self.summary:
+            trimmed.add_message(
+                role="system",
+                id=f"context-summary-{self.persona}-{self.summary_version}",
+                content=f"Notes on the meeting so far (older turns, summarized):\n{self.summary}",
+            )
+        trimmed.items.extend(unsummarized)
+        trimmed.items.extend(kept)
+
+        if report and self._report:
+            self._report(
+                tokens=sum(item_tokens(item) for item in trimmed.items),
+                prompt_tokens=sum(item_tokens(item) for item in items[:head]),
+                summary_tokens=estimate_tokens(self.summary),
+                recent_tokens=kept_tokens + unsummarized_tokens,
+                recent_items=len(kept) + len(unsummarized),
+                summarized_items=len(folded) - len(unsummarized),
+                full_tokens=sum(item_tokens(item) for item in items),
+            )
+        return trimmed
+
+    async def _summarize(self, items: List[llm.ChatItem]):
+        transcript = "\n".join(
+            f"{self._speaker(item)}: {item_text(item)}" for item in items if item_text(item)
+        )
+        request = llm.ChatContext()
+        request.add_message(
+            role="system",
+            content=SUMMARY_INSTRUCTIONS.format(persona=self.persona.title(), words=self.summary_words),
+        )
+        request.add_message(
+            role="user",
+            content=f"Notes so far:\n{self.summary or '(none yet)'}\n\nNew part of the conversation:\n{transcript}",
+        )
+        try:
+            parts = []
+            async with self._model.chat(chat_ctx=request) as stream:
+                async for chunk in stream:
+                    if chunk.delta and chunk.delta.content:
+                        parts.append(chunk.delta.content)
+            summary = "".join(parts).strip()
+            if summary:
+                self.summary = summary
+                self.summary_version += 1
+                self._summarized.update(item.id for item in items)
+                log.info("context", f"Folded {len(items)} older turns into the meeting notes", persona=self.persona)
+        except Exception as e:
+            # The turns stay unsummarized, so the next request tries again
+            log.warning("context", f"Could not summarize older turns: {e}", persona=self.persona)
+        finally:
+            self._summary_task = None
+
+    def _speaker(self, item: llm.ChatItem) -> str:
+        if item.type != "message":
+            return "Tool"
+        return self.persona.title() if item.role == "assistant" else "User"
+
+    def close(self):
+        if self._summary_task is not None:
+            self._summary_task.cancel()
@@ -98,9 +98,16 @@ if curl -f http://localhost:8000/health > /dev/null 2>&1; then
     echo "📋 Available endpoints:"
     echo "  POST /create-room?room_name=<name>"
     echo "  POST /join-room (with JSON body)"
+    echo "  POST /provision-room (with JSON body)"
+    echo "  POST /provision-rooms (with JSON body)"
     echo "  POST /generate-user-token?user_identity=<name>&room_name=<name>"
     echo "  POST /leave-room?room_name=<name>"
     echo "  GET /active-rooms"
+    echo "  GET /agents"
+    echo "  GET /load"
+    echo "  GET /cluster"
+    echo "  GET /metrics"
+    echo "  GET /metrics/summary"
     echo "  GET /room-participants/<room_name>"
     echo ""
     echo "📝 To view logs: docker-compose logs -f"
@@ -0,0 +1,295 @@
+import os
+import time
+import asyncio
+import dataclasses
+from collections import deque
+from typing import AsyncIterator, Callable, Dict
+
+from livekit.agents import APIConnectOptions, llm, tts
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS
+
+from latency_metrics import percentile
+from structured_log import get_logger
+
+# Opt-in: start a backup request when the first token or audio byte is later than usual
+# (the backup is another model, so some answers and voices change, and it costs extra requests)
+HEDGE = os.getenv("HEDGE", "0") == "1"
+# Backup LLM model for every persona ("" for none)
+HEDGE_LLM_MODEL = os.getenv("HEDGE_LLM_MODEL", "llama-3.1-8b-instant")
+# Backup TTS: the persona's voice on this (faster) model, or another voice altogether ("" for none)
+HEDGE_TTS_MODEL = os.getenv("HEDGE_TTS_MODEL", "eleven_flash_v2_5")
+HEDGE_TTS_VOICE_ID = os.getenv("HEDGE_TTS_VOICE_ID", "")
+# Percentile of the primary's recent first-response times after which the backup starts
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+# Recent first-response times kept, and how many are needed before the percentile is trusted
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "200"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+# Hedge delay until then, and the shortest one ever used
+HEDGE_INITIAL_DELAY_MS = float(os.getenv("HEDGE_INITIAL_DELAY_MS", "1500"))
+HEDGE_MIN_DELAY_MS = float(os.getenv("HEDGE_MIN_DELAY_MS", "250"))
+# How long a losing primary is kept to learn its first-response time (it streams nothing)
+HEDGE_MEASURE_TIMEOUT = 10.0
+
+_END = object()
+
+
+log = get_logger()
+
+
+class HedgeStats:
+    """How hedging worked out for one primary model or voice"""
+
+    def __init__(self):
+        self.requests = 0
+        self.hedged = 0
+        self.backup_won = 0
+        self.failovers = 0
+        self.saved_ms = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "backup_won": self.backup_won,
+            "failovers": self.failovers,
+            "hedge_rate": round(self.hedged / self.requests, 3) if self.requests else 0.0,
+            "saved_ms": round(self.saved_ms),
+        }
+
+
+# "llm:<model>" or "tts:<voice>" -> stats, for every hedged client in this process
+HEDGE_STATS: Dict[str, HedgeStats] = {}
+
+
+def hedge_stats() -> dict:
+    return {name: stats.to_dict() for name, stats in HEDGE_STATS.items()}
+
+
+async def _next(stream):
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return _END
+
+
+def _single_attempt(conn_options: APIConnectOptions) -> APIConnectOptions:
+    # The hedged stream retries as a whole, hedging again on every attempt
+    return dataclasses.replace(conn_options, max_retry=0)
+
+
+class Hedger:
+    """
+    Races a primary request against a backup that only starts once the
+    primary's first chunk is later than HEDGE_PERCENTILE of its recent
+    first-chunk times (or the primary failed before sending anything).
+    Whichever sends a chunk first is streamed; the other is cancelled.
+
+    A primary that loses is kept until its own first chunk (not streamed,
+    at most HEDGE_MEASURE_TIMEOUT) so its time still counts towards the
+    percentile and the time the backup saved is known. Cancelling it at once
+    would only ever record fast primaries, and the delay would shrink until
+    every request was hedged.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.samples: deque = deque(maxlen=HEDGE_WINDOW)
+        self.stats = HEDGE_STATS.setdefault(name, HedgeStats())
+        self._measuring: set = set()
+
+    def delay(self) -> float:
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_INITIAL_DELAY_MS / 1000
+        return max(HEDGE_MIN_DELAY_MS / 1000, percentile(list(self.samples), HEDGE_PERCENTILE))
+
+    async def stream(self, start_primary: Callable, start_backup: Callable, on_backup: Callable = None) -> AsyncIterator:
+        """The winner's chunks; `on_backup` is called before the first one if the backup won"""
+        self.stats.requests += 1
+        started = time.perf_counter()
+        primary = start_primary()
+        primary_first = asyncio.ensure_future(_next(primary))
+        delay = self.delay()
+        await asyncio.wait({primary_first}, timeout=delay)
+
+        backup = backup_first = None
+        winner, first = primary, None
+        try:
+            if primary_first.done() and primary_first.exception() is None:
+                first = primary_first.result()
+                self.samples.append(time.perf_counter() - started)
+            else:
+                failover = primary_first.done()
+                backup = start_backup()
+                backup_first = asyncio.ensure_future(_next(backup))
+                self.stats.hedged += 1
+                if failover:
+                    self.stats.failovers += 1
+                    log.warning("hedge", f"{self.name} failed, using the backup", error=str(primary_first.exception()))
+                winner, first = await self._race(primary, primary_first, backup, backup_first, started, delay)
+        except BaseException:
+            await self._close(primary, primary_first)
+            if backup is not None:
+                await self._close(backup, backup_first)
+            raise
+
+        if winner is backup and on_backup is not None:
+            on_backup()
+        try:
+            if first is _END:
+                return
+            yield first
+            while (item := await _next(winner)) is not _END:
+                yield item
+        finally:
+            await winner.aclose()
+
+    async def _race(self, primary, primary_first, backup, backup_first, started: float, delay: float):
+        pending = {task for task in (primary_first, backup_first) if not task.done()} | {backup_first}
+        error = primary_first.exception() if primary_first.done() else None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in (primary_first, backup_first):
+                if task not in done:
+                    continue
+                if task.exception() is not None:
+                    error = error or task.exception()
+                    continue
+                if task is primary_first:
+                    self.samples.append(time.perf_counter() - started)
+                    await self._close(backup, backup_first)
+                    return primary, task.result()
+                self.stats.backup_won += 1
+                won_at = time.perf_counter()
+                if primary_first.done():
+                    await primary.aclose()
+                else:
+                    self._measure(primary, primary_first, started, won_at)
+                log.info("hedge", f"{self.name} backup answered first after {(won_at - started) * 1000:.0f}ms",
+                         delay_ms=round(delay * 1000))
+                return backup, task.result()
+        raise error
+
+    def _measure(self, primary, primary_first: asyncio.Future, started: float, won_at: float):
+        async def _wait():
+            try:
+                await asyncio.wait_for(asyncio.shield(primary_first), HEDGE_MEASURE_TIMEOUT)
+                primary_first.result()
+            except asyncio.TimeoutError:
+                pass  # never answered: count it as at least this slow
+            except Exception:
+                await self._close(primary, primary_first)
+                return
+            answered_at = time.perf_counter()
+            self.samples.append(answered_at - started)
+            self.stats.saved_ms += (answered_at - won_at) * 1000
+            await self._close(primary, primary_first)
+
+        task = asyncio.create_task(_wait())
+        self._measuring.add(task)
+        task.add_done_callback(self._measuring.discard)
+
+    @staticmethod
+    async def _close(stream, first: asyncio.Future):
+        if not first.done():
+            first.cancel()
+        try:
+            await stream.aclose()
+        except Exception:
+            pass
+
+
+class HedgedLLM(llm.LLM):
+    """An LLM that starts the same request on `backup` when `primary` is slower than usual"""
+
+    def __init__(self, primary: llm.LLM, backup: llm.LLM, name: str):
+        super().__init__()
+        self.primary = primary
+        self.backup = backup
+        self.hedger = Hedger(f"llm:{name}")
+        # Report metrics under the primary's name
+        self._label = primary.label
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools=None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        **kwargs,
+    ) -> "HedgedLLMStream":
+        return HedgedLLMStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options, kwargs=kwargs)
+
+    async def aclose(self):
+        await self.primary.aclose()
+        await self.backup.aclose()
+
+
+class HedgedLLMStream(llm.LLMStream):
+    def __init__(self, hedged: HedgedLLM, *, chat_ctx, tools, conn_options, kwargs: dict):
+        super().__init__(hedged, chat_ctx=chat_ctx, tools=tools, conn_options=conn_options)
+        self._hedged = hedged
+        self._kwargs = kwargs
+
+    async def _run(self):
+        hedged = self._hedged
+
+        def _start(model: llm.LLM):
+            return lambda: model.chat(
+                chat_ctx=self._chat_ctx, tools=self._tools,
+                conn_options=_single_attempt(self._conn_options), **self._kwargs,
+            )
+
+        async for chunk in hedged.hedger.stream(_start(hedged.primary), _start(hedged.backup)):
+            self._event_ch.send_nowait(chunk)
+
+
+class HedgedTTS(tts.TTS):
+    """A TTS that synthesizes the same sentence with `backup` when `primary` is slower than usual"""
+
+    def __init__(self, primary: tts.TTS, backup: tts.TTS, name: str):
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False),
+            sample_rate=primary.sample_rate,
+            num_channels=primary.num_channels,
+        )
+        if (backup.sample_rate, backup.num_channels) != (primary.sample_rate, primary.num_channels):
+            raise ValueError(f"backup TTS for {name} must have the primary's audio format")
+        self.primary = primary
+        self.backup = backup
+        self.hedger = Hedger(f"tts:{name}")
+        self._label = primary.label
+        # The TTS cache keys audio by the primary voice (and only keeps the primary's audio)
+        self._opts = getattr(primary, "_opts", None)
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "HedgedChunkedStream":
+        return HedgedChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+    def prewarm(self):
+        self.primary.prewarm()
+        self.backup.prewarm()
+
+    async def aclose(self):
+        await self.primary.aclose()
+        await self.backup.aclose()
+
+
+class HedgedChunkedStream(tts.ChunkedStream):
+    def __init__(self, *, tts: HedgedTTS, input_text: str, conn_options: APIConnectOptions):
+        super().__init__(tts=tts, input_text=input_text, conn_options=conn_options)
+        self._hedged = tts
+        # The backup's audio is another model (maybe another voice): the TTS
+        # cache must not keep it under the primary's key
+        self.cacheable = True
+
+    async def _run(self):
+        hedged = self._hedged
+
+        def _start(model: tts.TTS):
+            return lambda: model.synthesize(self._input_text, conn_options=_single_attempt(self._conn_options))
+
+        def _from_backup():
+            self.cacheable = False
+
+        self.cacheable = True  # a retry hedges again
+        async for ev in hedged.hedger.stream(_start(hedged.primary), _start(hedged.backup), on_backup=_from_backup):
+            self._event_ch.send_nowait(ev)
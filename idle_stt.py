@@ -0,0 +1,257 @@
+import os
+import time
+import asyncio
+import dataclasses
+from typing import Optional, Set
+
+import numpy as np
+from livekit import rtc
+from livekit.agents import APIConnectOptions, stt, utils
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN, NotGivenOr
+
+from audio_preprocess import AudioRing
+from structured_log import get_logger
+
+# Seconds of silence (as the VAD sees it) after which a user's STT stream
+# closes its provider connection until they speak again ("0" keeps it open)
+STT_IDLE_AFTER = float(os.getenv("STT_IDLE_AFTER", "10"))
+# Audio kept while suspended and sent first on resuming, covering the VAD's
+# own detection delay so the start of the utterance is not lost
+STT_IDLE_PREROLL_MS = float(os.getenv("STT_IDLE_PREROLL_MS", "1000"))
+
+log = get_logger()
+
+
+class IdleStats:
+    """Provider connections and audio seconds of every idle-aware STT stream in this process"""
+
+    def __init__(self):
+        self.streams = 0
+        self.connections = 0
+        self.resumes = 0
+        self.suspends = 0
+        self.streamed_s = 0.0
+        self.suspended_s = 0.0
+        self.preroll_s = 0.0
+
+    def to_dict(self) -> dict:
+        heard = self.streamed_s + self.suspended_s
+        return {
+            "streams": self.streams,
+            "connections": self.connections,
+            "resumes": self.resumes,
+            "suspends": self.suspends,
+            "streamed_s": round(self.streamed_s, 1),
+            "suspended_s": round(self.suspended_s, 1),
+            "preroll_s": round(self.preroll_s, 1),
+            "suspended_share": round(self.suspended_s / heard, 3) if heard else 0.0,
+        }
+
+
+STT_IDLE_STATS = IdleStats()
+
+
+def stt_idle_stats() -> dict:
+    return STT_IDLE_STATS.to_dict()
+
+
+def _single_attempt(conn_options: APIConnectOptions) -> APIConnectOptions:
+    # A failed provider stream fails the idle stream, which retries as a whole
+    return dataclasses.replace(conn_options, max_retry=0)
+
+
+class IdleSTT(stt.STT):
+    """
+    One user's STT that only holds a provider stream while they talk.
+
+    The VAD's view of the user is fed in through `speech_started` and
+    `speech_ended` (or `on_user_state`). Once the user has been silent for
+    `idle_after` seconds, each stream ends its provider stream (waiting for
+    the last transcripts) and from then on only keeps the latest
+    `preroll` seconds of audio. When speech starts again a new provider
+    stream is opened and sent that audio first, then everything that follows.
+
+    Make one per user audio source; it does not close the STT it wraps.
+    """
+
+    def __init__(self, wrapped: stt.STT, idle_after: float = STT_IDLE_AFTER, preroll: float = STT_IDLE_PREROLL_MS / 1000):
+        super().__init__(capabilities=wrapped.capabilities)
+        self.wrapped = wrapped
+        self.idle_after = idle_after
+        self.preroll = preroll
+        self._label = wrapped.label
+        self._streams: Set["IdleRecognizeStream"] = set()
+        self.speaking = False
+        self._silent_since: Optional[float] = None  # None until the user first spoke
+
+    async def _recognize_impl(
+        self,
+        buffer: utils.AudioBuffer,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions,
+    ) -> stt.SpeechEvent:
+        return await self.wrapped.recognize(buffer, language=language, conn_options=conn_options)
+
+    def stream(
+        self,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "IdleRecognizeStream":
+        return IdleRecognizeStream(stt=self, language=language, conn_options=conn_options)
+
+    def silent_for(self) -> Optional[float]:
+        """Seconds since the user stopped speaking (0 while they speak, None if they never did)"""
+        if self.speaking:
+            return 0.0
+        if self._silent_since is None:
+            return None
+        return time.monotonic() - self._silent_since
+
+    def speech_started(self):
+        self.speaking = True
+        for stream in list(self._streams):
+            stream.resume()
+
+    def speech_ended(self):
+        self.speaking = False
+        self._silent_since = time.monotonic()
+        for stream in list(self._streams):
+            stream.suspend_after(self.idle_after)
+
+    def on_user_state(self, state: str):
+        """Feed from the session's user_state_changed events ("speaking", "listening", "away")"""
+        if state == "speaking":
+            self.speech_started()
+        elif self.speaking:
+            self.speech_ended()
+
+    def prewarm(self):
+        self.wrapped.prewarm()
+
+    async def aclose(self):
+        for stream in list(self._streams):
+            await stream.aclose()
+
+
+class IdleRecognizeStream(stt.RecognizeStream):
+    def __init__(self, *, stt: IdleSTT, language: NotGivenOr[str], conn_options: APIConnectOptions):
+        super().__init__(stt=stt, conn_options=conn_options)
+        self._idle = stt
+        self._language = language
+        self._inner = None
+        self._forwards: Set[asyncio.Task] = set()
+        self._ring: Optional[AudioRing] = None
+        self._ring_rate = 0
+        self._suspend_timer: Optional[asyncio.TimerHandle] = None
+        self._error: Optional[Exception] = None
+
+    # -- Driven by IdleSTT --
+
+    def resume(self):
+        """Open a provider stream (if none is open), starting with the pre-roll"""
+        if self._suspend_timer is not None:
+            self._suspend_timer.cancel()
+            self._suspend_timer = None
+        if self._inner is not None or self._input_ch.closed:
+            return
+        inner = self._idle.wrapped.stream(language=self._language, conn_options=_single_attempt(self._conn_options))
+        self._inner = inner
+        STT_IDLE_STATS.connections += 1
+        STT_IDLE_STATS.resumes += 1
+        if self._ring is not None and len(self._ring):
+            samples = np.concatenate(self._ring.latest())
+            inner.push_frame(rtc.AudioFrame(
+                data=samples.tobytes(), sample_rate=self._ring_rate,
+                num_channels=1, samples_per_channel=len(samples),
+            ))
+            STT_IDLE_STATS.preroll_s += len(samples) / self._ring_rate
+            self._ring.clear()
+        task = asyncio.create_task(self._forward(inner))
+        self._forwards.add(task)
+        task.add_done_callback(self._forwards.discard)
+
+    def suspend_after(self, delay: float):
+        if delay <= 0 or self._inner is None:
+            return
+        if self._suspend_timer is not None:
+            self._suspend_timer.cancel()
+        self._suspend_timer = asyncio.get_running_loop().call_later(delay, self.suspend)
+
+    def suspend(self):
+        """End the provider stream; it still delivers the transcripts of what it was sent"""
+        self._suspend_timer = None
+        inner, self._inner = self._inner, None
+        if inner is None:
+            return
+        inner.end_input()
+        STT_IDLE_STATS.suspends += 1
+
+    # -- Stream --
+
+    async def _forward(self, inner: stt.RecognizeStream):
+        try:
+            async for ev in inner:
+                self._event_ch.send_nowait(ev)
+        except Exception as e:
+            if self._inner is inner:
+                self._inner = None
+                self._error = e
+            else:
+                log.warning("stt", f"Suspended STT stream failed while draining: {e}")
+        finally:
+            STT_IDLE_STATS.connections -= 1
+            await inner.aclose()
+
+    def _keep(self, frame: rtc.AudioFrame):
+        if self._ring is None or frame.sample_rate != self._ring_rate:
+            self._ring = AudioRing(int(self._idle.preroll * frame.sample_rate))
+            self._ring_rate = frame.sample_rate
+        if frame.num_channels != 1:
+            samples = np.frombuffer(frame.data, dtype=np.int16)[::frame.num_channels]
+        else:
+            samples = np.frombuffer(frame.data, dtype=np.int16)
+        self._ring.write(samples)
+
+    async def _run(self):
+        idle = self._idle
+        idle._streams.add(self)
+        STT_IDLE_STATS.streams += 1
+        self._error = None
+        try:
+            # A stream started mid-conversation (e.g. a new turn) picks up where the last one was
+            silent_for = idle.silent_for()
+            if silent_for is not None and silent_for < idle.idle_after:
+                self.resume()
+                if not idle.speaking:
+                    self.suspend_after(idle.idle_after - silent_for)
+
+            async for data in self._input_ch:
+                if self._error is not None:
+                    raise self._error
+                if isinstance(data, rtc.AudioFrame):
+                    seconds = data.samples_per_channel / data.sample_rate
+                    if self._inner is not None:
+                        self._inner.push_frame(data)
+                        STT_IDLE_STATS.streamed_s += seconds
+                    else:
+                        self._keep(data)
+                        STT_IDLE_STATS.suspended_s += seconds
+                elif self._inner is not None:
+                    self._inner.flush()
+
+            if self._inner is not None:
+                self._inner.end_input()
+                self._inner = None
+            await asyncio.gather(*self._forwards)
+            if self._error is not None:
+                raise self._error
+        finally:
+            idle._streams.discard(self)
+            STT_IDLE_STATS.streams -= 1
+            if self._suspend_timer is not None:
+                self._suspend_timer.cancel()
+                self._suspend_timer = None
+            self._inner = None
+            await utils.aio.cancel_and_wait(*self._forwards)
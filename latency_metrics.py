@@ -0,0 +1,215 @@
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from livekit.agents import AgentSession
+from livekit.agents.metrics import EOUMetrics, LLMMetrics, TTSMetrics
+
+# Histogram bucket bounds in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+# Recent samples kept per series for the percentile summary
+LATENCY_SAMPLES = 1000
+
+# What each stage measures, in the order a turn goes through them
+TURN_STAGES = {
+    "stt_final": "user speech end to final transcript",
+    "end_of_turn": "user speech end to end-of-turn decision",
+    "llm_ttft": "LLM request to first token",
+    "llm_done": "LLM request to last token",
+    "tts_ttfb": "TTS request to first audio byte (first sentence of a reply)",
+    "first_audio": "user speech end to first reply audio published",
+}
+
+
+class TurnTimer:
+    """
+    Times every user turn of one agent session and reports each stage through
+    `emit("turn_metric", ...)`, so the numbers reach main.py the same way as
+    the other host events.
+
+    The LLM and TTS clients are shared by every session of a host, so their
+    metrics are only counted when they belong to one of this session's speeches.
+    """
+
+    def __init__(self, session: AgentSession, room_name: str, persona: str, emit: Callable, providers: Dict[str, str]):
+        self.room_name = room_name
+        self.persona = persona
+        self._emit = emit
+        self._providers = providers
+        self._speech_ids: Deque[str] = deque(maxlen=32)
+        self._tts_timed: Deque[str] = deque(maxlen=32)
+        self._speech_ended_at: Optional[float] = None
+        self._replying = False
+
+        session.on("user_state_changed", self._on_user_state_changed)
+        session.on("speech_created", self._on_speech_created)
+        session.on("agent_state_changed", self._on_agent_state_changed)
+        session.on("metrics_collected", self._on_metrics_collected)
+
+    def _observe(self, stage: str, seconds: float, provider: str):
+        if seconds < 0:
+            return
+        self._emit(
+            "turn_metric", room=self.room_name, persona=self.persona,
+            provider=provider, stage=stage, seconds=round(seconds, 4),
+        )
+
+    def _on_user_state_changed(self, ev):
+        if ev.new_state == "speaking":
+            self._speech_ended_at = None
+            self._replying = False
+        elif ev.old_state == "speaking":
+            self._speech_ended_at = time.time()
+
+    def _on_speech_created(self, ev):
+        self._speech_ids.append(ev.speech_handle.id)
+        if ev.source == "generate_reply":
+            self._replying = True  # an LLM reply, not a scripted line
+
+    def _on_agent_state_changed(self, ev):
+        if ev.new_state != "speaking" or not self._replying or self._speech_ended_at is None:
+            return
+        self._observe("first_audio", time.time() - self._speech_ended_at, "pipeline")
+        self._speech_ended_at = None
+        self._replying = False
+
+    def _on_metrics_collected(self, ev):
+        m = ev.metrics
+        if isinstance(m, EOUMetrics):
+            self._observe("stt_final", m.transcription_delay, self._providers["stt"])
+            self._observe("end_of_turn", m.end_of_utterance_delay, self._providers["stt"])
+        elif not isinstance(m, (LLMMetrics, TTSMetrics)) or m.speech_id not in self._speech_ids:
+            return  # VAD/STT metrics, or another session's speech
+        elif isinstance(m, LLMMetrics) and not m.cancelled:
+            self._observe("llm_ttft", m.ttft, self._providers["llm"])
+            self._observe("llm_done", m.duration, self._providers["llm"])
+        elif isinstance(m, TTSMetrics) and m.speech_id not in self._tts_timed and not m.cancelled:
+            self._tts_timed.append(m.speech_id)
+            self._observe("tts_ttfb", m.ttfb, self._providers["tts"])
+
+
+class LatencyHistogram:
+    """Cumulative bucket counts for Prometheus plus recent samples for percentiles"""
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.samples: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+        self.count += 1
+        self.sum += seconds
+        self.samples.append(seconds)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class LatencyRegistry:
+    """
+    Turn latency histograms per (stage, persona, room, provider), fed by the
+    "turn_metric" events of every agent host.
+
+    Series of a room are dropped once its last session ends, so the number of
+    series follows the number of live rooms.
+    """
+
+    def __init__(self):
+        self._series: Dict[Tuple[str, str, str, str], LatencyHistogram] = {}
+        # Percentiles are kept across rooms, so they survive the rooms ending
+        self._overall: Dict[Tuple[str, str, str], LatencyHistogram] = {}
+        self._room_sessions: Dict[str, Set[str]] = {}
+        # persona -> tokens sent with each recent LLM request
+        self._context_tokens: Dict[str, Deque[int]] = {}
+
+    def observe(self, stage: str, seconds: float, persona: str, room: str, provider: str):
+        self._series.setdefault((stage, persona, room, provider), LatencyHistogram()).observe(seconds)
+        self._overall.setdefault((stage, persona, provider), LatencyHistogram()).observe(seconds)
+
+    def forget_room(self, room: str):
+        for key in [key for key in self._series if key[2] == room]:
+            del self._series[key]
+
+    def on_message(self, msg: dict):
+        """Dispatcher listener"""
+        event = msg.get("event")
+        if event == "turn_metric":
+            self.observe(msg["stage"], msg["seconds"], msg["persona"], msg["room"], msg["provider"])
+        elif event == "turn_context":
+            self._context_tokens.setdefault(msg["persona"], deque(maxlen=LATENCY_SAMPLES)).append(msg["tokens"])
+        elif event == "joined":
+            self._room_sessions.setdefault(msg["room"], set()).add(msg["identity"])
+        elif event == "session_ended":
+            self._session_gone(msg.get("room"), msg.get("identity"))
+        elif event == "worker_exited":
+            for room, identity in msg.get("sessions", []):
+                self._session_gone(room, identity)
+
+    def _session_gone(self, room: str, identity: str):
+        sessions = self._room_sessions.get(room)
+        if sessions is None:
+            return
+        sessions.discard(identity)
+        if not sessions:
+            del self._room_sessions[room]
+            self.forget_room(room)
+
+    def summary(self) -> dict:
+        """p50/p95/p99 over recent turns: stage -> persona -> provider -> stats"""
+        view: Dict[str, dict] = {}
+        for (stage, persona, provider), hist in sorted(self._overall.items()):
+            samples = list(hist.samples)
+            view.setdefault(stage, {}).setdefault(persona, {})[provider] = {
+                "count": hist.count,
+                "p50_ms": round(percentile(samples, 0.50) * 1000),
+                "p95_ms": round(percentile(samples, 0.95) * 1000),
+                "p99_ms": round(percentile(samples, 0.99) * 1000),
+            }
+        return view
+
+    def context_summary(self) -> dict:
+        """Tokens sent per LLM request over recent turns: persona -> stats"""
+        return {
+            persona: {
+                "count": len(samples),
+                "last": samples[-1],
+                "p50": percentile(list(samples), 0.50),
+                "p95": percentile(list(samples), 0.95),
+            }
+            for persona, samples in sorted(self._context_tokens.items())
+        }
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP agent_turn_latency_seconds Latency of each stage of a user turn "
+            "(" + "; ".join(f"{stage}: {what}" for stage, what in TURN_STAGES.items()) + ")",
+            "# TYPE agent_turn_latency_seconds histogram",
+        ]
+        for (stage, persona, room, provider), hist in sorted(self._series.items()):
+            labels = (
+                f'stage="{_label_value(stage)}",persona="{_label_value(persona)}",'
+                f'room="{_label_value(room)}",provider="{_label_value(provider)}"'
+            )
+            for bound, count in zip(LATENCY_BUCKETS, hist.buckets):
+                lines.append(f'agent_turn_latency_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'agent_turn_latency_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+            lines.append(f"agent_turn_latency_seconds_sum{{{labels}}} {hist.sum:.6f}")
+            lines.append(f"agent_turn_latency_seconds_count{{{labels}}} {hist.count}")
+        lines += [
+            "# HELP agent_context_tokens Estimated tokens sent with the last LLM request of a persona",
+            "# TYPE agent_context_tokens gauge",
+        ]
+        for persona, samples in sorted(self._context_tokens.items()):
+            lines.append(f'agent_context_tokens{{persona="{_label_value(persona)}"}} {samples[-1]}')
+        return "\n".join(lines) + "\n"
@@ -1,25 +1,32 @@
 import os
-import subprocess
-import sys
+import time
 import asyncio
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi import FastAPI, BackgroundTasks, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from livekit import api
 from livekit.api import LiveKitAPI, CreateRoomRequest
-from livekit import rtc
-from livekit.agents import (
-    Agent,
-    AgentSession,
-)
-from livekit.plugins import silero, deepgram, groq, elevenlabs
 import aiohttp
 from pydantic import BaseModel
 from typing import List, Optional
 
+from agent_runner import AGENT_HOST_MAX_SESSIONS, PERSONAS, AgentHost, HostFullError, load_plugins
+from worker_pool import WorkerPool
+from supervisor import AgentSupervisor
+from latency_metrics import LatencyRegistry
+from admission import AdmissionController, AdmissionRejected
+from cluster import CLUSTER_FORWARDED_HEADER, ClusterNode, NodeInfo, cluster_registry_from_env
+from cleanup_scheduler import CleanupScheduler
+from token_cache import TokenCache
+from provider_limits import provider_limit_stats, serve_provider_limits
+from structured_log import get_logger, log_stats
+
 load_dotenv()
 
+log = get_logger()
+
 LIVEKIT_URL = os.getenv("LIVEKIT_URL")
 LIVEKIT_API_KEY = os.getenv("LIVEKIT_API_KEY")
 LIVEKIT_API_SECRET = os.getenv("LIVEKIT_API_SECRET")
@@ -29,6 +36,23 @@ if not all([LIVEKIT_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET]):
         "LIVEKIT_URL, LIVEKIT_API_KEY, and LIVEKIT_API_SECRET must be set in your environment."
     )
 
+# "workers": agents run in pre-warmed agent_runner.py processes (see worker_pool.py)
+# "inprocess": agents run as sessions on this server's event loop, sharing app.state.plugins
+AGENT_MODE = os.getenv("AGENT_MODE", "workers")
+
+# Signed agent and user tokens, reused until shortly before they expire. Kept at
+# module level so scripts (benchmarks) can mint tokens without the app running.
+token_cache = TokenCache(LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+
+# Rooms one /provision-rooms call may ask for, and how many are set up at once
+BULK_PROVISION_MAX_ROOMS = int(os.getenv("BULK_PROVISION_MAX_ROOMS", "100"))
+BULK_PROVISION_CONCURRENCY = int(os.getenv("BULK_PROVISION_CONCURRENCY", "8"))
+
+# Long-lived LiveKit server API client: connections kept alive and capped
+LIVEKIT_API_MAX_CONNECTIONS = int(os.getenv("LIVEKIT_API_MAX_CONNECTIONS", "20"))
+LIVEKIT_API_KEEPALIVE = float(os.getenv("LIVEKIT_API_KEEPALIVE", "60"))
+LIVEKIT_API_TIMEOUT = float(os.getenv("LIVEKIT_API_TIMEOUT", "10"))
+
 # NEW: Use FastAPI's lifespan to manage shared resources
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -36,30 +60,78 @@ async def lifespan(app: FastAPI):
     Manage shared resources for the application lifetime.
     This is the recommended approach for modern FastAPI apps.
     """
-    print("🚀 Initializing shared resources...")
+    log.info("lifecycle", "Initializing shared resources")
     app.state.http_session = aiohttp.ClientSession()
-    app.state.vad = silero.VAD.load()
-    app.state.stt = deepgram.STT(http_session=app.state.http_session)
-    app.state.llm = groq.LLM(model="llama-3.3-70b-versatile")
-    
-    # Create TTS instances for each agent voice
-    app.state.priya_tts = elevenlabs.TTS(
-        api_key=os.getenv("ELEVENLABS_API_KEY"),
-        voice_id="ODq5zmih8GrVes37Dizd",  # Priya's voice
-        http_session=app.state.http_session,
+    # One pooled LiveKit server API client for the app's lifetime. The connector
+    # keeps TCP/TLS connections alive between requests and queues requests
+    # beyond LIVEKIT_API_MAX_CONNECTIONS instead of opening more.
+    app.state.livekit_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=LIVEKIT_API_MAX_CONNECTIONS,
+            keepalive_timeout=LIVEKIT_API_KEEPALIVE,
+        ),
+        timeout=aiohttp.ClientTimeout(total=LIVEKIT_API_TIMEOUT),
     )
-    app.state.alex_tts = elevenlabs.TTS(
-        api_key=os.getenv("ELEVENLABS_API_KEY"),
-        voice_id="pNInz6obpgDQGcFmaJgB",  # Alex's voice
-        http_session=app.state.http_session,
+    app.state.livekit_api = LiveKitAPI(
+        LIVEKIT_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET, session=app.state.livekit_session
     )
-    print("✅ Shared resources initialized.")
+    log.info("lifecycle", "Shared resources initialized")
+
+    # Provider rate limits every agent process on this box shares (see provider_limits.py)
+    app.state.provider_limits = await serve_provider_limits()
+
+    if AGENT_MODE == "inprocess":
+        # One VAD, STT, LLM and per-persona TTS, shared by every in-process session.
+        # In "workers" mode the worker processes load their own and the server never needs them.
+        app.state.plugins = load_plugins(app.state.http_session)
+        app.state.dispatcher = AgentHost(app.state.plugins, max_sessions=AGENT_HOST_MAX_SESSIONS)
+        log.info("lifecycle", f"Hosting up to {app.state.dispatcher.max_sessions} agent sessions in-process")
+    else:
+        # Pre-warmed agent processes that /join-room hands rooms to
+        app.state.dispatcher = WorkerPool()
+    # Per-turn latency reported by every agent host
+    app.state.latency = LatencyRegistry()
+    app.state.dispatcher.add_listener(app.state.latency.on_message)
+    await app.state.dispatcher.start()
+
+    # Tracks every agent by room and identity, restarts crashed ones
+    app.state.supervisor = AgentSupervisor(app.state.dispatcher)
+    await app.state.supervisor.start()
+
+    # Turns joins away (429) instead of overloading the rooms already running
+    app.state.admission = AdmissionController(app.state.supervisor, PERSONAS.costs())
+    app.state.dispatcher.add_listener(app.state.admission.on_message)
+    await app.state.admission.start()
+
+    # Persona files edited while running: new joins are validated and weighed
+    # against them (workers watch the same files themselves)
+    PERSONAS.add_listener(lambda personas: setattr(app.state.admission, "weights", PERSONAS.costs()))
+    await PERSONAS.start()
+
+    # Membership in the cluster: where rooms are placed and who owns them
+    app.state.cluster = ClusterNode(cluster_registry_from_env(), app.state.admission)
+    await app.state.cluster.start()
+
+    # Room teardowns (auto_cleanup_minutes and rooms left without humans), kept across restarts
+    app.state.cleanup = CleanupScheduler(cleanup_room)
+    app.state.dispatcher.add_listener(app.state.cleanup.on_message)
+    await app.state.cleanup.start()
     
     yield  # Application is now running
 
-    print("🔌 Closing shared resources...")
+    log.info("lifecycle", "Closing shared resources")
+    await app.state.cleanup.aclose()
+    await app.state.cluster.aclose()
+    await app.state.admission.aclose()
+    await PERSONAS.aclose()
+    await app.state.supervisor.aclose()
+    await app.state.dispatcher.aclose()
+    if app.state.provider_limits:
+        await app.state.provider_limits.aclose()
+    await app.state.livekit_api.aclose()
+    await app.state.livekit_session.close()
     await app.state.http_session.close()
-    print("✅ Shared resources closed.")
+    log.info("lifecycle", "Shared resources closed")
 
 app = FastAPI(lifespan=lifespan)
 
@@ -72,101 +144,89 @@ app.add_middleware(
 )
 
 async def get_livekit_api():
-    """Get a new LiveKitAPI instance"""
-    return LiveKitAPI(LIVEKIT_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
-
-async def run_priya_agent(room_name: str, agent_identity: str, token: str):
-    """
-    Priya agent with her specific voice and personality
-    """
-    print(f"🎯 PRIYA STARTING - Room: {room_name}, Identity: {agent_identity}")
-
-    agent = Agent(
-        instructions="""
-        You are Priya, a Senior Manager of Growth Marketing...
-        """
+    """Get the shared, long-lived LiveKitAPI instance (do not close it)"""
+    return app.state.livekit_api
+
+def create_agent_token(room_name: str, identity: str, agent_name: str) -> str:
+    """The LiveKit token an agent uses to join `room_name`"""
+    return token_cache.token(
+        identity,
+        api.VideoGrants(
+            room_join=True, 
+            room=room_name, 
+            can_publish=True,
+            can_subscribe=True,
+            can_publish_sources=["camera", "microphone", "screen_share_audio","screen_share",]
+        ),
+        name=agent_name.capitalize(),
     )
-    session = AgentSession(
-        vad=app.state.vad,
-        stt=app.state.stt,
-        llm=app.state.llm,
-        tts=app.state.priya_tts,
-    )
-
-    room = rtc.Room()
-    try:
-        print(f"🔗 Priya connecting to room...")
-        await room.connect(LIVEKIT_URL, token)
-        print(f"✅ Priya connected to room: {room_name}")
 
-        await session.start(agent=agent, room=room)
-        print(f"✅ Priya session started")
+def create_user_token(room_name: str, user_identity: str) -> str:
+    """The LiveKit token a human participant uses to join `room_name`"""
+    return token_cache.token(user_identity, api.VideoGrants(room_join=True, room=room_name))
 
-        await asyncio.sleep(2)
-        print(f"👋 Priya sending greeting...")
-        await session.generate_reply(
-            instructions="Greet the user warmly as Priya, introduce yourself..."
-        )
-        print(f"🔄 Priya is now active and listening...")
-
-        # FINAL FIX: A simple, universal loop to keep the task alive.
-        # It doesn't depend on any specific library version attributes.
-        while True:
-            await asyncio.sleep(1)
-
-    except Exception as e:
-        print(f"❌ Error in Priya's session: {e}")
-        import traceback
-        print(f"Priya traceback: {traceback.format_exc()}")
-    finally:
-        print(f"🚪 Priya disconnecting...")
-        await session.aclose()
-        await room.disconnect()
-
-
-async def run_alex_agent(room_name: str, agent_identity: str, token: str):
-    """
-    Alex agent with his specific voice and personality
-    """
-    print(f"🔧 ALEX STARTING - Room: {room_name}, Identity: {agent_identity}")
+@app.get("/health")
+async def health():
+    supervisor = app.state.supervisor
+    return {
+        "status": "ok",
+        "agents": supervisor.summary(),
+        "tts_cache": supervisor.tts_cache_summary(),
+        "speculation": supervisor.speculation_summary(),
+        "hedging": supervisor.hedging_summary(),
+        "stt_idle": supervisor.stt_idle_summary(),
+        "cleanup": app.state.cleanup.pending(),
+        "tokens": token_cache.stats(),
+        "logs": log_stats(),
+        "provider_limits": provider_limit_stats(),
+    }
 
-    agent = Agent(
-        instructions="""
-        You are Alex, a Technical Lead and Software Architect...
-        """
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Turn latency histograms in Prometheus text format"""
+    return PlainTextResponse(
+        app.state.latency.render_prometheus(),
+        media_type="text/plain; version=0.0.4",
     )
-    session = AgentSession(
-        vad=app.state.vad,
-        stt=app.state.stt,
-        llm=app.state.llm,
-        tts=app.state.alex_tts,
-    )
-
-    room = rtc.Room()
-    try:
-        print(f"🔗 Alex connecting to room...")
-        await room.connect(LIVEKIT_URL, token)
-        print(f"✅ Alex connected to room: {room_name}")
-
-        await session.start(agent=agent, room=room)
-        print(f"✅ Alex session started")
-        print(f"🔄 Alex is now active and listening...")
 
-        # FINAL FIX: A simple, universal loop to keep the task alive.
-        while True:
-            await asyncio.sleep(1)
-
-    except Exception as e:
-        print(f"❌ Error in Alex's session: {e}")
-        import traceback
-        print(f"Alex traceback: {traceback.format_exc()}")
-    finally:
-        print(f"🚪 Alex disconnecting...")
-        await session.aclose()
-        await room.disconnect()
-@app.get("/health")
-async def health():
-    return {"status": "ok"}
+@app.get("/metrics/summary")
+async def metrics_summary():
+    """p50/p95/p99 per turn stage, persona and provider over recent turns, and LLM context sizes"""
+    return {"latency": app.state.latency.summary(), "context_tokens": app.state.latency.context_summary()}
+
+@app.get("/personas")
+async def list_personas():
+    """The personas agents join as, with the version of each persona's file"""
+    return PERSONAS.summary()
+
+@app.post("/personas/reload")
+async def reload_personas():
+    """Read the persona files now, here and in every agent host, instead of at the next check"""
+    reloaded = await PERSONAS.reload(force=True)
+    await app.state.dispatcher.reload_personas()
+    return {"reloaded": reloaded, "personas": PERSONAS.summary()}
+
+@app.get("/load")
+async def load():
+    """Current load and admission queue depth, for load balancers"""
+    return app.state.admission.status()
+
+@app.get("/cluster")
+async def cluster_nodes():
+    """Live nodes of the cluster and their load"""
+    cluster = app.state.cluster
+    nodes = await cluster.live_nodes()
+    return {"node_id": cluster.node_id, "nodes": [node.to_dict() for node in nodes]}
+
+@app.get("/agents")
+async def list_agents(room_name: Optional[str] = None):
+    """Per-agent state as seen by the supervisor, optionally for one room"""
+    supervisor = app.state.supervisor
+    records = supervisor.agents_in_room(room_name) if room_name else supervisor.all_agents()
+    return {
+        "agents": [record.to_dict() for record in records],
+        "total": len(records),
+    }
 
 @app.post("/create-room")
 async def create_room(room_name: str = None):
@@ -174,11 +234,10 @@ async def create_room(room_name: str = None):
         raise HTTPException(status_code=400, detail="room_name is required")
 
     try:
-        print(f"🏠 Creating room: {room_name}")
+        log.info("request", "Creating room", room=room_name)
         api_instance = await get_livekit_api()
         request = CreateRoomRequest(name=room_name, empty_timeout=300) # Added empty_timeout
         await api_instance.room.create_room(request)
-        await api_instance.aclose()
         return {"room_name": room_name}
     except Exception:
         # It's better to check if the room exists first, but this works for now.
@@ -190,77 +249,273 @@ class JoinRoomRequest(BaseModel):
     agents: List[str] = ["priya", "alex"]  # Default to both agents
     auto_cleanup_minutes: Optional[int] = 15  # Default 15 minutes
 
-@app.post("/join-room")
-async def join_room(request: JoinRoomRequest):
-    """Join room with selected agents"""
-    if not request.room_name:
-        raise HTTPException(status_code=400, detail="room_name is required")
+class ProvisionRoomRequest(JoinRoomRequest):
+    empty_timeout: int = 300  # Seconds LiveKit keeps the room once empty
+
+class BulkRoomRequest(ProvisionRoomRequest):
+    users: List[str] = []  # Identities to mint user tokens for
+
+class BulkProvisionRequest(BaseModel):
+    rooms: List[BulkRoomRequest]
 
-    # Validate agent names
-    valid_agents = ["priya", "alex"]
-    invalid_agents = [agent for agent in request.agents if agent not in valid_agents]
+def validate_agents(agents: List[str]):
+    """Reject unknown persona names with a 400"""
+    valid_agents = PERSONAS.names()
+    invalid_agents = [agent for agent in agents if agent not in valid_agents]
     if invalid_agents:
         raise HTTPException(
             status_code=400, 
             detail=f"Invalid agent names: {invalid_agents}. Valid agents: {valid_agents}"
         )
 
-    print(f"🚀 Setting up agents for room: {request.room_name}")
-    print(f"�� Selected agents: {request.agents}")
+def schedule_auto_cleanup(room_name: str, minutes: Optional[int]):
+    """Delete the room and stop its agents after `minutes`"""
+    if not minutes or minutes <= 0:
+        return
+    app.state.cleanup.schedule(room_name, "expiry", minutes * 60)
+    log.info("cleanup", f"Auto-cleanup scheduled for {minutes} minutes", room=room_name)
 
-    # Define agent identities for selected agents only
-    agents_to_launch = {
-        agent: f"{agent}-agent-{request.room_name}"
-        for agent in request.agents
-    }
+async def cleanup_room(room_name: str, kind: str):
+    """Called by the cleanup scheduler when one of a room's timers is due"""
+    await leave_room_locally(room_name)
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+async def provision_room(room_name: str, agents: List[str], empty_timeout: Optional[int] = None) -> dict:
+    """
+    Get agents into `room_name` with as little serial waiting as possible:
+    the room is created (when `empty_timeout` is given) while the agent
+    tokens are minted, then every agent is dispatched concurrently.
+    Returns the launched agents and a per-step timing breakdown in ms.
 
-    launched_agents = []
-    for agent_name, identity in agents_to_launch.items():
-        print(f"🔑 Generating token for {agent_name}...")
-        token = (
-            api.AccessToken(LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
-            .with_identity(identity)
-            .with_name(agent_name.capitalize())
-            .with_grants(api.VideoGrants(
-                room_join=True, 
-                room=request.room_name, 
-                can_publish=True,
-                can_subscribe=True,
-                can_publish_sources=["camera", "microphone", "screen_share_audio","screen_share",]
-            ))
-            .to_jwt()
+    Raises AdmissionRejected when the box has no capacity for the new agents.
+    """
+    started = time.perf_counter()
+    new_agents = [
+        agent_name for agent_name in agents
+        if not app.state.supervisor.get(room_name, f"{agent_name}-agent-{room_name}")
+    ]
+    async with app.state.admission.admit(
+        app.state.admission.cost(new_agents),
+        keys=[(room_name, f"{agent_name}-agent-{room_name}") for agent_name in new_agents],
+    ):
+        timings = {"admission_ms": _elapsed_ms(started)}
+        await _provision_room(room_name, agents, empty_timeout, timings)
+    await app.state.cluster.registry.claim_room(room_name, app.state.cluster.node_id)
+    timings["total_ms"] = _elapsed_ms(started)
+
+    return {"launched_agents": list(agents), "timings": timings}
+
+async def _provision_room(room_name: str, agents: List[str], empty_timeout: Optional[int], timings: dict):
+    """The admitted part of provision_room; step timings are added to `timings`"""
+
+    async def _create_room():
+        step = time.perf_counter()
+        try:
+            await app.state.livekit_api.room.create_room(
+                CreateRoomRequest(name=room_name, empty_timeout=empty_timeout)
+            )
+        except Exception as e:
+            log.warning("request", f"Could not create room (it might already exist): {e}", room=room_name)
+        timings["create_room_ms"] = _elapsed_ms(step)
+
+    async def _mint_tokens():
+        step = time.perf_counter()
+        tokens = {
+            agent_name: create_agent_token(room_name, f"{agent_name}-agent-{room_name}", agent_name)
+            for agent_name in agents
+        }
+        timings["tokens_ms"] = _elapsed_ms(step)
+        return tokens
+
+    if empty_timeout is not None:
+        _, tokens = await asyncio.gather(_create_room(), _mint_tokens())
+    else:
+        tokens = await _mint_tokens()
+
+    async def _dispatch(agent_name: str):
+        step = time.perf_counter()
+        await app.state.supervisor.start_agent(
+            room_name, f"{agent_name}-agent-{room_name}", agent_name, tokens[agent_name]
         )
+        timings[f"dispatch_{agent_name}_ms"] = _elapsed_ms(step)
+
+    step = time.perf_counter()
+    # Hold the new agents' slots on one host up front, so the room gets one process and one ingest
+    records = [app.state.supervisor.get(room_name, f"{agent_name}-agent-{room_name}") for agent_name in agents]
+    starting = sum(1 for record in records if record is None or record.state == "failed")
+    async with app.state.dispatcher.reserve(room_name, starting):
+        await asyncio.gather(*(_dispatch(agent_name) for agent_name in agents))
+    timings["dispatch_ms"] = _elapsed_ms(step)
+
+async def forward_to_node(node: NodeInfo, path: str, params: dict = None, payload: dict = None) -> dict:
+    """POST a request to another node, re-raising its errors as our own"""
+    async with app.state.http_session.post(
+        node.url + path, params=params, json=payload,
+        headers={CLUSTER_FORWARDED_HEADER: app.state.cluster.node_id},
+    ) as resp:
+        body = await resp.json()
+        if resp.status >= 400:
+            headers = {"Retry-After": resp.headers["Retry-After"]} if "Retry-After" in resp.headers else None
+            raise HTTPException(status_code=resp.status, detail=body.get("detail"), headers=headers)
+        return body
+
+async def route_join(raw: Request, path: str, request: JoinRoomRequest) -> Optional[dict]:
+    """
+    Send a join to the node the room belongs on: the node already running it,
+    otherwise the least-utilized accepting node, trying the next one on a 429.
+    Returns that node's response, or None when the join should run here.
+    """
+    cluster = app.state.cluster
+    if raw.headers.get(CLUSTER_FORWARDED_HEADER):
+        return None  # another node already chose us
+    rejected = None
+    for node in await cluster.placement(request.room_name):
+        if cluster.is_self(node):
+            return None
+        log.info("cluster", "Placing room on another node", room=request.room_name, node=node.node_id)
+        try:
+            return await forward_to_node(node, path, payload=request.model_dump())
+        except HTTPException as e:
+            if e.status_code != 429:
+                raise
+            rejected = e
+        except aiohttp.ClientError as e:
+            log.warning("cluster", f"Node unreachable: {e}", node=node.node_id)
+    if rejected is not None:
+        raise rejected
+    return None
 
-        print(f"🚀 Launching process for {agent_name}...")
-        # Use subprocess.Popen to run agent_runner.py in a new process
-        subprocess.Popen([
-            sys.executable,  # Path to current python interpreter
-            "agent_runner.py",
-            "--room", request.room_name,
-            "--identity", identity,
-            "--agent-name", agent_name,
-            "--token", token,
-        ])
-        launched_agents.append(agent_name)
+@app.post("/join-room")
+async def join_room(request: JoinRoomRequest, raw: Request):
+    """Join room with selected agents"""
+    if not request.room_name:
+        raise HTTPException(status_code=400, detail="room_name is required")
+
+    validate_agents(request.agents)
+
+    routed = await route_join(raw, "/join-room", request)
+    if routed is not None:
+        return routed
+
+    log.info("request", "Setting up agents", room=request.room_name, agents=request.agents)
+
+    try:
+        result = await provision_room(request.room_name, request.agents)
+    except HostFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     
-    # Set up auto-cleanup if specified
-    if request.auto_cleanup_minutes and request.auto_cleanup_minutes > 0:
-        async def auto_cleanup():
-            await asyncio.sleep(request.auto_cleanup_minutes * 60)
-            try:
-                await leave_room(request.room_name)
-            except:
-                pass  # Room might already be deleted
-        
-        asyncio.create_task(auto_cleanup())
-        print(f"⏰ Auto-cleanup scheduled for {request.auto_cleanup_minutes} minutes")
+    schedule_auto_cleanup(request.room_name, request.auto_cleanup_minutes)
 
     return {
         "status": "success", 
         "message": f"Agent processes launched for room '{request.room_name}'",
-        "launched_agents": launched_agents,
-        "total_agents": len(launched_agents),
-        "auto_cleanup_minutes": request.auto_cleanup_minutes
+        "launched_agents": result["launched_agents"],
+        "total_agents": len(result["launched_agents"]),
+        "auto_cleanup_minutes": request.auto_cleanup_minutes,
+        "timings": result["timings"],
+    }
+
+@app.post("/provision-room")
+async def provision_room_endpoint(request: ProvisionRoomRequest, raw: Request):
+    """Create the room and join the selected agents in one call"""
+    if not request.room_name:
+        raise HTTPException(status_code=400, detail="room_name is required")
+
+    validate_agents(request.agents)
+
+    routed = await route_join(raw, "/provision-room", request)
+    if routed is not None:
+        return routed
+
+    log.info("request", "Provisioning room", room=request.room_name, agents=request.agents)
+    try:
+        result = await provision_room(
+            request.room_name, request.agents, empty_timeout=request.empty_timeout
+        )
+    except HostFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    schedule_auto_cleanup(request.room_name, request.auto_cleanup_minutes)
+
+    return {
+        "status": "success",
+        "room_name": request.room_name,
+        "launched_agents": result["launched_agents"],
+        "total_agents": len(result["launched_agents"]),
+        "auto_cleanup_minutes": request.auto_cleanup_minutes,
+        "timings": result["timings"],
+    }
+
+@app.post("/provision-rooms")
+async def provision_rooms(request: BulkProvisionRequest, raw: Request):
+    """
+    Provision a batch of rooms, each with its agents and user tokens.
+    Rooms are set up BULK_PROVISION_CONCURRENCY at a time and each gets its
+    own result, so one failing room does not fail the others.
+    """
+    if not request.rooms:
+        raise HTTPException(status_code=400, detail="rooms is required")
+    if len(request.rooms) > BULK_PROVISION_MAX_ROOMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BULK_PROVISION_MAX_ROOMS} rooms per request, got {len(request.rooms)}",
+        )
+
+    started = time.perf_counter()
+    seen = set()
+    duplicates = set()
+    for room in request.rooms:
+        (duplicates if room.room_name in seen else seen).add(room.room_name)
+
+    semaphore = asyncio.Semaphore(BULK_PROVISION_CONCURRENCY)
+
+    async def _provision_one(room: BulkRoomRequest) -> dict:
+        result = {"room_name": room.room_name}
+        try:
+            if room.room_name in duplicates:
+                raise HTTPException(status_code=400, detail="room_name appears more than once in the batch")
+            async with semaphore:
+                provisioned = await provision_room_endpoint(
+                    ProvisionRoomRequest(**room.model_dump(exclude={"users"})), raw
+                )
+        except HTTPException as e:
+            return {**result, "status": "error", "status_code": e.status_code, "detail": e.detail}
+        except Exception as e:
+            log.error("request", f"Bulk provisioning failed: {e}", room=room.room_name)
+            return {**result, "status": "error", "status_code": 500, "detail": str(e)}
+
+        return {
+            **result,
+            "status": "success",
+            "launched_agents": provisioned["launched_agents"],
+            "auto_cleanup_minutes": room.auto_cleanup_minutes,
+            "user_tokens": {identity: create_user_token(room.room_name, identity) for identity in room.users},
+            "timings": provisioned.get("timings"),
+        }
+
+    log.info("request", f"Bulk provisioning {len(request.rooms)} rooms")
+    results = await asyncio.gather(*(_provision_one(room) for room in request.rooms))
+    failed = sum(1 for result in results if result["status"] != "success")
+    if failed == 0:
+        status = "success"
+    elif failed == len(results):
+        status = "error"
+    else:
+        status = "partial"
+
+    return {
+        "status": status,
+        "url": LIVEKIT_URL,
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "results": results,
+        "total_ms": _elapsed_ms(started),
     }
 
 
@@ -311,57 +566,64 @@ async def join_room(request: JoinRoomRequest):
 
 # Add this new endpoint to your main.py
 @app.post("/leave-room")
-async def leave_room(room_name: str):
+async def leave_room(room_name: str, raw: Request):
     """Leave the room and delete it, stopping all agents"""
     if not room_name:
         raise HTTPException(status_code=400, detail="room_name is required")
 
-    print(f"🚪 Leaving and deleting room: {room_name}")
+    # The node running the room's agents has to stop them
+    cluster = app.state.cluster
+    if not raw.headers.get(CLUSTER_FORWARDED_HEADER):
+        owner = await cluster.owner(room_name)
+        if owner is not None and not cluster.is_self(owner):
+            log.info("cluster", "Routing leave to the owning node", room=room_name, node=owner.node_id)
+            return await forward_to_node(owner, "/leave-room", params={"room_name": room_name})
 
+    return await leave_room_locally(room_name)
+
+async def leave_room_locally(room_name: str) -> dict:
+    """
+    Delete the room and stop the agents this node runs in it. Cleanup timers
+    call this too, often for rooms LiveKit already dropped (or while LiveKit
+    is unreachable), so the agents are stopped and the room released from the
+    cluster whether or not the delete worked.
+    """
+    log.info("request", "Leaving and deleting room", room=room_name)
+    app.state.cleanup.cancel(room_name)
+
+    room_deleted = True
     try:
-        # 1. Get LiveKit API instance
+        # Deleting the room disconnects every participant, agents included
         api_instance = await get_livekit_api()
-        
-        # 2. Delete the room (this will disconnect all participants including agents)
-        from livekit.api import DeleteRoomRequest
-        delete_request = DeleteRoomRequest(room=room_name)
-        await api_instance.room.delete_room(delete_request)
-        print(f"✅ Room '{room_name}' deleted successfully")
-        
-        # 3. Close the API instance
-        await api_instance.aclose()
-        
-        # 4. Kill any running agent processes for this room
-        import psutil
-        killed_count = 0
-        
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            try:
-                cmdline = proc.info['cmdline']
-                if (cmdline and 
-                    'agent_runner.py' in cmdline and 
-                    '--room' in cmdline and 
-                    room_name in cmdline):
-                    
-                    print(f"🔄 Terminating agent process: {proc.info['pid']}")
-                    proc.terminate()
-                    killed_count += 1
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass
-        
-        print(f"✅ Terminated {killed_count} agent processes for room '{room_name}'")
-        
-        return {
-            "status": "success",
-            "message": f"Room '{room_name}' deleted and all agents stopped",
-            "agents_terminated": killed_count
-        }
-        
+        await api_instance.room.delete_room(api.DeleteRoomRequest(room=room_name))
+        log.info("request", "Room deleted", room=room_name)
+    except api.TwirpError as e:
+        if e.code == api.TwirpErrorCode.NOT_FOUND:
+            log.info("request", "Room was already gone", room=room_name)
+        else:
+            room_deleted = False
+            log.warning("request", f"Could not delete room: {e}", room=room_name)
     except Exception as e:
-        print(f"❌ Error leaving room: {e}")
         import traceback
-        print(f"Traceback: {traceback.format_exc()}")
-        raise HTTPException(status_code=500, detail=f"Failed to leave room: {str(e)}")
+        room_deleted = False
+        log.error("request", f"Could not delete room: {e}", room=room_name, traceback=traceback.format_exc())
+
+    # Stop the agent sessions serving this room
+    try:
+        killed_count = await app.state.supervisor.stop_room(room_name)
+    finally:
+        await app.state.cluster.registry.release_room(room_name)
+    log.info("request", f"Terminated {killed_count} agent processes", room=room_name)
+
+    return {
+        "status": "success",
+        "message": (
+            f"Room '{room_name}' deleted and all agents stopped" if room_deleted
+            else f"Agents of room '{room_name}' stopped, but the room could not be deleted"
+        ),
+        "room_deleted": room_deleted,
+        "agents_terminated": killed_count
+    }
 
 # Also add a helper endpoint to list active rooms
 @app.get("/active-rooms")
@@ -369,8 +631,7 @@ async def list_active_rooms():
     """List all active rooms"""
     try:
         api_instance = await get_livekit_api()
-        rooms = await api_instance.room.list_rooms()
-        await api_instance.aclose()
+        rooms = await api_instance.room.list_rooms(api.ListRoomsRequest())
         
         return {
             "status": "success",
@@ -384,22 +645,13 @@ async def list_active_rooms():
             ]
         }
     except Exception as e:
-        print(f"❌ Error listing rooms: {e}")
+        log.error("request", f"Error listing rooms: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to list rooms: {str(e)}")
 
 @app.post("/generate-user-token")
 async def generate_user_token(user_identity: str, room_name: str):
-    token = api.AccessToken(LIVEKIT_API_KEY, LIVEKIT_API_SECRET) \
-        .with_identity(user_identity) \
-        .with_name(user_identity) \
-        .with_grants(api.VideoGrants(
-            room_join=True,
-            room=room_name,
-        )) \
-        .to_jwt()
-    
     return {
-        "token": token,
+        "token": create_user_token(room_name, user_identity),
         "url": LIVEKIT_URL,
         "room": room_name
     }
@@ -413,7 +665,6 @@ async def get_room_participants(room_name: str):
         participants = await api_instance.room.list_participants(
             api.ListParticipantsRequest(room=room_name)
         )
-        await api_instance.aclose()
         
         return {
             "room": room_name,
@@ -428,7 +679,7 @@ async def get_room_participants(room_name: str):
             ]
         }
     except Exception as e:
-        print(f"❌ Error fetching participants: {e}")
+        log.error("request", f"Error fetching participants: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
@@ -0,0 +1,233 @@
+import os
+import asyncio
+import hashlib
+import tomllib
+import dataclasses
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from structured_log import get_logger
+
+# One <name>.toml file per persona
+PERSONA_DIR = os.getenv("PERSONA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "personas"))
+# Seconds between checks for edited persona files (0 only reloads on request)
+PERSONA_RELOAD_INTERVAL = float(os.getenv("PERSONA_RELOAD_INTERVAL", "5"))
+DEFAULT_LLM_MODEL = "llama-3.3-70b-versatile"
+
+log = get_logger()
+
+
+class PersonaConfigError(ValueError):
+    """A persona file is missing, malformed or contradicts another one"""
+
+
+@dataclass(frozen=True)
+class Persona:
+    """
+    One persona as loaded from its file. Sessions keep the Persona they
+    started with, so a reload only affects sessions started after it.
+
+    "aliases" are the names the turn arbiter listens for; the "lead" persona
+    answers whatever is not addressed to anyone else. An "opener" is spoken
+    word for word when the persona joins, so its audio can come from the TTS
+    cache. "speculation_threshold" overrides SPECULATIVE_LLM_THRESHOLD.
+    "cost" is the persona's weight in admission control.
+    """
+
+    name: str
+    prompt: str
+    voice_id: str
+    aliases: Tuple[str, ...]
+    model: str = DEFAULT_LLM_MODEL
+    opener: Optional[str] = None
+    lead: bool = False
+    cost: float = 1.0
+    speculation_threshold: Optional[float] = None
+    # Hash of the file the persona came from
+    version: str = ""
+
+
+_FIELD_TYPES = {
+    "prompt": str,
+    "voice_id": str,
+    "aliases": list,
+    "model": str,
+    "opener": str,
+    "lead": bool,
+    "cost": (int, float),
+    "speculation_threshold": (int, float),
+}
+_REQUIRED = ("prompt", "voice_id", "aliases")
+
+
+def parse_persona(name: str, data: dict, version: str = "") -> Persona:
+    unknown = sorted(set(data) - set(_FIELD_TYPES))
+    if unknown:
+        raise PersonaConfigError(f"{name}: unknown field(s) {unknown}")
+    missing = [field for field in _REQUIRED if not data.get(field)]
+    if missing:
+        raise PersonaConfigError(f"{name}: missing {missing}")
+    for field, value in data.items():
+        if not isinstance(value, _FIELD_TYPES[field]) or (field != "lead" and isinstance(value, bool)):
+            raise PersonaConfigError(f"{name}: {field} has the wrong type ({type(value).__name__})")
+    if not all(isinstance(alias, str) and alias.strip() for alias in data["aliases"]):
+        raise PersonaConfigError(f"{name}: aliases must be non-empty strings")
+    if data.get("cost", 1.0) <= 0:
+        raise PersonaConfigError(f"{name}: cost must be positive")
+    threshold = data.get("speculation_threshold")
+    if threshold is not None and not 0 < threshold <= 1:
+        raise PersonaConfigError(f"{name}: speculation_threshold must be in (0, 1]")
+
+    opener = data.get("opener", "").strip()
+    return Persona(
+        name=name,
+        prompt=data["prompt"].strip(),
+        voice_id=data["voice_id"],
+        aliases=tuple(alias.strip().lower() for alias in data["aliases"]),
+        model=data.get("model", DEFAULT_LLM_MODEL),
+        opener=opener or None,
+        lead=data.get("lead", False),
+        cost=float(data.get("cost", 1.0)),
+        speculation_threshold=float(threshold) if threshold is not None else None,
+        version=version,
+    )
+
+
+def persona_files(directory: str) -> List[str]:
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        raise PersonaConfigError(f"persona directory {directory} does not exist")
+    return [os.path.join(directory, name) for name in names if name.endswith(".toml")]
+
+
+def load_personas(directory: str = PERSONA_DIR) -> Dict[str, Persona]:
+    """Read and validate every persona file; any problem rejects the whole set"""
+    personas: Dict[str, Persona] = {}
+    for path in persona_files(directory):
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "rb") as f:
+            raw = f.read()
+        try:
+            data = tomllib.loads(raw.decode())
+        except (tomllib.TOMLDecodeError, UnicodeDecodeError) as e:
+            raise PersonaConfigError(f"{name}: {e}")
+        personas[name] = parse_persona(name, data, version=hashlib.sha1(raw).hexdigest()[:12])
+
+    if not personas:
+        raise PersonaConfigError(f"no persona files in {directory}")
+    leads = [persona.name for persona in personas.values() if persona.lead]
+    if len(leads) > 1:
+        raise PersonaConfigError(f"more than one lead persona: {leads}")
+    owners: Dict[str, str] = {}
+    for persona in personas.values():
+        for alias in persona.aliases:
+            if owners.setdefault(alias, persona.name) != persona.name:
+                raise PersonaConfigError(f"alias '{alias}' is used by both {owners[alias]} and {persona.name}")
+    return personas
+
+
+class PersonaRegistry:
+    """
+    The personas defined in PERSONA_DIR. Files are validated as a set when
+    loaded; while running, edited files are picked up every
+    PERSONA_RELOAD_INTERVAL seconds (or on `reload`). A set that fails
+    validation is logged and ignored, and the last good one stays in use.
+    Listeners are called with the new personas after every successful reload.
+    """
+
+    def __init__(self, directory: str = PERSONA_DIR, reload_interval: float = PERSONA_RELOAD_INTERVAL):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self._stamp = self._scan()
+        self.personas: Dict[str, Persona] = load_personas(directory)
+        self._listeners: List[Callable[[Dict[str, Persona]], None]] = []
+        self._watch_task: Optional[asyncio.Task] = None
+
+    def get(self, name: str) -> Persona:
+        return self.personas[name]
+
+    def names(self) -> List[str]:
+        return list(self.personas)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.personas
+
+    @property
+    def lead(self) -> Optional[str]:
+        return next((persona.name for persona in self.personas.values() if persona.lead), None)
+
+    def aliases(self) -> Dict[str, Tuple[str, ...]]:
+        return {name: persona.aliases for name, persona in self.personas.items()}
+
+    def costs(self) -> Dict[str, float]:
+        return {name: persona.cost for name, persona in self.personas.items()}
+
+    def summary(self) -> dict:
+        return {
+            name: {"version": persona.version, **{
+                field: value for field, value in dataclasses.asdict(persona).items()
+                if field in ("voice_id", "model", "aliases", "lead", "cost")
+            }}
+            for name, persona in self.personas.items()
+        }
+
+    def add_listener(self, callback: Callable[[Dict[str, Persona]], None]):
+        self._listeners.append(callback)
+
+    # -- Reloading --
+
+    def _scan(self) -> Tuple:
+        """What changes whenever a persona file is added, removed or edited"""
+        stamp = []
+        for path in persona_files(self.directory) if os.path.isdir(self.directory) else []:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            stamp.append((path, st.st_mtime_ns, st.st_size))
+        return tuple(stamp)
+
+    def _load_if_changed(self, force: bool):
+        stamp = self._scan()
+        if stamp == self._stamp and not force:
+            return None
+        self._stamp = stamp  # a broken set is not retried until the files change again
+        return load_personas(self.directory)
+
+    async def reload(self, force: bool = False) -> bool:
+        """Load the persona files again if they changed; True if a new set took effect"""
+        try:
+            personas = await asyncio.to_thread(self._load_if_changed, force)
+        except (PersonaConfigError, OSError) as e:
+            log.error("personas", f"Persona files rejected, keeping the current set: {e}")
+            return False
+        if personas is None:
+            return False
+
+        changed = sorted(
+            name for name in set(personas) | set(self.personas)
+            if getattr(personas.get(name), "version", None) != getattr(self.personas.get(name), "version", None)
+        )
+        if not changed:
+            return False
+        self.personas = personas
+        log.info("personas", "Personas reloaded", changed=changed)
+        for listener in list(self._listeners):
+            listener(personas)
+        return True
+
+    async def start(self):
+        """Watch the persona files (once per process; later calls do nothing)"""
+        if self._watch_task is None and self.reload_interval > 0:
+            self._watch_task = asyncio.create_task(self._watch_loop())
+
+    async def _watch_loop(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            await self.reload()
+
+    async def aclose(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            self._watch_task = None
@@ -0,0 +1,748 @@
+"""
+Provider rate limits shared by every process on the box.
+
+Each provider (Deepgram, Groq, ElevenLabs) gets a bucket of requests per
+second, concurrent requests or streams, and tokens per minute (characters
+for TTS). Requests wait for room in their provider's bucket in priority
+order, so a reply in the middle of a turn goes ahead of greetings and
+background summaries. A request never waits longer than
+PROVIDER_LIMIT_MAX_WAIT: it then goes ahead anyway, since a late reply is
+better than none. A 429 from a provider empties its bucket for
+PROVIDER_LIMIT_PENALTY seconds everywhere, instead of each process running
+into the quota on its own.
+
+main.py keeps the buckets and serves them on a Unix socket that agent
+workers use. A process that cannot reach the socket keeps buckets of its
+own until it can. The provider clients are wrapped in agent_runner.py:
+
+    llm_model = RateLimitedLLM(groq.LLM(...), "groq")
+    with provider_priority(GREETING):
+        await session.say(opener)
+"""
+import os
+import json
+import time
+import heapq
+import asyncio
+import itertools
+import contextvars
+import dataclasses
+from collections import Counter
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from livekit import rtc
+from livekit.agents import APIConnectOptions, APIStatusError, llm, stt, tts, utils
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN, NotGivenOr
+
+from cluster import CLUSTER_STATE_SUFFIX
+from structured_log import get_logger
+
+# Limits per provider, e.g. "groq.rps=5,groq.tpm=60000,elevenlabs.concurrent=5,deepgram.concurrent=50"
+# (rps = requests per second, burst = requests at once after a quiet spell, concurrent = requests or
+# streams in flight, tpm = tokens per minute, characters for TTS); unset means unlimited
+PROVIDER_LIMITS = os.getenv("PROVIDER_LIMITS", "")
+# "socket": share the buckets main.py serves on PROVIDER_LIMITER_SOCKET; "local": buckets per process
+PROVIDER_LIMITER = os.getenv("PROVIDER_LIMITER", "socket")
+# Unix socket the shared buckets are served on (one per node)
+PROVIDER_LIMITER_SOCKET = os.getenv(
+    "PROVIDER_LIMITER_SOCKET",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "state", f"provider_limits{CLUSTER_STATE_SUFFIX}.sock"),
+)
+# Seconds a request waits for its provider's bucket before it goes ahead anyway
+PROVIDER_LIMIT_MAX_WAIT = float(os.getenv("PROVIDER_LIMIT_MAX_WAIT", "3"))
+# Seconds a provider's bucket stays empty after it answered 429
+PROVIDER_LIMIT_PENALTY = float(os.getenv("PROVIDER_LIMIT_PENALTY", "2"))
+# Completion tokens an LLM request is assumed to use until its usage is known
+PROVIDER_LIMIT_COMPLETION_TOKENS = int(os.getenv("PROVIDER_LIMIT_COMPLETION_TOKENS", "150"))
+# Seconds between attempts to reach the socket after it went away
+SOCKET_RETRY_INTERVAL = 5.0
+
+# Priorities, most urgent first
+TURN, SPECULATIVE, GREETING, BACKGROUND = 0, 1, 2, 3
+PRIORITY_NAMES = {TURN: "turn", SPECULATIVE: "speculative", GREETING: "greeting", BACKGROUND: "background"}
+
+log = get_logger()
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("provider_priority", default=TURN)
+
+
+@contextmanager
+def provider_priority(priority: int):
+    """Provider requests started in this block (and in tasks it creates) wait with `priority`"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def set_provider_priority(priority: int):
+    """The priority of provider requests from here on in the current context"""
+    _priority.set(priority)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+@dataclass
+class ProviderLimits:
+    rps: float = 0
+    burst: float = 0
+    concurrent: int = 0
+    tpm: float = 0
+
+
+def parse_limits(spec: str) -> Dict[str, ProviderLimits]:
+    """"groq.rps=5,groq.tpm=60000" -> {"groq": ProviderLimits(rps=5, tpm=60000)}"""
+    limits: Dict[str, ProviderLimits] = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        key, value = part.split("=", 1)
+        provider, _, field = key.strip().rpartition(".")
+        if not provider or field not in ("rps", "burst", "concurrent", "tpm"):
+            raise ValueError(f"PROVIDER_LIMITS: cannot parse {part.strip()!r}")
+        current = limits.setdefault(provider, ProviderLimits())
+        setattr(current, field, int(value) if field == "concurrent" else float(value))
+    return limits
+
+
+@dataclass
+class Lease:
+    """Room in a provider's bucket, held until `release`"""
+
+    provider: str
+    lease_id: int
+    tokens: int
+    waited: float = 0.0
+    # Went ahead after PROVIDER_LIMIT_MAX_WAIT without room in the bucket
+    overflow: bool = False
+    # Set by the holder once the request's real token count is known
+    used_tokens: Optional[int] = None
+    remote: bool = False
+
+
+class ProviderBucket:
+    """The request, concurrency and token budgets of one provider"""
+
+    def __init__(self, limits: ProviderLimits):
+        self.limits = limits
+        self.request_capacity = limits.burst or max(1.0, limits.rps)
+        self.requests = self.request_capacity
+        self.tokens = limits.tpm
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        self.updated = now
+        if self.limits.rps:
+            self.requests = min(self.request_capacity, self.requests + elapsed * self.limits.rps)
+        if self.limits.tpm:
+            self.tokens = min(self.limits.tpm, self.tokens + elapsed * self.limits.tpm / 60)
+
+    def wait_time(self, tokens: int, now: float) -> Optional[float]:
+        """Seconds until a request could go (0 for now), or None if it waits for one in flight to finish"""
+        self._refill(now)
+        if self.limits.concurrent and self.in_flight >= self.limits.concurrent:
+            return None
+        wait = max(0.0, self.blocked_until - now)
+        if self.limits.rps and self.requests < 1:
+            wait = max(wait, (1 - self.requests) / self.limits.rps)
+        if self.limits.tpm:
+            # A request larger than the whole budget goes once the budget is full
+            needed = min(tokens, self.limits.tpm)
+            if self.tokens < needed:
+                wait = max(wait, (needed - self.tokens) * 60 / self.limits.tpm)
+        return wait
+
+    def take(self, tokens: int):
+        self.in_flight += 1
+        if self.limits.rps:
+            self.requests -= 1
+        if self.limits.tpm:
+            self.tokens -= tokens
+
+    def release(self, estimated: int, used: Optional[int]):
+        self.in_flight = max(0, self.in_flight - 1)
+        if self.limits.tpm and used is not None:
+            self.tokens -= used - estimated
+
+    def penalize(self, seconds: float, now: float):
+        self._refill(now)
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.requests = min(self.requests, 0.0)
+
+
+class ProviderLimiter(ABC):
+    """Where the buckets live: in this process, or behind main.py's socket"""
+
+    @abstractmethod
+    async def acquire(self, provider: str, priority: int = TURN, tokens: int = 0) -> Lease: ...
+
+    @abstractmethod
+    def release(self, lease: Lease): ...
+
+    @abstractmethod
+    def penalize(self, provider: str, seconds: float = PROVIDER_LIMIT_PENALTY): ...
+
+    @abstractmethod
+    def stats(self) -> dict: ...
+
+    async def aclose(self):
+        pass
+
+
+class _ProviderState:
+    def __init__(self, limits: ProviderLimits):
+        self.bucket = ProviderBucket(limits)
+        self.waiters: List[tuple] = []  # (priority, seq, tokens, started, future)
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.granted = 0
+        self.overflowed = 0
+        self.penalties = 0
+        self.waited = 0.0
+
+
+class LocalProviderLimiter(ProviderLimiter):
+    """Buckets in this process, handed out strictly in priority order"""
+
+    def __init__(self, limits: Dict[str, ProviderLimits], max_wait: float = PROVIDER_LIMIT_MAX_WAIT):
+        self.limits = limits
+        self.max_wait = max_wait
+        self._providers: Dict[str, _ProviderState] = {}
+        self._lease_ids = itertools.count(1)
+        self._seq = itertools.count()
+
+    def _state(self, provider: str) -> _ProviderState:
+        state = self._providers.get(provider)
+        if state is None:
+            state = self._providers[provider] = _ProviderState(self.limits.get(provider, ProviderLimits()))
+        return state
+
+    def _grant(self, state: _ProviderState, provider: str, tokens: int, waited: float, overflow: bool = False) -> Lease:
+        state.bucket.take(tokens)
+        state.granted += 1
+        state.waited += waited
+        if overflow:
+            state.overflowed += 1
+        return Lease(provider, next(self._lease_ids), tokens, waited=waited, overflow=overflow)
+
+    async def acquire(self, provider: str, priority: int = TURN, tokens: int = 0) -> Lease:
+        state = self._state(provider)
+        if not state.waiters and state.bucket.wait_time(tokens, time.monotonic()) == 0:
+            return self._grant(state, provider, tokens, 0.0)
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(state.waiters, (priority, next(self._seq), tokens, started, future))
+        self._pump(provider)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(future.result())
+            future.cancel()
+            self._pump(provider)
+            raise
+        if future.done():
+            return future.result()
+        future.cancel()  # the pump skips it from now on
+        lease = self._grant(state, provider, tokens, time.monotonic() - started, overflow=True)
+        log.warning("providers", f"{provider} request went ahead after waiting {self.max_wait:.1f}s",
+                    provider=provider, priority=PRIORITY_NAMES.get(priority, priority))
+        return lease
+
+    def _pump(self, provider: str):
+        """Grant waiting requests, most urgent first, while the bucket has room"""
+        state = self._providers[provider]
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+        now = time.monotonic()
+        while state.waiters:
+            _, _, tokens, started, future = state.waiters[0]
+            if future.done():
+                heapq.heappop(state.waiters)
+                continue
+            wait = state.bucket.wait_time(tokens, now)
+            if wait is None:
+                return  # a release pumps again
+            if wait > 0:
+                state.timer = asyncio.get_running_loop().call_later(wait, self._pump, provider)
+                return
+            heapq.heappop(state.waiters)
+            future.set_result(self._grant(state, provider, tokens, now - started))
+
+    def release(self, lease: Lease):
+        state = self._state(lease.provider)
+        state.bucket.release(lease.tokens, lease.used_tokens)
+        if state.waiters:
+            self._pump(lease.provider)
+
+    def penalize(self, provider: str, seconds: float = PROVIDER_LIMIT_PENALTY):
+        state = self._state(provider)
+        state.bucket.penalize(seconds, time.monotonic())
+        state.penalties += 1
+        log.warning("providers", f"{provider} is rate limiting us, holding requests for {seconds:.1f}s",
+                    provider=provider)
+
+    def stats(self) -> dict:
+        return {
+            provider: {
+                "in_flight": state.bucket.in_flight,
+                "waiting": {
+                    PRIORITY_NAMES.get(priority, str(priority)): n
+                    for priority, n in sorted(Counter(
+                        priority for priority, _, _, _, future in state.waiters if not future.done()
+                    ).items())
+                },
+                "granted": state.granted,
+                "overflowed": state.overflowed,
+                "penalties": state.penalties,
+                "mean_wait_ms": round(state.waited / state.granted * 1000, 1) if state.granted else 0.0,
+            }
+            for provider, state in self._providers.items()
+        }
+
+
+class ProviderLimitServer:
+    """
+    Serves a LocalProviderLimiter on a Unix socket as JSON lines. The leases
+    of a connection that goes away (a worker that crashed) are released.
+    """
+
+    def __init__(self, limiter: LocalProviderLimiter, path: str = PROVIDER_LIMITER_SOCKET):
+        self.limiter = limiter
+        self.path = path
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path):
+            try:
+                _, writer = await asyncio.open_unix_connection(self.path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.remove(self.path)  # left behind by a server that did not shut down cleanly
+            else:
+                writer.close()
+                raise RuntimeError(
+                    f"{self.path} is served by another running process; "
+                    "give each node its own CLUSTER_NODE_ID or PROVIDER_LIMITER_SOCKET"
+                )
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path)
+        log.info("providers", "Serving provider rate limits", socket=self.path)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        leases: Dict[int, Lease] = {}
+        pending: Dict[int, asyncio.Task] = {}
+
+        async def _acquire(request: dict):
+            lease = await self.limiter.acquire(request["provider"], request.get("priority", TURN), request.get("tokens", 0))
+            leases[lease.lease_id] = lease
+            pending.pop(request["id"], None)
+            try:
+                writer.write((json.dumps({
+                    "id": request["id"], "lease": lease.lease_id, "waited": lease.waited, "overflow": lease.overflow,
+                }) + "\n").encode())
+            except (ConnectionError, RuntimeError):
+                pass  # the lease is released with the connection
+
+        try:
+            while line := await reader.readline():
+                request = json.loads(line)
+                op = request.get("op")
+                if op == "acquire":
+                    pending[request["id"]] = asyncio.create_task(_acquire(request))
+                elif op == "release":
+                    lease = leases.pop(request["lease"], None)
+                    if lease:
+                        lease.used_tokens = request.get("used")
+                        self.limiter.release(lease)
+                elif op == "penalize":
+                    self.limiter.penalize(request["provider"], request.get("seconds", PROVIDER_LIMIT_PENALTY))
+        except (ConnectionError, ValueError) as e:
+            log.warning("providers", f"Dropping a rate limit client: {e}")
+        finally:
+            for task in pending.values():
+                task.cancel()
+            await asyncio.gather(*pending.values(), return_exceptions=True)
+            for lease in leases.values():
+                self.limiter.release(lease)
+            writer.close()
+
+    async def aclose(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class SocketProviderLimiter(ProviderLimiter):
+    """
+    Uses the buckets a ProviderLimitServer serves. While the socket cannot
+    be reached, `fallback` (buckets of this process alone) stands in, and
+    the socket is tried again every SOCKET_RETRY_INTERVAL seconds.
+    """
+
+    def __init__(self, path: str, fallback: LocalProviderLimiter):
+        self.path = path
+        self.fallback = fallback
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._lock = asyncio.Lock()
+        self._retry_at = 0.0
+
+    async def _connect(self) -> bool:
+        if self._writer is not None:
+            return True
+        if time.monotonic() < self._retry_at:
+            return False
+        async with self._lock:
+            if self._writer is not None:
+                return True
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.path)
+            except OSError as e:
+                self._retry_at = time.monotonic() + SOCKET_RETRY_INTERVAL
+                log.warning("providers", f"Provider rate limits not reachable, limiting this process alone: {e}",
+                            socket=self.path)
+                return False
+            self._reader_task = asyncio.create_task(self._read(reader))
+            return True
+
+    async def _read(self, reader: asyncio.StreamReader):
+        try:
+            while line := await reader.readline():
+                response = json.loads(line)
+                future = self._pending.pop(response["id"], None)
+                if future and not future.done():
+                    future.set_result(response)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self._disconnected()
+
+    def _disconnected(self):
+        self._writer = None
+        self._retry_at = time.monotonic() + SOCKET_RETRY_INTERVAL
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("provider rate limit socket closed"))
+        self._pending.clear()
+
+    def _send(self, **request) -> bool:
+        if self._writer is None:
+            return False
+        try:
+            self._writer.write((json.dumps(request) + "\n").encode())
+        except (ConnectionError, RuntimeError):
+            self._disconnected()
+            return False
+        return True
+
+    async def acquire(self, provider: str, priority: int = TURN, tokens: int = 0) -> Lease:
+        if not await self._connect():
+            return await self.fallback.acquire(provider, priority, tokens)
+        request_id = next(self._ids)
+        future = self._pending[request_id] = asyncio.get_running_loop().create_future()
+        started = time.monotonic()
+        if not self._send(op="acquire", id=request_id, provider=provider, priority=priority, tokens=tokens):
+            self._pending.pop(request_id, None)
+            return await self.fallback.acquire(provider, priority, tokens)
+        try:
+            # The server gives up waiting after max_wait itself; this only covers a server that hangs
+            response = await asyncio.wait_for(future, self.fallback.max_wait + 1)
+        except (ConnectionError, asyncio.TimeoutError):
+            self._pending.pop(request_id, None)
+            return await self.fallback.acquire(provider, priority, tokens)
+        except asyncio.CancelledError:
+            self._pending.pop(request_id, None)
+            if future.done() and not future.cancelled() and not future.exception():
+                self._send(op="release", lease=future.result()["lease"])
+            raise
+        return Lease(
+            provider, response["lease"], tokens,
+            waited=time.monotonic() - started, overflow=response.get("overflow", False), remote=True,
+        )
+
+    def release(self, lease: Lease):
+        if not lease.remote:
+            self.fallback.release(lease)
+        else:
+            # A lease of a connection that closed was already released by the server
+            self._send(op="release", lease=lease.lease_id, used=lease.used_tokens)
+
+    def penalize(self, provider: str, seconds: float = PROVIDER_LIMIT_PENALTY):
+        if not self._send(op="penalize", provider=provider, seconds=seconds):
+            self.fallback.penalize(provider, seconds)
+
+    def stats(self) -> dict:
+        return {"socket": self.path, "connected": self._writer is not None, "local": self.fallback.stats()}
+
+    async def aclose(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task:
+            self._reader_task.cancel()
+
+
+_limiter: Optional[ProviderLimiter] = None
+_server: Optional[ProviderLimitServer] = None
+
+
+def get_provider_limiter() -> ProviderLimiter:
+    """This process's limiter: main.py's buckets through the socket, or buckets of its own"""
+    global _limiter
+    if _limiter is None:
+        limits = parse_limits(PROVIDER_LIMITS)
+        local = LocalProviderLimiter(limits)
+        if PROVIDER_LIMITER == "socket" and limits and _server is None:
+            _limiter = SocketProviderLimiter(PROVIDER_LIMITER_SOCKET, local)
+        else:
+            _limiter = local
+    return _limiter
+
+
+async def serve_provider_limits() -> Optional[ProviderLimitServer]:
+    """Serve this process's buckets to the agent workers (main.py, with PROVIDER_LIMITER=socket)"""
+    global _limiter, _server
+    limits = parse_limits(PROVIDER_LIMITS)
+    if PROVIDER_LIMITER != "socket" or not limits:
+        return None
+    if _server is None:
+        if not isinstance(_limiter, LocalProviderLimiter):
+            _limiter = LocalProviderLimiter(limits)
+        _server = ProviderLimitServer(_limiter)
+        await _server.start()
+    return _server
+
+
+def provider_limit_stats() -> dict:
+    return get_provider_limiter().stats()
+
+
+@asynccontextmanager
+async def provider_slot(provider: str, tokens: int = 0):
+    """Hold room in `provider`'s bucket for one request or stream"""
+    limiter = get_provider_limiter()
+    lease = await limiter.acquire(provider, current_priority(), tokens)
+    try:
+        yield lease
+    except APIStatusError as e:
+        if e.status_code == 429:
+            limiter.penalize(provider)
+        raise
+    finally:
+        limiter.release(lease)
+
+
+def _prompt_tokens(chat_ctx: llm.ChatContext) -> int:
+    # About four characters per token, as context_budget.py estimates
+    return sum(len(item.text_content or "") // 4 + 4 for item in chat_ctx.items if item.type == "message")
+
+
+def _single_attempt(conn_options: APIConnectOptions) -> APIConnectOptions:
+    # The wrapper retries, taking a new slot for every attempt
+    return dataclasses.replace(conn_options, max_retry=0)
+
+
+class RateLimitedLLM(llm.LLM):
+    """An LLM whose requests wait for room in their provider's bucket"""
+
+    def __init__(self, wrapped: llm.LLM, provider: str, completion_tokens: int = PROVIDER_LIMIT_COMPLETION_TOKENS):
+        super().__init__()
+        self.wrapped = wrapped
+        self.provider = provider
+        self.completion_tokens = completion_tokens
+        # Report metrics under the provider's name
+        self._label = wrapped.label
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools=None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        **kwargs,
+    ) -> "RateLimitedLLMStream":
+        return RateLimitedLLMStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options, kwargs=kwargs)
+
+    async def aclose(self):
+        await self.wrapped.aclose()
+
+
+class RateLimitedLLMStream(llm.LLMStream):
+    def __init__(self, limited: RateLimitedLLM, *, chat_ctx, tools, conn_options, kwargs: dict):
+        super().__init__(limited, chat_ctx=chat_ctx, tools=tools, conn_options=conn_options)
+        self._limited = limited
+        self._kwargs = kwargs
+
+    async def _run(self):
+        limited = self._limited
+        estimate = _prompt_tokens(self._chat_ctx) + limited.completion_tokens
+        async with provider_slot(limited.provider, estimate) as lease:
+            async with limited.wrapped.chat(
+                chat_ctx=self._chat_ctx, tools=self._tools,
+                conn_options=_single_attempt(self._conn_options), **self._kwargs,
+            ) as stream:
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        lease.used_tokens = chunk.usage.total_tokens
+                    self._event_ch.send_nowait(chunk)
+
+
+class RateLimitedTTS(tts.TTS):
+    """
+    A TTS whose syntheses and streams wait for room in their provider's
+    bucket (tokens are characters). Streams the wrapped TTS can stream, so
+    the websocket path stays in use.
+    """
+
+    def __init__(self, wrapped: tts.TTS, provider: str):
+        super().__init__(
+            capabilities=wrapped.capabilities,
+            sample_rate=wrapped.sample_rate,
+            num_channels=wrapped.num_channels,
+        )
+        self.wrapped = wrapped
+        self.provider = provider
+        self._label = wrapped.label
+        # Lets the TTS cache key audio by the wrapped voice
+        self._opts = getattr(wrapped, "_opts", None)
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "RateLimitedChunkedStream":
+        return RateLimitedChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+    def stream(self, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "RateLimitedSynthesizeStream":
+        return RateLimitedSynthesizeStream(tts=self, conn_options=conn_options)
+
+    def prewarm(self):
+        self.wrapped.prewarm()
+
+    async def aclose(self):
+        await self.wrapped.aclose()
+
+
+class RateLimitedChunkedStream(tts.ChunkedStream):
+    def __init__(self, *, tts: RateLimitedTTS, input_text: str, conn_options: APIConnectOptions):
+        super().__init__(tts=tts, input_text=input_text, conn_options=conn_options)
+        self._limited = tts
+
+    async def _run(self):
+        limited = self._limited
+        async with provider_slot(limited.provider, len(self._input_text)):
+            async with limited.wrapped.synthesize(self._input_text, conn_options=_single_attempt(self._conn_options)) as stream:
+                async for ev in stream:
+                    self._event_ch.send_nowait(ev)
+
+
+class RateLimitedSynthesizeStream(tts.SynthesizeStream):
+    """Text pushed while the stream waits for a slot is kept and sent once it has one"""
+
+    def __init__(self, *, tts: RateLimitedTTS, conn_options: APIConnectOptions):
+        super().__init__(tts=tts, conn_options=conn_options)
+        self._limited = tts
+
+    async def _run(self):
+        limited = self._limited
+        async with provider_slot(limited.provider) as lease:
+            inner = limited.wrapped.stream(conn_options=_single_attempt(self._conn_options))
+            characters = 0
+
+            async def _forward_input():
+                nonlocal characters
+                async for data in self._input_ch:
+                    if isinstance(data, str):
+                        self._mark_started()
+                        characters += len(data)
+                        inner.push_text(data)
+                    else:
+                        inner.flush()
+                inner.end_input()
+
+            forward = asyncio.create_task(_forward_input())
+            try:
+                async for ev in inner:
+                    self._event_ch.send_nowait(ev)
+            finally:
+                # Characters are only known once they were streamed
+                lease.used_tokens = characters
+                await utils.aio.cancel_and_wait(forward)
+                await inner.aclose()
+
+
+class RateLimitedSTT(stt.STT):
+    """An STT whose requests and streams hold room in their provider's bucket while they run"""
+
+    def __init__(self, wrapped: stt.STT, provider: str):
+        super().__init__(capabilities=wrapped.capabilities)
+        self.wrapped = wrapped
+        self.provider = provider
+        self._label = wrapped.label
+
+    async def _recognize_impl(
+        self,
+        buffer: utils.AudioBuffer,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions,
+    ) -> stt.SpeechEvent:
+        async with provider_slot(self.provider):
+            return await self.wrapped.recognize(buffer, language=language, conn_options=_single_attempt(conn_options))
+
+    def stream(
+        self,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "RateLimitedRecognizeStream":
+        return RateLimitedRecognizeStream(stt=self, language=language, conn_options=conn_options)
+
+    def prewarm(self):
+        self.wrapped.prewarm()
+
+    async def aclose(self):
+        await self.wrapped.aclose()
+
+
+class RateLimitedRecognizeStream(stt.RecognizeStream):
+    """Audio pushed while the stream waits for a slot is kept and sent once it has one"""
+
+    def __init__(self, *, stt: RateLimitedSTT, language: NotGivenOr[str], conn_options: APIConnectOptions):
+        super().__init__(stt=stt, conn_options=conn_options)
+        self._limited = stt
+        self._language = language
+
+    async def _run(self):
+        limited = self._limited
+        async with provider_slot(limited.provider):
+            inner = limited.wrapped.stream(language=self._language, conn_options=_single_attempt(self._conn_options))
+
+            async def _forward_input():
+                async for data in self._input_ch:
+                    if isinstance(data, rtc.AudioFrame):
+                        inner.push_frame(data)
+                    else:
+                        inner.flush()
+                inner.end_input()
+
+            forward = asyncio.create_task(_forward_input())
+            try:
+                async for ev in inner:
+                    self._event_ch.send_nowait(ev)
+            finally:
+                await utils.aio.cancel_and_wait(forward)
+                await inner.aclose()
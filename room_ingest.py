@@ -0,0 +1,207 @@
+import asyncio
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from livekit import rtc
+from livekit.agents import stt, vad
+
+from audio_preprocess import AUDIO_SAMPLE_RATE, AudioPreprocessor, denoise_options
+from idle_stt import STT_IDLE_AFTER, IdleSTT
+from structured_log import get_logger
+
+log = get_logger()
+
+
+def is_agent_participant(participant: rtc.RemoteParticipant) -> bool:
+    """True for our own persona agents (and any other LiveKit agent) in a room"""
+    return (
+        participant.kind == rtc.ParticipantKind.PARTICIPANT_KIND_AGENT
+        or "-agent-" in participant.identity
+    )
+
+
+class RoomIngest:
+    """
+    Runs VAD and STT once per human audio track in a room and fans the
+    resulting speech events out to every persona session in that room, so
+    personas only run their own LLM and TTS.
+
+    Speech boundaries (START/END_OF_SPEECH) come from the shared VAD,
+    transcripts from the shared STT stream. The tracks are read through the
+    first attached persona's room connection; if that persona leaves, the
+    ingest moves over to the next one.
+    """
+
+    def __init__(self, room_name: str, vad_model: vad.VAD, stt_model: stt.STT):
+        self.room_name = room_name
+        self._vad = vad_model
+        self._stt = stt_model
+        self._rooms: List[rtc.Room] = []
+        self._subscribers: List[asyncio.Queue] = []
+        self._frame_listeners: List[Callable[[rtc.AudioFrame], None]] = []
+        self._track_tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def attached(self) -> int:
+        return len(self._rooms)
+
+    # -- Persona connections --
+
+    def attach(self, room: rtc.Room):
+        """Register a persona's room connection as a possible audio source"""
+        self._rooms.append(room)
+        room.on("track_subscribed", lambda track, pub, participant: self._on_track_subscribed(room, track, participant))
+        room.on("track_unsubscribed", lambda track, pub, participant: self._on_track_unsubscribed(room, track))
+        if len(self._rooms) == 1:
+            self._ingest_existing_tracks(room)
+
+    async def detach(self, room: rtc.Room):
+        """Forget a persona's connection, moving ingest to another one if it was the source"""
+        was_source = bool(self._rooms) and self._rooms[0] is room
+        if room in self._rooms:
+            self._rooms.remove(room)
+        if not was_source:
+            return
+        await self._stop_all_tracks()
+        if self._rooms:
+            log.info("ingest", "Shared ingest moving to another persona connection", room=self.room_name)
+            self._ingest_existing_tracks(self._rooms[0])
+
+    def _ingest_existing_tracks(self, room: rtc.Room):
+        for participant in room.remote_participants.values():
+            for publication in participant.track_publications.values():
+                if publication.track is not None:
+                    self._on_track_subscribed(room, publication.track, participant)
+
+    def _on_track_subscribed(self, room: rtc.Room, track: rtc.Track, participant: rtc.RemoteParticipant):
+        if not self._rooms or room is not self._rooms[0]:
+            return  # only the source connection feeds the ingest
+        if track.kind != rtc.TrackKind.KIND_AUDIO or is_agent_participant(participant):
+            return
+        if track.sid in self._track_tasks:
+            return
+        log.info("ingest", "Shared VAD/STT started", room=self.room_name, participant=participant.identity)
+        self._track_tasks[track.sid] = asyncio.create_task(self._ingest_track(track))
+
+    def _on_track_unsubscribed(self, room: rtc.Room, track: rtc.Track):
+        if self._rooms and room is self._rooms[0]:
+            task = self._track_tasks.pop(track.sid, None)
+            if task:
+                task.cancel()
+
+    async def _stop_all_tracks(self):
+        tasks = list(self._track_tasks.values())
+        self._track_tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # -- Fan-out --
+
+    async def subscribe(self) -> AsyncIterator[stt.SpeechEvent]:
+        """Yield every speech event from every human in the room"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers.remove(queue)
+
+    def add_frame_listener(self, callback: Callable[[rtc.AudioFrame], None]):
+        """Call `callback` with every user audio frame the VAD and STT are fed"""
+        self._frame_listeners.append(callback)
+
+    def remove_frame_listener(self, callback: Callable[[rtc.AudioFrame], None]):
+        if callback in self._frame_listeners:
+            self._frame_listeners.remove(callback)
+
+    def _publish(self, event: stt.SpeechEvent):
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    # -- Per-track pipeline --
+
+    async def _ingest_track(self, track: rtc.Track):
+        audio = rtc.AudioStream.from_track(
+            track=track, sample_rate=AUDIO_SAMPLE_RATE, num_channels=1, noise_cancellation=denoise_options(),
+        )
+        preprocessor = AudioPreprocessor()
+        # The STT stream only holds a provider connection while the VAD hears speech
+        idle_stt = IdleSTT(self._stt) if STT_IDLE_AFTER > 0 else None
+        vad_stream = self._vad.stream()
+        stt_stream = (idle_stt or self._stt).stream()
+
+        async def _forward_audio():
+            async for ev in audio:
+                # Processed once; VAD, STT and listeners all get the same frame
+                for frame in preprocessor.process(ev.frame):
+                    vad_stream.push_frame(frame)
+                    stt_stream.push_frame(frame)
+                    for listener in self._frame_listeners:
+                        listener(frame)
+
+        async def _forward_vad():
+            async for ev in vad_stream:
+                if ev.type == vad.VADEventType.START_OF_SPEECH:
+                    if idle_stt:
+                        idle_stt.speech_started()
+                    self._publish(stt.SpeechEvent(type=stt.SpeechEventType.START_OF_SPEECH))
+                elif ev.type == vad.VADEventType.END_OF_SPEECH:
+                    if idle_stt:
+                        idle_stt.speech_ended()
+                    self._publish(stt.SpeechEvent(type=stt.SpeechEventType.END_OF_SPEECH))
+
+        async def _forward_stt():
+            async for ev in stt_stream:
+                # Boundaries come from the shared VAD; drop the provider's own
+                if ev.type not in (stt.SpeechEventType.START_OF_SPEECH, stt.SpeechEventType.END_OF_SPEECH):
+                    self._publish(ev)
+
+        tasks = [
+            asyncio.create_task(_forward_audio()),
+            asyncio.create_task(_forward_vad()),
+            asyncio.create_task(_forward_stt()),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await vad_stream.aclose()
+            await stt_stream.aclose()
+            await audio.aclose()
+
+    async def aclose(self):
+        self._rooms.clear()
+        await self._stop_all_tracks()
+
+
+class RoomIngestRegistry:
+    """One RoomIngest per room in this process, kept while any persona uses it"""
+
+    def __init__(self, vad_model: vad.VAD, stt_model: stt.STT):
+        self._vad = vad_model
+        self._stt = stt_model
+        self._ingests: Dict[str, RoomIngest] = {}
+
+    def get(self, room_name: str) -> Optional[RoomIngest]:
+        return self._ingests.get(room_name)
+
+    def join(self, room_name: str, room: rtc.Room) -> RoomIngest:
+        """Attach a persona's connection to the room's ingest, creating it if needed"""
+        ingest = self._ingests.get(room_name)
+        if ingest is None:
+            ingest = self._ingests[room_name] = RoomIngest(room_name, self._vad, self._stt)
+        ingest.attach(room)
+        return ingest
+
+    async def leave(self, room_name: str, room: rtc.Room):
+        """Detach a persona's connection, closing the ingest when nobody is left"""
+        ingest = self._ingests.get(room_name)
+        if ingest is None:
+            return
+        await ingest.detach(room)
+        if not ingest.attached:
+            del self._ingests[room_name]
+            await ingest.aclose()
@@ -0,0 +1,211 @@
+import os
+import gzip
+import json
+import time
+import struct
+import asyncio
+from collections import deque
+from typing import AsyncIterable, AsyncIterator, Deque, Iterator, List, Optional, Tuple
+
+from livekit import rtc
+from livekit.agents import AgentSession, stt
+from livekit.agents.metrics import EOUMetrics, LLMMetrics, TTSMetrics
+
+from structured_log import get_logger
+
+# Opt-in: directory each agent session writes a recording to (empty disables recording)
+SESSION_RECORD_DIR = os.getenv("SESSION_RECORD_DIR", "")
+RECORDING_VERSION = 1
+
+# Record header: kind, seconds since the recording started, payload length
+_RECORD = struct.Struct("<Bdi")
+# Audio payload header: sample rate, channels (followed by 16-bit PCM)
+_AUDIO = struct.Struct("<IB")
+_KIND_AUDIO = 0
+_KIND_EVENT = 1
+# Bytes collected before they are handed to the writer thread
+_WRITE_CHUNK = 64 * 1024
+
+
+log = get_logger()
+
+
+def recording_path(identity: str, directory: str = SESSION_RECORD_DIR) -> str:
+    return os.path.join(directory, f"{identity}-{time.strftime('%Y%m%d-%H%M%S')}.rec.gz")
+
+
+class SessionRecorder:
+    """
+    Records one agent session into a gzip file of length-prefixed records:
+    the user audio it heard, plus VAD/STT, LLM, TTS and metrics events. Every
+    record carries the time since the recording started; STT events also
+    carry how many seconds of audio had been heard, so a replay can line the
+    transcripts up with the audio. Writing happens on a thread, so the event
+    loop only appends to a buffer.
+    """
+
+    def __init__(self, path: str, meta: dict):
+        self.path = path
+        self._started = time.perf_counter()
+        self._audio_seconds = 0.0
+        self._buffer = bytearray()
+        self._writes: asyncio.Queue = asyncio.Queue()
+        self._speech_ids: Deque[str] = deque(maxlen=32)
+        self._llm_requests = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = gzip.open(path, "wb", compresslevel=6)
+        self._writer_task = asyncio.create_task(self._writer())
+        self.event("meta", version=RECORDING_VERSION, started_at=time.time(), **meta)
+
+    def _t(self) -> float:
+        return time.perf_counter() - self._started
+
+    def _append(self, kind: int, payload: bytes):
+        self._buffer += _RECORD.pack(kind, self._t(), len(payload))
+        self._buffer += payload
+        if len(self._buffer) >= _WRITE_CHUNK:
+            self._writes.put_nowait(bytes(self._buffer))
+            self._buffer.clear()
+
+    async def _writer(self):
+        while True:
+            chunk = await self._writes.get()
+            if chunk is None:
+                return
+            await asyncio.to_thread(self._file.write, chunk)
+
+    # -- What gets recorded --
+
+    def audio(self, frame: rtc.AudioFrame):
+        """One frame of the user's audio, as the VAD/STT received it"""
+        self._audio_seconds += frame.samples_per_channel / frame.sample_rate
+        self._append(_KIND_AUDIO, _AUDIO.pack(frame.sample_rate, frame.num_channels) + bytes(frame.data))
+
+    def event(self, kind: str, **fields):
+        self._append(_KIND_EVENT, json.dumps({"kind": kind, **fields}).encode())
+
+    def stt(self, ev: stt.SpeechEvent):
+        text = ev.alternatives[0].text if ev.alternatives else ""
+        self.event("stt", type=ev.type.value, text=text, audio_s=round(self._audio_seconds, 3))
+
+    async def tap_audio(self, audio: AsyncIterable[rtc.AudioFrame]) -> AsyncIterator[rtc.AudioFrame]:
+        async for frame in audio:
+            self.audio(frame)
+            yield frame
+
+    async def tap_llm(self, chunks: AsyncIterable) -> AsyncIterator:
+        """Record a reply's text deltas as they stream out of the LLM node"""
+        self._llm_requests += 1
+        request = self._llm_requests
+        self.event("llm_start", request=request)
+        try:
+            async for chunk in chunks:
+                delta = getattr(chunk, "delta", None)
+                text = chunk if isinstance(chunk, str) else (delta.content if delta else None)
+                if text:
+                    self.event("llm_chunk", request=request, text=text)
+                yield chunk
+        finally:
+            self.event("llm_end", request=request)
+
+    def attach(self, session: AgentSession):
+        """Record the session's state changes and its own provider metrics"""
+        session.on("user_state_changed", lambda ev: self.event("user_state", state=ev.new_state))
+        session.on("agent_state_changed", lambda ev: self.event("agent_state", state=ev.new_state))
+        session.on("speech_created", self._on_speech_created)
+        session.on("metrics_collected", self._on_metrics_collected)
+
+    def _on_speech_created(self, ev):
+        self._speech_ids.append(ev.speech_handle.id)
+        self.event("speech", source=ev.source, speech_id=ev.speech_handle.id)
+
+    def _on_metrics_collected(self, ev):
+        m = ev.metrics
+        # The LLM and TTS clients are shared by a host's sessions: keep only ours
+        if isinstance(m, EOUMetrics) or (
+            isinstance(m, (LLMMetrics, TTSMetrics)) and m.speech_id in self._speech_ids
+        ):
+            self.event("metrics", metrics=m.model_dump(mode="json"))
+
+    async def aclose(self):
+        if self._buffer:
+            self._writes.put_nowait(bytes(self._buffer))
+            self._buffer.clear()
+        self._writes.put_nowait(None)
+        await self._writer_task
+        await asyncio.to_thread(self._file.close)
+        log.info("recorder", "Session recorded", path=self.path)
+
+
+class Recording:
+    """A recording read back: the audio frames and the events, each with its timestamp"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.meta: dict = {}
+        self.audio: List[Tuple[float, rtc.AudioFrame]] = []
+        self.events: List[Tuple[float, dict]] = []
+        for t, kind, payload in self._records(path):
+            if kind == _KIND_AUDIO:
+                sample_rate, channels = _AUDIO.unpack_from(payload)
+                pcm = payload[_AUDIO.size:]
+                self.audio.append((t, rtc.AudioFrame(
+                    data=pcm, sample_rate=sample_rate, num_channels=channels,
+                    samples_per_channel=len(pcm) // (2 * channels),
+                )))
+            else:
+                event = json.loads(payload)
+                if event["kind"] == "meta":
+                    self.meta = event
+                else:
+                    self.events.append((t, event))
+
+    @staticmethod
+    def _records(path: str) -> Iterator[Tuple[float, int, bytes]]:
+        with gzip.open(path, "rb") as f:
+            while True:
+                header = f.read(_RECORD.size)
+                if len(header) < _RECORD.size:
+                    return  # end of file, or a recording cut short by a crash
+                kind, t, length = _RECORD.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length:
+                    return
+                yield t, kind, payload
+
+    def of_kind(self, kind: str) -> List[Tuple[float, dict]]:
+        return [(t, event) for t, event in self.events if event["kind"] == kind]
+
+    def metrics(self, metrics_type: str) -> List[dict]:
+        return [event["metrics"] for _, event in self.of_kind("metrics") if event["metrics"]["type"] == metrics_type]
+
+    def llm_replies(self) -> List[List[Tuple[float, str]]]:
+        """Text deltas of every recorded LLM reply, with seconds since that request started"""
+        starts = {}
+        replies = {}
+        for t, event in self.events:
+            if event["kind"] == "llm_start":
+                starts[event["request"]] = t
+                replies[event["request"]] = []
+            elif event["kind"] == "llm_chunk" and event["request"] in starts:
+                replies[event["request"]].append((t - starts[event["request"]], event["text"]))
+        return [replies[request] for request in sorted(replies)]
+
+    def turn_decisions(self) -> List[bool]:
+        return [event["respond"] for _, event in self.of_kind("turn_decision")]
+
+    @property
+    def duration(self) -> float:
+        last = [self.audio[-1][0]] if self.audio else []
+        last += [self.events[-1][0]] if self.events else []
+        return max(last, default=0.0)
+
+
+def open_recorder(room_name: str, identity: str, persona: str, providers: dict, ingest: bool) -> Optional[SessionRecorder]:
+    """A recorder for this session when SESSION_RECORD_DIR is set"""
+    if not SESSION_RECORD_DIR:
+        return None
+    return SessionRecorder(
+        recording_path(identity),
+        {"room": room_name, "identity": identity, "persona": persona, "providers": providers, "ingest": ingest},
+    )
@@ -0,0 +1,223 @@
+import os
+import time
+import asyncio
+from difflib import SequenceMatcher
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from livekit.agents import llm
+
+from turn_arbiter import normalize_transcript
+from provider_limits import SPECULATIVE, provider_priority
+from structured_log import get_logger
+
+# Opt-in: start the LLM on interim transcripts before the user's turn ends
+SPECULATIVE_LLM = os.getenv("SPECULATIVE_LLM", "0") == "1"
+# Similarity (0-1) the final transcript needs with the speculated one to keep its reply
+SPECULATIVE_LLM_THRESHOLD = float(os.getenv("SPECULATIVE_LLM_THRESHOLD", "0.9"))
+# How long an interim transcript must stay unchanged before we speculate on it
+SPECULATIVE_LLM_STABLE_MS = float(os.getenv("SPECULATIVE_LLM_STABLE_MS", "300"))
+
+_DONE = object()
+
+
+log = get_logger()
+
+
+class SpeculationStats:
+    """How speculation worked out for one persona"""
+
+    def __init__(self):
+        self.started = 0
+        self.committed = 0
+        self.wasted = 0
+        # How long before the final transcript committed speculations started,
+        # and how much sooner that made their first token arrive
+        self.head_start_ms = 0.0
+        self.saved_ms = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "started": self.started,
+            "committed": self.committed,
+            "wasted": self.wasted,
+            "waste_rate": round(self.wasted / self.started, 3) if self.started else 0.0,
+            "head_start_ms": round(self.head_start_ms),
+            "saved_ms": round(self.saved_ms),
+        }
+
+
+# persona -> stats, for every speculating session in this process
+SPECULATION_STATS: Dict[str, SpeculationStats] = {}
+
+
+def speculation_stats() -> dict:
+    return {persona: stats.to_dict() for persona, stats in SPECULATION_STATS.items()}
+
+
+def similarity(a: str, b: str) -> float:
+    return SequenceMatcher(None, normalize_transcript(a), normalize_transcript(b)).ratio()
+
+
+class Speculation:
+    """One LLM generation started early, buffering its chunks until committed or cancelled"""
+
+    def __init__(self, model: llm.LLM, chat_ctx: llm.ChatContext, transcript: str):
+        self.transcript = transcript
+        self.started_at = time.perf_counter()
+        self.first_chunk_at: Optional[float] = None
+        # Ids of the context the guess was made on, minus the guessed user message
+        self.base_ids = [item.id for item in chat_ctx.items[:-1]]
+        self._chunks: asyncio.Queue = asyncio.Queue()
+        # A guess waits behind replies to turns that already ended
+        with provider_priority(SPECULATIVE):
+            self._task = asyncio.create_task(self._generate(model, chat_ctx))
+
+    async def _generate(self, model: llm.LLM, chat_ctx: llm.ChatContext):
+        try:
+            async with model.chat(chat_ctx=chat_ctx) as stream:
+                async for chunk in stream:
+                    if self.first_chunk_at is None:
+                        self.first_chunk_at = time.perf_counter()
+                    self._chunks.put_nowait(chunk)
+        except Exception as e:
+            self._chunks.put_nowait(e)
+        finally:
+            self._chunks.put_nowait(_DONE)
+
+    def saved_ms(self, taken_at: float) -> float:
+        """
+        How much sooner the first token arrives than had the LLM been started
+        at `taken_at`, taking its time to first token to be the same either
+        way: the whole head start, unless the first token came in sooner
+        than that, in which case only its time to first token was saved.
+        """
+        head_start = taken_at - self.started_at
+        if self.first_chunk_at is None:
+            return head_start * 1000
+        return min(head_start, self.first_chunk_at - self.started_at) * 1000
+
+    async def replay(self) -> AsyncIterator[llm.ChatChunk]:
+        """Everything generated so far, then the rest as it streams in"""
+        try:
+            while True:
+                chunk = await self._chunks.get()
+                if chunk is _DONE:
+                    return
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        self._task.cancel()
+
+
+class Speculator:
+    """
+    Starts a persona's LLM reply from interim transcripts while the user is
+    still finishing their turn.
+
+    Finals of the current turn plus the latest interim form the guessed user
+    message; a guess is made as soon as a final arrives, or once an interim
+    has been stable for SPECULATIVE_LLM_STABLE_MS. When the real turn reaches
+    the LLM, `take` hands back the speculation if its transcript is within
+    `threshold` of the final one and nothing else changed in the context;
+    otherwise it is cancelled and counted as wasted.
+    """
+
+    def __init__(
+        self,
+        persona: str,
+        model: llm.LLM,
+        chat_ctx: Callable[[], llm.ChatContext],
+        should_respond: Callable[[str], bool],
+        threshold: float = SPECULATIVE_LLM_THRESHOLD,
+    ):
+        self.persona = persona
+        self.threshold = threshold
+        self._model = model
+        self._chat_ctx = chat_ctx
+        self._should_respond = should_respond
+        self._finals: List[str] = []
+        self._interim = ""
+        self._stable_timer: Optional[asyncio.TimerHandle] = None
+        self._current: Optional[Speculation] = None
+        self.stats = SPECULATION_STATS.setdefault(persona, SpeculationStats())
+
+    def _transcript(self) -> str:
+        return " ".join(self._finals + [self._interim]).strip()
+
+    def on_transcript(self, transcript: str, is_final: bool):
+        """Feed from the session's user_input_transcribed events"""
+        if self._stable_timer is not None:
+            self._stable_timer.cancel()
+            self._stable_timer = None
+        if is_final:
+            if transcript:
+                self._finals.append(transcript)
+            self._interim = ""
+            self._speculate()
+        else:
+            self._interim = transcript
+            loop = asyncio.get_running_loop()
+            self._stable_timer = loop.call_later(SPECULATIVE_LLM_STABLE_MS / 1000, self._speculate)
+
+    def _speculate(self):
+        self._stable_timer = None
+        transcript = self._transcript()
+        if not transcript:
+            return
+        current = self._current
+        if current is not None and similarity(current.transcript, transcript) >= self.threshold:
+            return  # the running guess is still good enough
+        self.discard()
+        if not self._should_respond(transcript):
+            return
+
+        chat_ctx = self._chat_ctx().copy()
+        chat_ctx.add_message(role="user", content=transcript)
+        self._current = Speculation(self._model, chat_ctx, transcript)
+        self.stats.started += 1
+
+    def discard(self):
+        """Drop the running guess, e.g. because another persona got the turn"""
+        if self._current is not None:
+            self._current.cancel()
+            self._current = None
+            self.stats.wasted += 1
+
+    def end_turn(self):
+        """The user's turn is over; the next transcript starts a new one"""
+        if self._stable_timer is not None:
+            self._stable_timer.cancel()
+            self._stable_timer = None
+        self._finals = []
+        self._interim = ""
+
+    def take(self, chat_ctx: llm.ChatContext) -> Optional[Speculation]:
+        """The speculation matching the turn about to be sent to the LLM, if any"""
+        spec, self._current = self._current, None
+        if spec is None:
+            return None
+        final = chat_ctx.items[-1] if chat_ctx.items else None
+        final_text = getattr(final, "text_content", None) or ""
+        same_history = [item.id for item in chat_ctx.items[:-1]] == spec.base_ids
+        if not same_history or similarity(spec.transcript, final_text) < self.threshold:
+            log.info("speculation", "Speculation missed", persona=self.persona, guessed=spec.transcript, final=final_text)
+            spec.cancel()
+            self.stats.wasted += 1
+            return None
+        now = time.perf_counter()
+        head_start_ms = (now - spec.started_at) * 1000
+        saved_ms = spec.saved_ms(now)
+        self.stats.committed += 1
+        self.stats.head_start_ms += head_start_ms
+        self.stats.saved_ms += saved_ms
+        log.info("speculation", f"Speculation committed, first token {saved_ms:.0f} ms sooner",
+                 persona=self.persona, head_start_ms=round(head_start_ms), saved_ms=round(saved_ms))
+        return spec
+
+    def close(self):
+        self.end_turn()
+        self.discard()
@@ -0,0 +1,50 @@
+import time
+from typing import Dict, List, Tuple
+
+import psutil
+
+# When this process was started, so the first phase includes interpreter start-up
+PROCESS_STARTED_AT = psutil.Process().create_time()
+
+
+class StartupProfile:
+    """
+    Wall-clock phases of bringing an agent up, from process start. `mark`
+    closes the phase that ran since the previous mark; work that ran next to
+    a phase (e.g. the VAD loading while the room connects) is recorded with
+    `overlap` and reported beside the phases instead of adding to the total.
+    """
+
+    def __init__(self, started_at: float = PROCESS_STARTED_AT):
+        self.started_at = started_at
+        self.phases: List[Tuple[str, float]] = []
+        self.overlapped: Dict[str, float] = {}
+        self._last = started_at
+
+    def mark(self, phase: str):
+        now = time.time()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def overlap(self, name: str, seconds: float):
+        self.overlapped[name] = seconds
+
+    @property
+    def total(self) -> float:
+        return self._last - self.started_at
+
+    def report(self) -> dict:
+        return {
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in self.phases},
+            "overlapped_ms": {name: round(seconds * 1000, 1) for name, seconds in self.overlapped.items()},
+            "total_ms": round(self.total * 1000, 1),
+        }
+
+    def format(self) -> str:
+        parts = [f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases]
+        parts += [f"({name} {seconds * 1000:.0f}ms alongside)" for name, seconds in self.overlapped.items()]
+        return " | ".join(parts) + f" = {self.total:.2f}s"
+
+
+# Phases of this process's own start-up; agent_runner marks them as it goes
+STARTUP = StartupProfile()
@@ -0,0 +1,239 @@
+"""
+Structured logging that never blocks the event loop.
+
+Log calls only build a dict and put it on a bounded queue; a writer thread
+turns records into JSON lines and writes them to LOG_DIR (one file per
+process) and to stderr. stdout stays free for the worker messages
+agent_runner.py sends its parent. When the queue is full, or a category is
+over its sampling rate or rate limit, the record is dropped and counted;
+the counts are logged as a "log" record every LOG_DROP_REPORT_INTERVAL
+seconds.
+
+    log = get_logger(room=room_name, persona=agent_name)
+    log.info("turn", "Priya answers", turn=3, reason="addressed")
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import datetime
+import threading
+from collections import Counter
+from typing import Dict, Optional
+
+# Directory for the JSON log files ("" writes to stderr only); docker-compose mounts ./logs here
+LOG_DIR = os.getenv("LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs"))
+# Also write every record to stderr
+LOG_CONSOLE = os.getenv("LOG_CONSOLE", "1") == "1"
+# Lowest level written: debug, info, warning or error
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+# Records waiting for the writer before new ones are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Fraction of records kept per category, e.g. "turn=0.5,speculation=0.1"
+LOG_SAMPLE = os.getenv("LOG_SAMPLE", "")
+# Records per second per category, e.g. "default=200,turn=50" (errors are neither sampled nor rate limited)
+LOG_RATE_LIMIT = os.getenv("LOG_RATE_LIMIT", "default=200")
+# Seconds between reports of how many records were dropped
+LOG_DROP_REPORT_INTERVAL = float(os.getenv("LOG_DROP_REPORT_INTERVAL", "10"))
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+
+def parse_category_map(spec: str) -> Dict[str, float]:
+    """"a=1,b=0.5" -> {"a": 1.0, "b": 0.5}"""
+    values = {}
+    for part in spec.split(","):
+        if "=" in part:
+            category, value = part.split("=", 1)
+            values[category.strip()] = float(value)
+    return values
+
+
+class _TokenBucket:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class LogWriter:
+    """The queue, the filters in front of it and the thread that drains it (one per process)"""
+
+    def __init__(
+        self,
+        directory: str = LOG_DIR,
+        console: bool = LOG_CONSOLE,
+        min_level: str = LOG_LEVEL,
+        queue_size: int = LOG_QUEUE_SIZE,
+        sample: str = LOG_SAMPLE,
+        rate_limit: str = LOG_RATE_LIMIT,
+    ):
+        self.directory = directory
+        self.console = console
+        self.min_level = LEVELS.get(min_level, LEVELS["info"])
+        self.sample = parse_category_map(sample)
+        self.rate_limit = parse_category_map(rate_limit)
+        self.dropped: Counter = Counter()
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=queue_size)
+        self._buckets: Dict[str, _TokenBucket] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Optional[str]:
+        if not self.directory:
+            return None
+        name = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+        return os.path.join(self.directory, f"{name}-{os.getpid()}.jsonl")
+
+    def _allowed(self, level: int, category: str) -> bool:
+        if level < self.min_level:
+            return False
+        if level >= LEVELS["error"]:
+            return True  # only the queue bound applies to errors
+        if random.random() >= self.sample.get(category, 1.0):
+            self.dropped[(category, "sampled")] += 1
+            return False
+        rate = self.rate_limit.get(category, self.rate_limit.get("default"))
+        if rate is not None:
+            bucket = self._buckets.get(category)
+            if bucket is None:
+                bucket = self._buckets[category] = _TokenBucket(rate)
+            if not bucket.take():
+                self.dropped[(category, "rate_limited")] += 1
+                return False
+        return True
+
+    def submit(self, level: str, category: str, record: dict):
+        if not self._allowed(LEVELS[level], category):
+            return
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped[(category, "queue_full")] += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def close(self, timeout: float = 2):
+        """Write out what is queued (called at exit)"""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _run(self):
+        file = None
+        if self.path:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                file = open(self.path, "a", encoding="utf-8")
+            except OSError as e:
+                sys.stderr.write(f"structured_log: cannot write {self.path}: {e}\n")
+        next_drop_report = time.monotonic() + LOG_DROP_REPORT_INTERVAL
+
+        while True:
+            try:
+                record = self._queue.get(timeout=1)
+            except queue.Empty:
+                record = ...
+            if record is None:
+                break
+
+            lines = []
+            if record is not ...:
+                lines.append(self._format(record))
+            if time.monotonic() >= next_drop_report:
+                next_drop_report = time.monotonic() + LOG_DROP_REPORT_INTERVAL
+                if self.dropped:
+                    dropped, self.dropped = self.dropped, Counter()
+                    lines.append(self._format({
+                        "ts": time.time(), "level": "warning", "category": "log", "msg": "dropped log records",
+                        "dropped": {f"{category}/{reason}": n for (category, reason), n in dropped.items()},
+                    }))
+            for line in lines:
+                if file:
+                    file.write(line)
+                if self.console:
+                    sys.stderr.write(line)
+            if self._queue.empty():
+                if file:
+                    file.flush()
+                if self.console:
+                    sys.stderr.flush()
+
+        if file:
+            file.close()
+        if self.console:
+            sys.stderr.flush()
+
+    @staticmethod
+    def _format(record: dict) -> str:
+        record["ts"] = datetime.datetime.fromtimestamp(record["ts"], datetime.timezone.utc).isoformat(timespec="milliseconds")
+        return json.dumps(record, default=str, ensure_ascii=False) + "\n"
+
+
+_writer = LogWriter()
+
+
+class StructuredLogger:
+    """Logs records carrying a fixed set of fields (room, persona, ...) plus whatever each call adds"""
+
+    def __init__(self, writer: LogWriter = None, **fields):
+        self._writer = writer or _writer
+        self._fields = fields
+
+    def bind(self, **fields) -> "StructuredLogger":
+        return StructuredLogger(self._writer, **{**self._fields, **fields})
+
+    def log(self, level: str, category: str, msg: str, **fields):
+        record = {"ts": time.time(), "level": level, "category": category, "msg": msg, "pid": os.getpid()}
+        record.update(self._fields)
+        record.update(fields)
+        self._writer.submit(level, category, record)
+
+    def debug(self, category: str, msg: str, **fields):
+        self.log("debug", category, msg, **fields)
+
+    def info(self, category: str, msg: str, **fields):
+        self.log("info", category, msg, **fields)
+
+    def warning(self, category: str, msg: str, **fields):
+        self.log("warning", category, msg, **fields)
+
+    def error(self, category: str, msg: str, **fields):
+        self.log("error", category, msg, **fields)
+
+
+def get_logger(**fields) -> StructuredLogger:
+    return StructuredLogger(**fields)
+
+
+def log_stats() -> dict:
+    """Queue depth and records dropped since the last drop report"""
+    return {
+        "queued": _writer._queue.qsize(),
+        "dropped": {f"{category}/{reason}": n for (category, reason), n in _writer.dropped.items()},
+    }
@@ -0,0 +1,240 @@
+"""
+Offline stand-ins for Deepgram, Groq and ElevenLabs with configurable timing,
+for load tests that should not cost anything. Select them with
+AGENT_PROVIDERS=stub.
+
+None of them call out: the STT endpoints on audio energy and returns canned
+transcripts, the LLM streams filler words at a fixed token rate, and the TTS
+answers with a tone whose length follows the text.
+"""
+import os
+import math
+import asyncio
+import itertools
+from typing import List
+
+import numpy as np
+from livekit import rtc
+from livekit.agents import llm, stt, tts, utils
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN, APIConnectOptions, NotGivenOr
+
+# STT: silence (ms) that ends an utterance, time to the final transcript after it,
+# and the RMS level (16-bit PCM) counted as voice
+STUB_STT_ENDPOINT_MS = float(os.getenv("STUB_STT_ENDPOINT_MS", "300"))
+STUB_STT_LATENCY_MS = float(os.getenv("STUB_STT_LATENCY_MS", "150"))
+STUB_STT_ENERGY = float(os.getenv("STUB_STT_ENERGY", "500"))
+# LLM: time to first token, tokens (words) per second and reply length in words
+STUB_LLM_TTFT_MS = float(os.getenv("STUB_LLM_TTFT_MS", "350"))
+STUB_LLM_TOKENS_PER_SEC = float(os.getenv("STUB_LLM_TOKENS_PER_SEC", "80"))
+STUB_LLM_REPLY_WORDS = int(os.getenv("STUB_LLM_REPLY_WORDS", "30"))
+# TTS: time to first audio and how much audio a word turns into
+STUB_TTS_TTFB_MS = float(os.getenv("STUB_TTS_TTFB_MS", "250"))
+STUB_TTS_WORDS_PER_SEC = float(os.getenv("STUB_TTS_WORDS_PER_SEC", "2.5"))
+
+STUB_SAMPLE_RATE = 24000
+STUB_FRAME_MS = 100
+
+# What the stub STT "hears", in turn; some address a persona so the arbiter has work to do
+STUB_TRANSCRIPTS = [
+    "What should we focus on for the launch next month?",
+    "Alex, how long would the integration take?",
+    "Priya, who is the target audience for this campaign?",
+    "Can we cut the scope and still hit the date?",
+    "Alex, what are the biggest technical risks?",
+    "How do we measure whether it worked?",
+]
+
+_FILLER = (
+    "we could start with a small pilot and learn from the first customers before "
+    "committing the whole team to the plan so the risk stays low while we still move fast"
+).split()
+
+
+def _rms(frame: rtc.AudioFrame) -> float:
+    samples = np.frombuffer(frame.data, dtype=np.int16)
+    if samples.size == 0:
+        return 0.0
+    return float(np.sqrt(np.mean(samples.astype(np.float32) ** 2)))
+
+
+class StubSTT(stt.STT):
+    """Streaming STT that turns every voiced stretch of audio into a canned final transcript"""
+
+    def __init__(
+        self,
+        endpoint_ms: float = STUB_STT_ENDPOINT_MS,
+        latency_ms: float = STUB_STT_LATENCY_MS,
+        energy: float = STUB_STT_ENERGY,
+        transcripts: List[str] = STUB_TRANSCRIPTS,
+    ):
+        super().__init__(capabilities=stt.STTCapabilities(streaming=True, interim_results=False))
+        self.endpoint_ms = endpoint_ms
+        self.latency_ms = latency_ms
+        self.energy = energy
+        self._transcripts = itertools.cycle(transcripts)
+
+    def next_transcript(self) -> stt.SpeechEvent:
+        return stt.SpeechEvent(
+            type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+            request_id=utils.shortuuid(),
+            alternatives=[stt.SpeechData(language="en", text=next(self._transcripts), confidence=1.0)],
+        )
+
+    async def _recognize_impl(
+        self,
+        buffer: utils.AudioBuffer,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> stt.SpeechEvent:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self.next_transcript()
+
+    def stream(
+        self,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "StubRecognizeStream":
+        return StubRecognizeStream(stt=self, conn_options=conn_options)
+
+
+class StubRecognizeStream(stt.RecognizeStream):
+    async def _run(self):
+        stub: StubSTT = self._stt
+        speaking = False
+        silence_ms = 0.0
+
+        async def _finish():
+            await asyncio.sleep(stub.latency_ms / 1000)
+            self._event_ch.send_nowait(stub.next_transcript())
+            self._event_ch.send_nowait(stt.SpeechEvent(type=stt.SpeechEventType.END_OF_SPEECH))
+
+        async for item in self._input_ch:
+            if isinstance(item, self._FlushSentinel):
+                if speaking:
+                    speaking = False
+                    await _finish()
+                continue
+
+            if _rms(item) >= stub.energy:
+                if not speaking:
+                    speaking = True
+                    self._event_ch.send_nowait(stt.SpeechEvent(type=stt.SpeechEventType.START_OF_SPEECH))
+                silence_ms = 0.0
+            elif speaking:
+                silence_ms += item.samples_per_channel * 1000 / item.sample_rate
+                if silence_ms >= stub.endpoint_ms:
+                    speaking = False
+                    await _finish()
+
+
+class StubLLM(llm.LLM):
+    """Streams filler replies with a fixed time to first token and token rate"""
+
+    def __init__(
+        self,
+        ttft_ms: float = STUB_LLM_TTFT_MS,
+        tokens_per_sec: float = STUB_LLM_TOKENS_PER_SEC,
+        reply_words: int = STUB_LLM_REPLY_WORDS,
+    ):
+        super().__init__()
+        self.ttft_ms = ttft_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.reply_words = reply_words
+        self._replies = itertools.count(1)
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: list | None = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        parallel_tool_calls: NotGivenOr[bool] = NOT_GIVEN,
+        tool_choice: NotGivenOr[llm.ToolChoice] = NOT_GIVEN,
+        extra_kwargs: NotGivenOr[dict] = NOT_GIVEN,
+    ) -> "StubLLMStream":
+        return StubLLMStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options)
+
+    def reply(self) -> List[str]:
+        """Words of the next reply, a sentence every 12 words; numbered so no two are alike"""
+        n = next(self._replies)
+        words = [f"Reply {n}:"]
+        for i, word in enumerate(itertools.islice(itertools.cycle(_FILLER), self.reply_words - 1), start=2):
+            words.append(word + "." if i % 12 == 0 else word)
+        words[-1] = words[-1].rstrip(".") + "."
+        return words
+
+
+class StubLLMStream(llm.LLMStream):
+    async def _run(self):
+        stub: StubLLM = self._llm
+        request_id = utils.shortuuid()
+        words = stub.reply()
+        await asyncio.sleep(stub.ttft_ms / 1000)
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(1 / stub.tokens_per_sec)
+            self._event_ch.send_nowait(
+                llm.ChatChunk(id=request_id, delta=llm.ChoiceDelta(role="assistant", content=word + " "))
+            )
+        prompt_tokens = sum(len((item.text_content or "").split()) for item in self._chat_ctx.items if item.type == "message")
+        self._event_ch.send_nowait(
+            llm.ChatChunk(
+                id=request_id,
+                usage=llm.CompletionUsage(
+                    completion_tokens=len(words),
+                    prompt_tokens=prompt_tokens,
+                    total_tokens=prompt_tokens + len(words),
+                ),
+            )
+        )
+
+
+class _StubVoice:
+    """Looks like a provider's options to voice_signature, so each persona caches its own audio"""
+
+    def __init__(self, voice_id: str):
+        self.voice_id = voice_id
+
+
+class StubTTS(tts.TTS):
+    """Answers every sentence with a quiet tone as long as the sentence would take to say"""
+
+    def __init__(
+        self,
+        voice_id: str = "stub",
+        ttfb_ms: float = STUB_TTS_TTFB_MS,
+        words_per_sec: float = STUB_TTS_WORDS_PER_SEC,
+    ):
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False),
+            sample_rate=STUB_SAMPLE_RATE,
+            num_channels=1,
+        )
+        self._opts = _StubVoice(voice_id)
+        self.ttfb_ms = ttfb_ms
+        self.words_per_sec = words_per_sec
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "StubChunkedStream":
+        return StubChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class StubChunkedStream(tts.ChunkedStream):
+    async def _run(self):
+        stub: StubTTS = self._tts
+        request_id = utils.shortuuid()
+        seconds = max(1, len(self._input_text.split())) / stub.words_per_sec
+        samples_per_frame = stub.sample_rate * STUB_FRAME_MS // 1000
+        t = np.arange(samples_per_frame) / stub.sample_rate
+        tone = (3000 * np.sin(2 * math.pi * 220 * t)).astype(np.int16).tobytes()
+
+        await asyncio.sleep(stub.ttfb_ms / 1000)
+        for _ in range(math.ceil(seconds * 1000 / STUB_FRAME_MS)):
+            frame = rtc.AudioFrame(
+                data=tone,
+                sample_rate=stub.sample_rate,
+                num_channels=1,
+                samples_per_channel=samples_per_frame,
+            )
+            self._event_ch.send_nowait(tts.SynthesizedAudio(request_id=request_id, frame=frame))
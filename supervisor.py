@@ -0,0 +1,290 @@
+import os
+import time
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from structured_log import get_logger
+
+# Restart policy for agents whose session or worker process died
+AGENT_MAX_RESTARTS = int(os.getenv("AGENT_MAX_RESTARTS", "3"))
+AGENT_RESTART_BACKOFF = float(os.getenv("AGENT_RESTART_BACKOFF", "1"))
+AGENT_RESTART_BACKOFF_MAX = float(os.getenv("AGENT_RESTART_BACKOFF_MAX", "30"))
+# A host that has not sent a heartbeat for this long is considered hung
+AGENT_HEARTBEAT_TIMEOUT = float(os.getenv("AGENT_HEARTBEAT_TIMEOUT", "30"))
+
+
+log = get_logger()
+
+
+class AgentRecord:
+    """What the supervisor knows about one agent in one room"""
+
+    def __init__(self, room_name: str, identity: str, agent_name: str, token: str):
+        self.room_name = room_name
+        self.identity = identity
+        self.agent_name = agent_name
+        self.token = token
+        # starting -> running -> (restarting -> starting ...) | failed
+        self.state = "starting"
+        self.pid: Optional[int] = None
+        self.restarts = 0
+        self.created_at = time.time()
+        self.last_heartbeat: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.restart_task: Optional[asyncio.Task] = None
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return (self.room_name, self.identity)
+
+    def to_dict(self) -> dict:
+        return {
+            "room": self.room_name,
+            "identity": self.identity,
+            "agent_name": self.agent_name,
+            "state": self.state,
+            "pid": self.pid,
+            "restarts": self.restarts,
+            "uptime_seconds": round(time.time() - self.created_at, 1),
+            "seconds_since_heartbeat": (
+                round(time.monotonic() - self.last_heartbeat, 1)
+                if self.last_heartbeat is not None else None
+            ),
+            "last_error": self.last_error,
+        }
+
+
+class AgentSupervisor:
+    """
+    Owns every agent the server has started, indexed by room and identity.
+
+    The dispatcher (WorkerPool or in-process AgentHost) runs the sessions and
+    reports what happens to them; the supervisor turns those reports into
+    per-agent state, restarts crashed agents with exponential backoff and
+    kills hosts that stop sending heartbeats.
+    """
+
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher
+        # room -> identity -> record
+        self._rooms: Dict[str, Dict[str, AgentRecord]] = {}
+        # host pid -> records it is running
+        self._by_pid: Dict[int, Dict[Tuple[str, str], AgentRecord]] = {}
+        self._heartbeats: Dict[int, float] = {}
+        # host pid -> counters (TTS cache, speculation) from its latest heartbeat
+        self._host_stats: Dict[int, dict] = {}
+        self._monitor_task: Optional[asyncio.Task] = None
+        dispatcher.add_listener(self._on_message)
+
+    async def start(self):
+        self._monitor_task = asyncio.create_task(self._monitor_heartbeats())
+
+    async def aclose(self):
+        if self._monitor_task:
+            self._monitor_task.cancel()
+        for records in self._rooms.values():
+            for record in records.values():
+                if record.restart_task:
+                    record.restart_task.cancel()
+
+    # -- Lookups --
+
+    def get(self, room_name: str, identity: str) -> Optional[AgentRecord]:
+        return self._rooms.get(room_name, {}).get(identity)
+
+    def agents_in_room(self, room_name: str) -> List[AgentRecord]:
+        return list(self._rooms.get(room_name, {}).values())
+
+    def all_agents(self) -> List[AgentRecord]:
+        return [r for records in self._rooms.values() for r in records.values()]
+
+    def summary(self) -> dict:
+        counts: Dict[str, int] = {}
+        for record in self.all_agents():
+            counts[record.state] = counts.get(record.state, 0) + 1
+        return {"rooms": len(self._rooms), "agents": len(self.all_agents()), "states": counts}
+
+    def tts_cache_summary(self) -> dict:
+        """TTS cache counters summed over every live host"""
+        totals = {"hits": 0, "misses": 0, "bytes_saved": 0}
+        for stats in self._host_stats.values():
+            for name in totals:
+                totals[name] += stats.get("tts_cache", {}).get(name, 0)
+        lookups = totals["hits"] + totals["misses"]
+        totals["hit_rate"] = round(totals["hits"] / lookups, 3) if lookups else 0.0
+        return totals
+
+    def speculation_summary(self) -> dict:
+        """Speculative LLM outcomes per persona, summed over every live host"""
+        personas: Dict[str, dict] = {}
+        for stats in self._host_stats.values():
+            for persona, counts in stats.get("speculation", {}).items():
+                totals = personas.setdefault(persona, {"started": 0, "committed": 0, "wasted": 0, "head_start_ms": 0, "saved_ms": 0})
+                for name in totals:
+                    totals[name] += counts.get(name, 0)
+        for totals in personas.values():
+            totals["waste_rate"] = round(totals["wasted"] / totals["started"], 3) if totals["started"] else 0.0
+            totals["avg_head_start_ms"] = round(totals["head_start_ms"] / totals["committed"]) if totals["committed"] else 0
+            totals["avg_saved_ms"] = round(totals["saved_ms"] / totals["committed"]) if totals["committed"] else 0
+        return personas
+
+    def hedging_summary(self) -> dict:
+        """Hedged LLM/TTS requests per primary model or voice, summed over every live host"""
+        clients: Dict[str, dict] = {}
+        for stats in self._host_stats.values():
+            for name, counts in stats.get("hedging", {}).items():
+                totals = clients.setdefault(name, {"requests": 0, "hedged": 0, "backup_won": 0, "failovers": 0, "saved_ms": 0})
+                for field in totals:
+                    totals[field] += counts.get(field, 0)
+        for totals in clients.values():
+            totals["hedge_rate"] = round(totals["hedged"] / totals["requests"], 3) if totals["requests"] else 0.0
+            totals["avg_saved_ms"] = round(totals["saved_ms"] / totals["backup_won"]) if totals["backup_won"] else 0
+        return clients
+
+    def stt_idle_summary(self) -> dict:
+        """Idle STT suspension counters summed over every live host"""
+        totals = {
+            "streams": 0, "connections": 0, "resumes": 0, "suspends": 0,
+            "streamed_s": 0.0, "suspended_s": 0.0, "preroll_s": 0.0,
+        }
+        for stats in self._host_stats.values():
+            for name in totals:
+                totals[name] += stats.get("stt_idle", {}).get(name, 0)
+        heard = totals["streamed_s"] + totals["suspended_s"]
+        totals["suspended_share"] = round(totals["suspended_s"] / heard, 3) if heard else 0.0
+        return totals
+
+    # -- Lifecycle --
+
+    async def start_agent(self, room_name: str, identity: str, agent_name: str, token: str) -> AgentRecord:
+        """Start an agent in `room_name` and keep it alive until the room is stopped"""
+        existing = self.get(room_name, identity)
+        if existing and existing.state != "failed":
+            return existing
+
+        record = AgentRecord(room_name, identity, agent_name, token)
+        self._rooms.setdefault(room_name, {})[identity] = record
+        try:
+            await self._dispatch(record)
+        except Exception:
+            self._forget(record)
+            raise
+        return record
+
+    async def _dispatch(self, record: AgentRecord):
+        record.state = "starting"
+        host = await self.dispatcher.dispatch(
+            record.room_name, record.identity, record.agent_name, record.token
+        )
+        record.pid = host.pid
+        record.last_heartbeat = self._heartbeats.get(host.pid, time.monotonic())
+        self._by_pid.setdefault(host.pid, {})[record.key] = record
+
+    async def stop_room(self, room_name: str) -> int:
+        """Stop every agent in `room_name` and stop supervising them"""
+        records = self._rooms.pop(room_name, {})
+        pids = set()
+        for record in records.values():
+            if record.restart_task:
+                record.restart_task.cancel()
+            if record.pid is not None:
+                pids.add(record.pid)
+            self._unassign(record)
+        if not pids:
+            return 0
+        return await self.dispatcher.stop_room(room_name, pids=pids)
+
+    def _unassign(self, record: AgentRecord):
+        if record.pid is None:
+            return
+        hosted = self._by_pid.get(record.pid)
+        if hosted is not None:
+            hosted.pop(record.key, None)
+            if not hosted:
+                del self._by_pid[record.pid]
+        record.pid = None
+
+    def _forget(self, record: AgentRecord):
+        self._unassign(record)
+        records = self._rooms.get(record.room_name)
+        if records is not None and records.get(record.identity) is record:
+            del records[record.identity]
+            if not records:
+                del self._rooms[record.room_name]
+
+    def _schedule_restart(self, record: AgentRecord, reason: str):
+        self._unassign(record)
+        record.last_error = reason
+        if record.restarts >= AGENT_MAX_RESTARTS:
+            record.state = "failed"
+            log.error("supervisor", f"Agent failed after {record.restarts} restarts: {reason}",
+                      room=record.room_name, identity=record.identity, reason=reason)
+            return
+
+        delay = min(AGENT_RESTART_BACKOFF * (2 ** record.restarts), AGENT_RESTART_BACKOFF_MAX)
+        record.restarts += 1
+        record.state = "restarting"
+        log.warning("supervisor", f"Restarting agent in {delay:.0f}s ({reason})",
+                    room=record.room_name, identity=record.identity, reason=reason)
+        record.restart_task = asyncio.create_task(self._restart_after(record, delay))
+
+    async def _restart_after(self, record: AgentRecord, delay: float):
+        await asyncio.sleep(delay)
+        if self.get(record.room_name, record.identity) is not record:
+            return  # room was stopped while we waited
+        try:
+            await self._dispatch(record)
+        except Exception as e:
+            self._schedule_restart(record, f"restart failed: {e}")
+
+    # -- Reports from the dispatcher --
+
+    def _on_message(self, msg: dict):
+        event = msg.get("event")
+        pid = msg.get("pid")
+
+        if event == "heartbeat":
+            now = time.monotonic()
+            self._heartbeats[pid] = now
+            self._host_stats[pid] = {
+                "tts_cache": msg.get("tts_cache", {}),
+                "speculation": msg.get("speculation", {}),
+                "hedging": msg.get("hedging", {}),
+                "stt_idle": msg.get("stt_idle", {}),
+            }
+            for record in self._by_pid.get(pid, {}).values():
+                record.last_heartbeat = now
+            return
+
+        if event == "worker_exited":
+            self._heartbeats.pop(pid, None)
+            self._host_stats.pop(pid, None)
+            for record in list(self._by_pid.get(pid, {}).values()):
+                self._schedule_restart(record, f"worker {pid} exited with code {msg.get('returncode')}")
+            return
+
+        record = self.get(msg.get("room"), msg.get("identity"))
+        if record is None:
+            return
+
+        if event == "joined":
+            record.state = "running"
+        elif event == "rejected":
+            self._schedule_restart(record, f"host {pid} was full")
+        elif event == "session_ended":
+            if msg.get("reason") == "error":
+                self._schedule_restart(record, "session error")
+            else:
+                # Room went away or we stopped it: nothing left to supervise
+                self._forget(record)
+
+    async def _monitor_heartbeats(self):
+        while True:
+            await asyncio.sleep(AGENT_HEARTBEAT_TIMEOUT / 3)
+            now = time.monotonic()
+            for pid in list(self._by_pid):
+                last = self._heartbeats.get(pid)
+                if last is not None and now - last > AGENT_HEARTBEAT_TIMEOUT:
+                    log.error("supervisor", f"Agent host missed heartbeats for {now - last:.0f}s, killing it", host_pid=pid)
+                    self._heartbeats.pop(pid, None)
+                    await self.dispatcher.kill_worker(pid)
@@ -0,0 +1,89 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from admission import AdmissionController
+
+
+class _Supervisor:
+    def __init__(self):
+        self.records = []
+
+    def start_agent(self, room_name: str, agent_name: str, state: str = "starting"):
+        identity = f"{agent_name}-agent-{room_name}"
+        self.records.append(SimpleNamespace(key=(room_name, identity), agent_name=agent_name, state=state))
+
+    def all_agents(self):
+        return self.records
+
+
+class AdmissionCancelTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.controller = AdmissionController(_Supervisor(), weights={}, max_load=1, queue_timeout=5)
+
+    async def _hold(self, cost: float, entered: asyncio.Event, release: asyncio.Event):
+        async with self.controller.admit(cost):
+            entered.set()
+            await release.wait()
+
+    async def test_cancelled_while_queued_frees_nothing(self):
+        entered, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(self._hold(1, entered, release))
+        await entered.wait()
+
+        waiter = asyncio.create_task(self._hold(1, asyncio.Event(), asyncio.Event()))
+        await asyncio.sleep(0)
+        self.assertEqual(len(self.controller._queue), 1)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(len(self.controller._queue), 0)
+
+        release.set()
+        await holder
+        self.assertEqual(self.controller._reserved, 0)
+
+    async def test_cancelled_after_being_admitted_gives_capacity_back(self):
+        self.controller.max_load = 0
+        waiter = asyncio.create_task(self._hold(1, asyncio.Event(), asyncio.Event()))
+        await asyncio.sleep(0)
+        self.assertEqual(len(self.controller._queue), 1)
+
+        # Capacity frees up and the join is admitted, but its caller is cancelled before it resumes
+        self.controller.max_load = 1
+        self.controller._drain()
+        self.assertEqual(self.controller._reserved, 1)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(self.controller._reserved, 0)
+        self.assertEqual(len(self.controller._queue), 0)
+
+
+class AdmissionLoadTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.supervisor = _Supervisor()
+        self.controller = AdmissionController(self.supervisor, weights={"alex": 0.6, "priya": 1.0}, max_load=4)
+
+    async def test_starting_agent_is_counted_once(self):
+        self.supervisor.start_agent("room-0", "alex", state="running")
+        keys = [("room", "alex-agent-room"), ("room", "priya-agent-room")]
+        async with self.controller.admit(self.controller.cost(["alex", "priya"]), keys=keys):
+            self.assertAlmostEqual(self.controller.load, 2.2)
+            # The supervisor tracks the new agents while the join still holds their weight
+            self.supervisor.start_agent("room", "alex")
+            self.supervisor.start_agent("room", "priya")
+            self.assertAlmostEqual(self.controller.load, 2.2)
+        self.assertAlmostEqual(self.controller.load, 2.2)
+        self.assertEqual(self.controller._reserved_keys, {})
+
+    async def test_agent_failing_to_start_frees_its_weight(self):
+        with self.assertRaises(RuntimeError):
+            async with self.controller.admit(1.0, keys=[("room", "priya-agent-room")]):
+                self.supervisor.start_agent("room", "priya", state="failed")
+                raise RuntimeError("dispatch failed")
+        self.assertEqual(self.controller.load, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from cleanup_scheduler import CleanupScheduler
+
+
+async def _never_due(room_name: str, kind: str):
+    raise AssertionError(f"{kind} timer fired for {room_name}")
+
+
+def _occupancy(room: str, humans: int) -> dict:
+    return {"event": "occupancy", "room": room, "humans": humans}
+
+
+class OccupancyTimerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.scheduler = CleanupScheduler(_never_due, path=None, idle_grace=60, no_show_grace=1800)
+
+    def kinds(self, room: str):
+        return sorted(kind for (name, kind) in self.scheduler._timers if name == room)
+
+    async def test_room_before_its_first_human_gets_the_no_show_grace(self):
+        self.scheduler.on_message(_occupancy("r", 0))
+        self.assertEqual(self.kinds("r"), ["no_show"])
+
+    async def test_first_human_cancels_no_show(self):
+        self.scheduler.on_message(_occupancy("r", 0))
+        self.scheduler.on_message(_occupancy("r", 1))
+        self.assertEqual(self.kinds("r"), [])
+
+    async def test_room_left_by_its_humans_gets_the_idle_grace(self):
+        self.scheduler.on_message(_occupancy("r", 0))
+        self.scheduler.on_message(_occupancy("r", 2))
+        self.scheduler.on_message(_occupancy("r", 0))
+        self.assertEqual(self.kinds("r"), ["idle"])
+
+        self.scheduler.on_message(_occupancy("r", 1))
+        self.assertEqual(self.kinds("r"), [])
+
+    async def test_forgetting_a_room_forgets_it_was_occupied(self):
+        self.scheduler.on_message(_occupancy("r", 1))
+        self.scheduler.cancel("r")
+        self.scheduler.on_message(_occupancy("r", 0))
+        self.assertEqual(self.kinds("r"), ["no_show"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from livekit import rtc
+from livekit.agents import tts
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS
+
+import hedging
+from hedging import HedgedTTS, Hedger
+
+SAMPLE_RATE = 24000
+# Until HEDGE_MIN_SAMPLES first-chunk times are known the backup starts after this
+DELAY_MS = 50
+
+
+class _Stream:
+    """Sends `chunks` (the first after `delay` seconds), or fails with `error` after it"""
+
+    def __init__(self, delay: float, chunks=("a", "b"), error: Exception = None):
+        self.delay = delay
+        self.chunks = list(chunks)
+        self.error = error
+        self.sent = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.sent == 0:
+            await asyncio.sleep(self.delay)
+            if self.error:
+                raise self.error
+        if self.sent == len(self.chunks):
+            raise StopAsyncIteration
+        self.sent += 1
+        return self.chunks[self.sent - 1]
+
+    async def aclose(self):
+        self.closed = True
+
+
+class HedgerTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(hedging, "HEDGE_INITIAL_DELAY_MS", DELAY_MS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.hedger = Hedger(f"test:{self.id()}")
+        self.backups = []
+
+    async def race(self, primary: _Stream, backup: _Stream) -> list:
+        def _start_backup():
+            self.backups.append(backup)
+            return backup
+
+        return [chunk async for chunk in self.hedger.stream(lambda: primary, _start_backup)]
+
+    async def test_fast_primary_is_not_hedged(self):
+        primary = _Stream(0.01)
+        self.assertEqual(await self.race(primary, _Stream(0, ["x"])), ["a", "b"])
+        self.assertEqual(self.backups, [])
+        self.assertEqual(len(self.hedger.samples), 1)
+        self.assertEqual((self.hedger.stats.requests, self.hedger.stats.hedged), (1, 0))
+        self.assertTrue(primary.closed)
+
+    async def test_backup_wins_over_a_slow_primary(self):
+        primary, backup = _Stream(0.3), _Stream(0.01, ["x", "y"])
+        on_backup = mock.Mock()
+        chunks = [chunk async for chunk in self.hedger.stream(lambda: primary, lambda: backup, on_backup)]
+        self.assertEqual(chunks, ["x", "y"])
+        on_backup.assert_called_once()
+        self.assertEqual((self.hedger.stats.hedged, self.hedger.stats.backup_won), (1, 1))
+        self.assertTrue(backup.closed)
+        # The losing primary streams nothing, but is kept until its first chunk
+        self.assertFalse(primary.closed)
+        self.assertEqual(len(self.hedger.samples), 0)
+        await asyncio.gather(*self.hedger._measuring)
+
+    async def test_losing_primary_is_timed(self):
+        primary = _Stream(0.3)
+        await self.race(primary, _Stream(0.01, ["x"]))
+        await asyncio.gather(*self.hedger._measuring)
+        self.assertTrue(primary.closed)
+        self.assertEqual(primary.sent, 1)
+        self.assertAlmostEqual(self.hedger.samples[0], 0.3, delta=0.05)
+        # Backup answered at ~0.06s, primary at 0.3s
+        self.assertAlmostEqual(self.hedger.stats.saved_ms, 240, delta=50)
+
+    async def test_primary_still_wins_after_the_backup_started(self):
+        primary, backup = _Stream(0.1), _Stream(0.3, ["x"])
+        self.assertEqual(await self.race(primary, backup), ["a", "b"])
+        self.assertEqual(self.backups, [backup])
+        self.assertEqual((self.hedger.stats.hedged, self.hedger.stats.backup_won), (1, 0))
+        # The loser is cancelled before it sent anything
+        self.assertTrue(backup.closed)
+        self.assertEqual(backup.sent, 0)
+
+    async def test_failed_primary_fails_over_at_once(self):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        chunks = await self.race(_Stream(0, error=RuntimeError("boom")), _Stream(0, ["x"]))
+        self.assertEqual(chunks, ["x"])
+        self.assertLess(loop.time() - started, DELAY_MS / 1000 + 0.05)
+        self.assertEqual(self.hedger.stats.failovers, 1)
+
+    async def test_both_failing_raises(self):
+        with self.assertRaises(RuntimeError):
+            await self.race(_Stream(0.1, error=RuntimeError("primary")), _Stream(0, error=RuntimeError("backup")))
+
+    async def test_delay_follows_the_percentile(self):
+        with mock.patch.object(hedging, "HEDGE_MIN_SAMPLES", 10):
+            self.hedger.samples.extend([0.4] * 9)
+            self.assertEqual(self.hedger.delay(), DELAY_MS / 1000)
+            self.hedger.samples.append(0.4)
+            self.assertAlmostEqual(self.hedger.delay(), 0.4)
+            self.hedger.samples.clear()
+            self.hedger.samples.extend([0.01] * 10)
+            self.assertEqual(self.hedger.delay(), hedging.HEDGE_MIN_DELAY_MS / 1000)
+
+
+class _TTS(tts.TTS):
+    """Says every sentence as a single frame, `delay` seconds after the request"""
+
+    def __init__(self, delay: float, value: int):
+        super().__init__(capabilities=tts.TTSCapabilities(streaming=False), sample_rate=SAMPLE_RATE, num_channels=1)
+        self.delay = delay
+        self.value = value
+
+    def synthesize(self, text, *, conn_options=DEFAULT_API_CONNECT_OPTIONS):
+        return _ChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class _ChunkedStream(tts.ChunkedStream):
+    async def _run(self):
+        await asyncio.sleep(self._tts.delay)
+        frame = rtc.AudioFrame(bytes([self._tts.value, 0]), SAMPLE_RATE, 1, 1)
+        self._event_ch.send_nowait(tts.SynthesizedAudio(request_id="", frame=frame))
+
+
+class HedgedTTSTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(hedging, "HEDGE_INITIAL_DELAY_MS", DELAY_MS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def say(self, primary_delay: float):
+        voice = HedgedTTS(_TTS(primary_delay, 1), _TTS(0.01, 2), name=f"test:{self.id()}")
+        stream = voice.synthesize("Hello there.")
+        audio = [bytes(ev.frame.data)[0] async for ev in stream]
+        await stream.aclose()
+        await asyncio.gather(*voice.hedger._measuring)
+        return audio, stream.cacheable
+
+    async def test_primary_audio_is_cacheable(self):
+        self.assertEqual(await self.say(0.01), ([1], True))
+
+    async def test_backup_audio_is_not_cacheable(self):
+        self.assertEqual(await self.say(0.2), ([2], False))
+
+
+if __name__ == "__main__":
+    unittest.main()
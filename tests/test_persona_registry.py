@@ -0,0 +1,131 @@
+import os
+import tempfile
+import unittest
+
+from persona_registry import PersonaConfigError, PersonaRegistry, load_personas, parse_persona
+
+ALEX = 'prompt = "You are Alex."\nvoice_id = "voice-a"\naliases = ["Alex"]\n'
+PRIYA = 'prompt = "You are Priya."\nvoice_id = "voice-p"\naliases = ["priya", "priya sharma"]\nlead = true\n'
+
+
+def _persona(**fields) -> dict:
+    return {"prompt": "You are Alex.", "voice_id": "voice-a", "aliases": ["alex"], **fields}
+
+
+class ParsePersonaTest(unittest.TestCase):
+    def test_defaults(self):
+        persona = parse_persona("alex", _persona(aliases=[" Alex "], opener="  "), version="abc")
+        self.assertEqual(persona.aliases, ("alex",))
+        self.assertIsNone(persona.opener)
+        self.assertEqual((persona.lead, persona.cost, persona.version), (False, 1.0, "abc"))
+
+    def test_cost_is_a_float(self):
+        self.assertEqual(parse_persona("alex", _persona(cost=2)).cost, 2.0)
+
+    def test_rejected(self):
+        cases = [
+            ("unknown field", _persona(voice="voice-a")),
+            ("missing field", {"prompt": "You are Alex.", "aliases": ["alex"]}),
+            ("empty aliases", _persona(aliases=[])),
+            ("blank alias", _persona(aliases=["alex", " "])),
+            ("bool as cost", _persona(cost=True)),
+            ("bool as threshold", _persona(speculation_threshold=True)),
+            ("string as lead", _persona(lead="yes")),
+            ("zero cost", _persona(cost=0)),
+            ("threshold above one", _persona(speculation_threshold=1.5)),
+        ]
+        for reason, data in cases:
+            with self.subTest(reason):
+                with self.assertRaises(PersonaConfigError):
+                    parse_persona("alex", data)
+
+
+class PersonaDirTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.write("alex", ALEX)
+        self.write("priya", PRIYA)
+
+    def write(self, name: str, text: str):
+        path = os.path.join(self.directory.name, f"{name}.toml")
+        with open(path, "w") as f:
+            f.write(text)
+        # Every write must look like an edit, even within one mtime tick
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+class LoadPersonasTest(PersonaDirTest):
+    def test_loads_every_file(self):
+        personas = load_personas(self.directory.name)
+        self.assertEqual(sorted(personas), ["alex", "priya"])
+        self.assertTrue(personas["priya"].lead)
+        self.assertNotEqual(personas["alex"].version, personas["priya"].version)
+
+    def test_rejected_sets(self):
+        cases = [
+            ("more than one lead", "carol", 'prompt = "C"\nvoice_id = "v"\naliases = ["carol"]\nlead = true\n'),
+            ("duplicate alias", "carol", 'prompt = "C"\nvoice_id = "v"\naliases = ["carol", "Alex"]\n'),
+            ("invalid toml", "carol", 'prompt = "C\n'),
+            ("one bad file", "carol", 'prompt = "C"\nvoice_id = "v"\naliases = ["carol"]\ncost = false\n'),
+        ]
+        for reason, name, text in cases:
+            with self.subTest(reason):
+                self.write(name, text)
+                with self.assertRaises(PersonaConfigError):
+                    load_personas(self.directory.name)
+                os.remove(os.path.join(self.directory.name, f"{name}.toml"))
+
+    def test_no_personas(self):
+        with tempfile.TemporaryDirectory() as empty:
+            with self.assertRaises(PersonaConfigError):
+                load_personas(empty)
+        with self.assertRaises(PersonaConfigError):
+            load_personas(os.path.join(self.directory.name, "missing"))
+
+
+class ReloadTest(PersonaDirTest):
+    async def asyncSetUp(self):
+        self.registry = PersonaRegistry(self.directory.name, reload_interval=0)
+        self.reloaded = []
+        self.registry.add_listener(self.reloaded.append)
+
+    async def test_unchanged_files_are_not_reloaded(self):
+        self.assertFalse(await self.registry.reload())
+        self.assertFalse(await self.registry.reload(force=True))
+        self.assertEqual(self.reloaded, [])
+
+    async def test_edit_takes_effect(self):
+        before = self.registry.get("alex")
+        self.write("alex", ALEX + "cost = 0.5\n")
+        self.assertTrue(await self.registry.reload())
+        self.assertEqual(self.registry.get("alex").cost, 0.5)
+        self.assertNotEqual(self.registry.get("alex").version, before.version)
+        self.assertEqual(len(self.reloaded), 1)
+        # Sessions that started before keep the persona they had
+        self.assertEqual(before.cost, 1.0)
+
+    async def test_keeps_the_last_good_set(self):
+        good = self.registry.personas
+        self.write("alex", ALEX + "lead = true\n")  # now two leads
+        self.assertFalse(await self.registry.reload())
+        self.assertIs(self.registry.personas, good)
+        self.assertEqual(self.registry.lead, "priya")
+        self.assertEqual(self.reloaded, [])
+
+        # The broken set is not retried until the files change again
+        self.assertFalse(await self.registry.reload())
+        self.write("alex", ALEX + "cost = 0.5\n")
+        self.assertTrue(await self.registry.reload())
+        self.assertEqual(self.registry.get("alex").cost, 0.5)
+
+    async def test_removed_persona(self):
+        os.remove(os.path.join(self.directory.name, "alex.toml"))
+        self.assertTrue(await self.registry.reload())
+        self.assertNotIn("alex", self.registry)
+        self.assertEqual(self.registry.names(), ["priya"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import os
+import asyncio
+import tempfile
+import unittest
+
+from livekit.agents import APIStatusError
+
+import provider_limits
+from provider_limits import (
+    BACKGROUND, GREETING, TURN,
+    LocalProviderLimiter, ProviderLimits, ProviderLimitServer, SocketProviderLimiter,
+    parse_limits, provider_priority, provider_slot,
+)
+
+
+class LocalLimiterTest(unittest.IsolatedAsyncioTestCase):
+    async def test_turn_goes_before_background(self):
+        limiter = LocalProviderLimiter({"groq": ProviderLimits(concurrent=1)}, max_wait=5)
+        holder = await limiter.acquire("groq")
+        order = []
+
+        async def _request(name: str, priority: int):
+            lease = await limiter.acquire("groq", priority)
+            order.append(name)
+            limiter.release(lease)
+
+        waiting = [
+            asyncio.create_task(_request("background", BACKGROUND)),
+            asyncio.create_task(_request("greeting", GREETING)),
+            asyncio.create_task(_request("turn", TURN)),
+        ]
+        await asyncio.sleep(0.01)
+        self.assertEqual(limiter.stats()["groq"]["waiting"], {"turn": 1, "greeting": 1, "background": 1})
+        limiter.release(holder)
+        await asyncio.gather(*waiting)
+        self.assertEqual(order, ["turn", "greeting", "background"])
+
+    async def test_goes_ahead_after_max_wait(self):
+        limiter = LocalProviderLimiter({"groq": ProviderLimits(concurrent=1)}, max_wait=0.05)
+        await limiter.acquire("groq")
+        lease = await asyncio.wait_for(limiter.acquire("groq"), 1)
+        self.assertTrue(lease.overflow)
+        self.assertGreaterEqual(lease.waited, 0.05)
+        self.assertEqual(limiter.stats()["groq"]["overflowed"], 1)
+
+    async def test_a_429_holds_everyone_back(self):
+        limiter = LocalProviderLimiter({"groq": ProviderLimits(rps=100)}, max_wait=5)
+        provider_limits._limiter, previous = limiter, provider_limits._limiter
+        try:
+            with self.assertRaises(APIStatusError):
+                async with provider_slot("groq"):
+                    raise APIStatusError("rate limited", status_code=429)
+        finally:
+            provider_limits._limiter = previous
+        self.assertEqual(limiter.stats()["groq"]["penalties"], 1)
+
+        # Every caller waits out the penalty, whatever its priority
+        leases = await asyncio.gather(*(limiter.acquire("groq", priority) for priority in (TURN, BACKGROUND)))
+        for lease in leases:
+            self.assertFalse(lease.overflow)
+            self.assertGreaterEqual(lease.waited, provider_limits.PROVIDER_LIMIT_PENALTY - 0.05)
+
+    async def test_tokens_per_minute(self):
+        limiter = LocalProviderLimiter({"elevenlabs": ProviderLimits(tpm=600)}, max_wait=5)
+        first = await limiter.acquire("elevenlabs", tokens=600)
+        first.used_tokens = 590  # ten characters come back
+        limiter.release(first)
+        lease = await asyncio.wait_for(limiter.acquire("elevenlabs", tokens=10), 0.5)
+        self.assertFalse(lease.overflow)
+        self.assertLess(lease.waited, 0.1)
+
+    async def test_cancelled_waiter_takes_nothing(self):
+        limiter = LocalProviderLimiter({"groq": ProviderLimits(concurrent=1)}, max_wait=5)
+        holder = await limiter.acquire("groq")
+        waiter = asyncio.create_task(limiter.acquire("groq"))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        limiter.release(holder)
+        self.assertEqual(limiter.stats()["groq"]["in_flight"], 0)
+
+
+class ParseLimitsTest(unittest.TestCase):
+    def test_parse(self):
+        limits = parse_limits("groq.rps=5, groq.tpm=60000,elevenlabs.concurrent=5")
+        self.assertEqual(limits["groq"], ProviderLimits(rps=5, tpm=60000))
+        self.assertEqual(limits["elevenlabs"], ProviderLimits(concurrent=5))
+        with self.assertRaises(ValueError):
+            parse_limits("groq.qps=5")
+
+
+class SocketTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "limits.sock")
+
+    async def asyncTearDown(self):
+        self.directory.cleanup()
+
+    async def test_refuses_to_start_over_a_live_socket(self):
+        running = ProviderLimitServer(LocalProviderLimiter({}), path=self.path)
+        await running.start()
+        try:
+            with self.assertRaises(RuntimeError):
+                await ProviderLimitServer(LocalProviderLimiter({}), path=self.path).start()
+            self.assertTrue(os.path.exists(self.path))
+        finally:
+            await running.aclose()
+
+    async def test_replaces_a_stale_socket(self):
+        stale = ProviderLimitServer(LocalProviderLimiter({}), path=self.path)
+        await stale.start()
+        stale._server.close()  # gone without removing its socket file
+        await stale._server.wait_closed()
+        server = ProviderLimitServer(LocalProviderLimiter({}), path=self.path)
+        await server.start()
+        await server.aclose()
+
+    async def test_clients_share_the_servers_buckets(self):
+        shared = LocalProviderLimiter({"groq": ProviderLimits(concurrent=1)}, max_wait=5)
+        server = ProviderLimitServer(shared, path=self.path)
+        await server.start()
+        client = SocketProviderLimiter(self.path, LocalProviderLimiter({}))
+        try:
+            lease = await client.acquire("groq")
+            self.assertTrue(lease.remote)
+            self.assertEqual(shared.stats()["groq"]["in_flight"], 1)
+            client.release(lease)
+            await asyncio.sleep(0.05)
+            self.assertEqual(shared.stats()["groq"]["in_flight"], 0)
+        finally:
+            await client.aclose()
+            await server.aclose()
+
+    async def test_falls_back_to_local_buckets(self):
+        client = SocketProviderLimiter(self.path, LocalProviderLimiter({}))
+        with provider_priority(TURN):
+            lease = await client.acquire("groq")
+        self.assertFalse(lease.remote)
+        client.release(lease)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from livekit import rtc
+
+from agent_runner import watch_session_end
+
+
+def _human(identity: str):
+    return SimpleNamespace(identity=identity, kind=rtc.ParticipantKind.PARTICIPANT_KIND_STANDARD)
+
+
+def _agent(identity: str):
+    return SimpleNamespace(identity=identity, kind=rtc.ParticipantKind.PARTICIPANT_KIND_AGENT)
+
+
+class _Room(rtc.EventEmitter):
+    def __init__(self, *participants):
+        super().__init__()
+        self.name = "room"
+        self.remote_participants = {p.identity: p for p in participants}
+
+    def join(self, participant):
+        self.remote_participants[participant.identity] = participant
+        self.emit("participant_connected", participant)
+
+    def leave(self, participant):
+        del self.remote_participants[participant.identity]
+        self.emit("participant_disconnected", participant)
+
+
+class SessionEndTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.alice = _human("alice")
+        self.room = _Room(self.alice, _agent("bob-agent-room"))
+        self.session = rtc.EventEmitter()
+        self.events = []
+
+    def watch(self, alone_grace=0.05):
+        return watch_session_end(
+            self.room, self.session, "bob-agent-room",
+            emit=lambda event, **fields: self.events.append((event, fields)), alone_grace=alone_grace,
+        )
+
+    async def test_room_deleted(self):
+        ended = self.watch()
+        self.room.emit("disconnected", rtc.DisconnectReason.ROOM_DELETED)
+        self.assertEqual(await ended, "room_deleted")
+
+    async def test_other_disconnect(self):
+        ended = self.watch()
+        self.room.emit("disconnected", rtc.DisconnectReason.CLIENT_INITIATED)
+        self.assertEqual(await ended, "disconnected")
+
+    async def test_session_close(self):
+        ended = self.watch()
+        self.session.emit("close", SimpleNamespace(error=None))
+        self.assertEqual(await ended, "session_closed")
+
+    async def test_session_close_with_error(self):
+        ended = self.watch()
+        self.session.emit("close", SimpleNamespace(error=RuntimeError("boom")))
+        self.assertEqual(await ended, "error")
+
+    async def test_alone_after_grace(self):
+        ended = self.watch()
+        self.room.leave(self.alice)
+        self.assertFalse(ended.done())
+        self.assertEqual(await asyncio.wait_for(ended, 1), "alone")
+
+    async def test_rejoin_cancels_alone_grace(self):
+        ended = self.watch()
+        self.room.leave(self.alice)
+        self.room.join(_human("alice"))
+        await asyncio.sleep(0.1)
+        self.assertFalse(ended.done())
+        ended.cancel()
+
+    async def test_no_alone_grace_when_hosted(self):
+        ended = self.watch(alone_grace=None)
+        self.room.leave(self.alice)
+        await asyncio.sleep(0.1)
+        self.assertFalse(ended.done())
+        ended.cancel()
+
+    async def test_agents_do_not_count(self):
+        ended = self.watch()
+        self.room.join(_agent("carol-agent-room"))
+        self.room.leave(self.room.remote_participants["bob-agent-room"])
+        await asyncio.sleep(0.1)
+        self.assertFalse(ended.done())
+        self.assertEqual(self.events, [])
+        ended.cancel()
+
+    async def test_occupancy_reports(self):
+        ended = self.watch()
+        self.room.join(_human("dave"))
+        self.room.leave(self.alice)
+        self.assertEqual([fields["humans"] for event, fields in self.events if event == "occupancy"], [2, 1])
+        ended.cancel()
+
+    async def test_finishes_once(self):
+        ended = self.watch()
+        self.session.emit("close", SimpleNamespace(error=None))
+        self.room.emit("disconnected", rtc.DisconnectReason.ROOM_DELETED)
+        self.assertEqual(await ended, "session_closed")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import asyncio
+import unittest
+
+from livekit.agents import llm
+
+from speculation import Speculator, SpeculationStats
+
+
+class _Stream:
+    def __init__(self, ttft: float):
+        self.ttft = ttft
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        await asyncio.sleep(self.ttft)
+        yield "chunk"
+
+
+class _LLM:
+    """Answers with one chunk, `ttft` seconds after the request"""
+
+    def __init__(self, ttft: float):
+        self.ttft = ttft
+
+    def chat(self, *, chat_ctx):
+        return _Stream(self.ttft)
+
+
+class SavedTimeTest(unittest.IsolatedAsyncioTestCase):
+    def speculator(self, ttft: float) -> Speculator:
+        speculator = Speculator("test", _LLM(ttft), chat_ctx=llm.ChatContext, should_respond=lambda _: True)
+        speculator.stats = SpeculationStats()
+        return speculator
+
+    def final_turn(self, text: str) -> llm.ChatContext:
+        chat_ctx = llm.ChatContext()
+        chat_ctx.add_message(role="user", content=text)
+        return chat_ctx
+
+    async def test_first_token_before_the_turn_ended_saves_its_ttft(self):
+        speculator = self.speculator(ttft=0.05)
+        speculator.on_transcript("what time is it", is_final=True)
+        await asyncio.sleep(0.2)
+        self.assertIsNotNone(speculator.take(self.final_turn("what time is it")))
+        stats = speculator.stats
+        self.assertEqual(stats.committed, 1)
+        self.assertGreaterEqual(stats.head_start_ms, 200)
+        self.assertAlmostEqual(stats.saved_ms, 50, delta=30)
+
+    async def test_first_token_still_pending_saves_the_head_start(self):
+        speculator = self.speculator(ttft=1.0)
+        speculator.on_transcript("what time is it", is_final=True)
+        await asyncio.sleep(0.1)
+        spec = speculator.take(self.final_turn("what time is it"))
+        spec.cancel()
+        stats = speculator.stats
+        self.assertEqual(stats.saved_ms, stats.head_start_ms)
+        self.assertGreaterEqual(stats.saved_ms, 100)
+
+    async def test_a_miss_saves_nothing(self):
+        speculator = self.speculator(ttft=0.01)
+        speculator.on_transcript("what time is it", is_final=True)
+        await asyncio.sleep(0.05)
+        self.assertIsNone(speculator.take(self.final_turn("book me a table for two tonight")))
+        self.assertEqual((speculator.stats.wasted, speculator.stats.saved_ms), (1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
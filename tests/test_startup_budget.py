@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+import time
+import statistics
+import subprocess
+import unittest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seconds a fresh interpreter may take to `import agent_runner` (median of IMPORT_RUNS)
+STARTUP_IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", "1.5"))
+IMPORT_RUNS = 3
+# Loaded only once a process knows it needs them (AGENT_PROVIDERS=live, the VAD)
+LAZY_MODULES = [
+    "openai",
+    "livekit.plugins.groq",
+    "livekit.plugins.elevenlabs",
+    "livekit.plugins.deepgram",
+    "livekit.plugins.silero",
+    "onnxruntime",
+]
+
+
+def _import_agent_runner(code: str = "") -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-c", f"import agent_runner\n{code}"],
+        cwd=REPO, capture_output=True, text=True, timeout=60,
+    )
+
+
+class StartupBudgetTest(unittest.TestCase):
+    def test_import_within_budget(self):
+        samples = []
+        for _ in range(IMPORT_RUNS):
+            started = time.perf_counter()
+            result = _import_agent_runner()
+            samples.append(time.perf_counter() - started)
+            self.assertEqual(result.returncode, 0, result.stderr)
+        median = statistics.median(samples)
+        self.assertLessEqual(
+            median, STARTUP_IMPORT_BUDGET,
+            f"import agent_runner took {median:.2f}s (budget {STARTUP_IMPORT_BUDGET:.2f}s)",
+        )
+
+    def test_provider_plugins_stay_lazy(self):
+        result = _import_agent_runner(
+            f"import sys, json\nprint(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(json.loads(result.stdout.strip().splitlines()[-1]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
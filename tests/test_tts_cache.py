@@ -0,0 +1,108 @@
+import asyncio
+import tempfile
+import unittest
+
+from livekit import rtc
+from livekit.agents import tts
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS
+
+from tts_cache import CachedTTS, TTSCache
+
+SAMPLE_RATE = 24000
+LONG = "This sentence is far longer than the sixty characters a cached one may have, so it streams. "
+
+
+def _audio(text: str) -> rtc.AudioFrame:
+    # One sample per character, valued by the text's length, so order and content can be checked
+    return rtc.AudioFrame(bytes([len(text) % 256, 0]) * len(text), SAMPLE_RATE, 1, len(text))
+
+
+class _StreamingTTS(tts.TTS):
+    """Speaks every flushed segment at once; remembers what it was asked to say"""
+
+    def __init__(self):
+        super().__init__(capabilities=tts.TTSCapabilities(streaming=True), sample_rate=SAMPLE_RATE, num_channels=1)
+        self.segments = []
+
+    def synthesize(self, text, *, conn_options=DEFAULT_API_CONNECT_OPTIONS):
+        raise AssertionError("a streaming reply must not fall back to per-sentence synthesis")
+
+    def stream(self, *, conn_options=DEFAULT_API_CONNECT_OPTIONS):
+        return _Stream(tts=self, conn_options=conn_options)
+
+
+class _Stream(tts.SynthesizeStream):
+    async def _run(self):
+        segment = ""
+        async for data in self._input_ch:
+            if isinstance(data, str):
+                segment += data
+            elif segment:
+                self._speak(segment)
+                segment = ""
+        if segment:
+            self._speak(segment)
+
+    def _speak(self, text: str):
+        self._tts.segments.append(text)
+        self._event_ch.send_nowait(tts.SynthesizedAudio(request_id="ws", frame=_audio(text), is_final=True))
+
+
+async def _speak(voice: CachedTTS, reply: str) -> bytes:
+    audio = bytearray()
+    async with voice.stream() as stream:
+        for word in reply.split(" "):
+            stream.push_text(word + " ")
+            await asyncio.sleep(0)
+        stream.end_input()
+        async for ev in stream:
+            audio += bytes(ev.frame.data)
+    return bytes(audio)
+
+
+class CachedStreamTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.provider = _StreamingTTS()
+        self.voice = CachedTTS(self.provider, TTSCache(directory=None))
+
+    async def test_keeps_the_provider_stream(self):
+        self.assertTrue(self.voice.capabilities.streaming)
+
+    async def test_short_sentences_are_their_own_segments_and_cached(self):
+        first = await _speak(self.voice, "Sure! " + LONG + "Okay.")
+        self.assertEqual(self.provider.segments, ["Sure! ", LONG, "Okay. "])
+
+        self.provider.segments.clear()
+        again = await _speak(self.voice, "Sure! " + LONG + "Okay.")
+        self.assertEqual(self.provider.segments, [LONG])
+        self.assertEqual(again, first)
+
+    async def test_reply_of_cached_sentences_opens_no_stream(self):
+        await _speak(self.voice, "Good question.")
+        self.provider.segments.clear()
+        await _speak(self.voice, "Good question.")
+        self.assertEqual(self.provider.segments, [])
+
+
+class DiskIndexTest(unittest.IsolatedAsyncioTestCase):
+    async def test_one_off_entries_stay_off_disk_until_hit(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = TTSCache(directory=directory, memory_bytes=10_000, disk_bytes=250)
+            await cache.put("once", b"x" * 100)
+            await cache.put("opener", b"y" * 100, persist=True)
+            self.assertEqual(set(cache._files), {"opener"})
+
+            await cache.get("once")
+            await asyncio.gather(*cache._writes)
+            self.assertEqual(set(cache._files), {"opener", "once"})
+
+            await cache.put("new", b"z" * 100, persist=True)
+            self.assertEqual(set(cache._files), {"once", "new"})
+
+            reloaded = TTSCache(directory=directory, memory_bytes=10_000, disk_bytes=250)
+            self.assertEqual(set(reloaded._files), {"once", "new"})
+            self.assertEqual(reloaded.stats()["disk_bytes"], 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
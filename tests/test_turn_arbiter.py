@@ -0,0 +1,93 @@
+import unittest
+from types import SimpleNamespace
+
+from turn_arbiter import AddressMatcher, TurnArbiter
+
+ALIASES = {"alex": ["alex"], "priya": ["priya", "priya sharma"]}
+
+
+class _Room:
+    def __init__(self, *identities):
+        self.remote_participants = {i: SimpleNamespace(identity=i) for i in identities}
+
+    def on(self, event, callback=None):
+        pass
+
+
+class AddressMatcherTest(unittest.TestCase):
+    def test_addressed(self):
+        matcher = AddressMatcher(ALIASES)
+        cases = [
+            ("Alex, what do you think?", "alex"),
+            ("alec can you help", "alex"),  # STT misspelling
+            ("Alexa, go on", "alex"),
+            ("pria what's next", "priya"),
+            ("Priya Sharma please", "priya"),
+            ("what about you, priya? and alex?", "priya"),  # first mention wins
+            ("that was my prior question", None),
+            ("set an alert for noon", None),
+            ("a lex", None),
+            ("hello everyone", None),
+            ("", None),
+        ]
+        for transcript, expected in cases:
+            with self.subTest(transcript=transcript):
+                self.assertEqual(matcher.addressed(transcript), expected)
+
+    def test_start_of_the_name_must_match(self):
+        matcher = AddressMatcher({"alex": ["alex"]}, threshold=0.5)
+        self.assertIsNone(matcher.addressed("flex"))
+        self.assertEqual(matcher.addressed("alax"), "alex")
+
+
+class TurnArbiterTest(unittest.TestCase):
+    def arbiter(self, present=("alex", "priya"), lead="alex", continue_window=20) -> TurnArbiter:
+        arbiter = TurnArbiter("room", AddressMatcher(ALIASES), lead=lead, continue_window=continue_window)
+        arbiter.join(present[0], _Room(*(f"{p}-agent-room" for p in present[1:]), "user-1"))
+        return arbiter
+
+    def test_decide(self):
+        cases = [
+            # (present, last speaker, transcript, expected, reason)
+            (("alex", "priya"), None, "priya, any ideas?", "priya", "addressed"),
+            (("alex", "priya"), "priya", "and then?", "priya", "last speaker"),
+            (("alex", "priya"), "priya", "alex, and then?", "alex", "addressed"),
+            (("alex", "priya"), None, "and then?", "alex", "lead"),
+            (("alex",), None, "priya, any ideas?", "alex", "lead"),  # addressed persona is not in the room
+            (("alex",), "priya", "and then?", "alex", "lead"),  # the last speaker left
+            (("priya",), None, "and then?", None, "nobody suitable"),
+        ]
+        for present, last, transcript, expected, reason in cases:
+            with self.subTest(transcript=transcript, present=present, last=last):
+                arbiter = self.arbiter(present)
+                if last:
+                    arbiter.record_spoke(last)
+                self.assertEqual(arbiter._decide(transcript), (expected, reason))
+
+    def test_continue_window_expires(self):
+        arbiter = self.arbiter(continue_window=20)
+        arbiter.record_spoke("priya")
+        arbiter._last_spoke_at -= 21
+        self.assertEqual(arbiter._decide("and then?"), ("alex", "lead"))
+
+    def test_one_decision_per_transcript(self):
+        arbiter = self.arbiter()
+        arbiter.record_spoke("priya")
+        answers = {persona: arbiter.should_respond(persona, "And then?") for persona in ("alex", "priya")}
+        self.assertEqual(answers, {"alex": False, "priya": True})
+        self.assertEqual(arbiter.turns, 1)
+
+        # Whoever asks again sees the same answer, even though the floor moved since
+        arbiter.record_spoke("alex")
+        self.assertTrue(arbiter.should_respond("priya", "and then"))
+        self.assertFalse(arbiter.should_respond("alex", "and then?"))
+        self.assertEqual(arbiter.turns, 1)
+
+    def test_predict_does_not_decide(self):
+        arbiter = self.arbiter()
+        self.assertEqual(arbiter.predict("priya?"), "priya")
+        self.assertEqual(arbiter.turns, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import asyncio
+import itertools
+import unittest
+
+from worker_pool import AgentWorker, WorkerPool
+
+
+class _Worker(AgentWorker):
+    """A worker without a process: commands are only recorded"""
+
+    def __init__(self, pid: int, max_sessions: int):
+        self.pid = pid
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.reserved = {}
+        self.sent = []
+
+    @property
+    def alive(self) -> bool:
+        return True
+
+    async def send(self, **msg):
+        self.sent.append(msg)
+
+
+class _Pool(WorkerPool):
+    def __init__(self, sessions_per_worker: int):
+        super().__init__(size=0, sessions_per_worker=sessions_per_worker)
+        self.spawned = 0
+        self._pids = itertools.count(100)
+
+    def add_worker(self, sessions: int = 0) -> _Worker:
+        worker = _Worker(next(self._pids), self.sessions_per_worker)
+        for i in range(sessions):
+            worker.sessions[("other", f"agent-{i}")] = {}
+        self._workers[worker.pid] = worker
+        return worker
+
+    async def _spawn(self) -> AgentWorker:
+        self.spawned += 1
+        await asyncio.sleep(0.01)
+        return self.add_worker()
+
+
+class RoomPlacementTest(unittest.IsolatedAsyncioTestCase):
+    async def dispatch_all(self, pool: _Pool, room: str, count: int):
+        return await asyncio.gather(*(
+            pool.dispatch(room, f"persona-{i}-agent-{room}", f"persona-{i}", "token") for i in range(count)
+        ))
+
+    async def test_concurrent_dispatches_share_one_cold_start(self):
+        pool = _Pool(sessions_per_worker=4)
+        workers = await self.dispatch_all(pool, "room", 3)
+        self.assertEqual(pool.spawned, 1)
+        self.assertEqual(len({w.pid for w in workers}), 1)
+
+    async def test_reserved_room_is_not_split_over_a_nearly_full_worker(self):
+        pool = _Pool(sessions_per_worker=2)
+        busy = pool.add_worker(sessions=1)
+        async with pool.reserve("room", 2):
+            workers = await self.dispatch_all(pool, "room", 2)
+        self.assertEqual(len({w.pid for w in workers}), 1)
+        self.assertIsNot(workers[0], busy)
+        self.assertEqual(busy.free_slots, 1)
+
+    async def test_reserved_room_goes_to_a_warm_worker_that_fits(self):
+        pool = _Pool(sessions_per_worker=4)
+        warm = pool.add_worker(sessions=1)
+        async with pool.reserve("room", 3):
+            workers = await self.dispatch_all(pool, "room", 3)
+        self.assertEqual(pool.spawned, 0)
+        self.assertTrue(all(w is warm for w in workers))
+
+    async def test_unused_slots_are_given_back(self):
+        pool = _Pool(sessions_per_worker=4)
+        async with pool.reserve("room", 3):
+            (worker,) = await self.dispatch_all(pool, "room", 1)
+        self.assertEqual(worker.reserved, {})
+        self.assertEqual(worker.free_slots, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import time
+import json
+import datetime
+import dataclasses
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from livekit import api
+
+# Lifetime of the access tokens we sign
+TOKEN_TTL = float(os.getenv("TOKEN_TTL", str(6 * 3600)))
+# A cached token is re-signed once it has less than this many seconds left
+TOKEN_REFRESH_MARGIN = float(os.getenv("TOKEN_REFRESH_MARGIN", "600"))
+# Signed tokens kept at most (least recently used are dropped first)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+
+class TokenCache:
+    """
+    Signed LiveKit access tokens, reused for the same identity, name and
+    grants until TOKEN_REFRESH_MARGIN seconds before they expire, so
+    provisioning a cohort does not sign the same JWT over and over.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        api_secret: str,
+        ttl: float = TOKEN_TTL,
+        refresh_margin: float = TOKEN_REFRESH_MARGIN,
+        max_size: int = TOKEN_CACHE_SIZE,
+    ):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # key -> (jwt, expires_at)
+        self._tokens: "OrderedDict[Tuple, Tuple[str, float]]" = OrderedDict()
+
+    def token(self, identity: str, grants: api.VideoGrants, name: Optional[str] = None) -> str:
+        key = (identity, name, json.dumps(dataclasses.asdict(grants), sort_keys=True))
+        cached = self._tokens.get(key)
+        now = time.time()
+        if cached is not None and cached[1] - now > self.refresh_margin:
+            self._tokens.move_to_end(key)
+            self.hits += 1
+            return cached[0]
+
+        self.misses += 1
+        token = (
+            api.AccessToken(self.api_key, self.api_secret)
+            .with_identity(identity)
+            .with_name(name or identity)
+            .with_grants(grants)
+            .with_ttl(datetime.timedelta(seconds=self.ttl))
+            .to_jwt()
+        )
+        self._tokens[key] = (token, now + self.ttl)
+        self._tokens.move_to_end(key)
+        while len(self._tokens) > self.max_size:
+            self._tokens.popitem(last=False)
+        return token
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "cached": len(self._tokens),
+        }
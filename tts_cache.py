@@ -0,0 +1,416 @@
+import os
+import re
+import asyncio
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
+
+from livekit import rtc
+from livekit.agents import tts, utils
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS, APIConnectOptions
+
+# In-memory LRU in front of the on-disk store, shared by every voice in a process
+TTS_CACHE_MEMORY_MB = float(os.getenv("TTS_CACHE_MEMORY_MB", "64"))
+# On-disk store, shared by every process on the machine (0 disables it)
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_cache"))
+TTS_CACHE_DISK_MB = float(os.getenv("TTS_CACHE_DISK_MB", "512"))
+# Sentences up to this many characters go to disk when first synthesized; longer
+# ones (most LLM replies) only once they were played from memory again. Streamed
+# replies only look up (and hold back) sentences this short; longer ones go
+# straight to the provider
+TTS_CACHE_DISK_MAX_CHARS = int(os.getenv("TTS_CACHE_DISK_MAX_CHARS", "60"))
+# Length of the frames a cache hit is played back in
+CACHE_FRAME_MS = 100
+# Where a streamed reply's sentences end: ., ! or ?, closing quotes or brackets, then a space
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Collapse the differences that do not change what gets spoken"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def voice_signature(provider: tts.TTS) -> str:
+    """Everything besides the text that changes a provider's audio"""
+    opts = getattr(provider, "_opts", None)
+    fields = [str(getattr(opts, name, "")) for name in ("voice_id", "model", "voice_settings", "language")]
+    return "|".join([provider.label, *fields, str(provider.sample_rate), str(provider.num_channels)])
+
+
+class TTSCache:
+    """
+    Synthesized PCM keyed by voice, voice settings and normalized text.
+
+    Lookups hit an in-memory LRU first and then a size-bounded directory of
+    raw PCM files (least recently used files are evicted first), so audio
+    survives restarts and is shared between worker processes.
+
+    Only entries worth keeping reach the disk: those `put` with `persist`
+    (openers, short phrases) and any other entry once it is hit in memory.
+    The files' sizes and recency are indexed in memory, read from the
+    directory once at start-up, so writes never rescan it.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = TTS_CACHE_DIR,
+        memory_bytes: int = int(TTS_CACHE_MEMORY_MB * 1024 * 1024),
+        disk_bytes: int = int(TTS_CACHE_DISK_MB * 1024 * 1024),
+    ):
+        self.directory = directory if disk_bytes > 0 else None
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        # key -> file size, least recently used first (the disk store runs on threads)
+        self._files: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_used = 0
+        self._files_lock = threading.Lock()
+        self._writes: set = set()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._load_index()
+
+    @staticmethod
+    def key(voice: str, text: str) -> str:
+        return hashlib.sha256(f"{voice}\n{normalize_text(text)}".encode()).hexdigest()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "memory_bytes": self._memory_used,
+            "disk_bytes": self._disk_used,
+        }
+
+    # -- Lookups --
+
+    async def contains(self, key: str) -> bool:
+        """Whether `key` is cached, without counting as a lookup"""
+        if key in self._memory:
+            return True
+        return bool(self.directory) and await asyncio.to_thread(os.path.exists, self._path(key))
+
+    async def get(self, key: str) -> Optional[bytes]:
+        data = self._memory.get(key)
+        if data is not None:
+            if self.directory and key not in self._files:
+                # Played a second time: worth keeping across restarts after all
+                self._write_in_background(key, data)
+        elif self.directory:
+            data = await asyncio.to_thread(self._read_file, key)
+            if data is not None:
+                self._remember(key, data)
+        if data is None:
+            self.misses += 1
+            return None
+        self._memory.move_to_end(key)
+        self.hits += 1
+        self.bytes_saved += len(data)
+        return data
+
+    async def put(self, key: str, data: bytes, persist: bool = False):
+        """Cache `data`; with `persist` it also goes to disk now, otherwise only once it is hit"""
+        self._remember(key, data)
+        if self.directory and persist:
+            await asyncio.to_thread(self._write_file, key, data)
+
+    def _write_in_background(self, key: str, data: bytes):
+        task = asyncio.create_task(asyncio.to_thread(self._write_file, key, data))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_used -= len(old)
+        self._memory[key] = data
+        self._memory_used += len(data)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    # -- Disk store (runs in a thread) --
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pcm")
+
+    def _load_index(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".pcm"):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, entry.name[:-len(".pcm")], st.st_size))
+        for _, key, size in sorted(entries):
+            self._files[key] = size
+            self._disk_used += size
+
+    def _touch(self, key: str, size: int):
+        with self._files_lock:
+            old = self._files.pop(key, None)
+            self._disk_used += size - (old or 0)
+            self._files[key] = size
+
+    def _read_file(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # recently used, for the index the next start-up loads
+        except FileNotFoundError:
+            with self._files_lock:
+                self._disk_used -= self._files.pop(key, 0)  # evicted by another process
+            return None
+        self._touch(key, len(data))  # possibly written by another process
+        return data
+
+    def _write_file(self, key: str, data: bytes):
+        # Write then rename, so other processes never read a partial file
+        tmp = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._path(key))
+        self._touch(key, len(data))
+        self._evict_files()
+
+    def _evict_files(self):
+        while True:
+            with self._files_lock:
+                if self._disk_used <= self.disk_bytes or not self._files:
+                    return
+                key, size = self._files.popitem(last=False)
+                self._disk_used -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+
+class CachedTTS(tts.TTS):
+    """
+    Wraps a provider TTS so the sentences it speaks go through a TTSCache.
+
+    `synthesize` (openers, and every sentence of a TTS that cannot stream,
+    fed one at a time by livekit's StreamAdapter) is served from the cache
+    whenever it can be. A TTS that streams keeps streaming: only short
+    sentences are held back to be looked up, the rest reaches the provider's
+    websocket as the LLM writes it (see CachedSynthesizeStream).
+    """
+
+    def __init__(self, wrapped: tts.TTS, cache: TTSCache):
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=wrapped.capabilities.streaming),
+            sample_rate=wrapped.sample_rate,
+            num_channels=wrapped.num_channels,
+        )
+        self.wrapped = wrapped
+        self.cache = cache
+        # Report metrics under the provider's name
+        self._label = wrapped.label
+        self.voice = voice_signature(wrapped)
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "CachedChunkedStream":
+        return CachedChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+    def stream(self, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "CachedSynthesizeStream":
+        return CachedSynthesizeStream(tts=self, conn_options=conn_options)
+
+    async def prerender(self, text: str):
+        """Synthesize `text` into the cache (and onto disk) now, unless it is already there"""
+        key = self.cache.key(self.voice, text)
+        if not await self.cache.contains(key):
+            await self._synthesize_into_cache(key, text)
+
+    @staticmethod
+    def keep_on_disk(text: str) -> bool:
+        """Short phrases ("Sure.", "Good question.") recur; most longer sentences are said once"""
+        return len(normalize_text(text)) <= TTS_CACHE_DISK_MAX_CHARS
+
+    async def cached_audio(self, text: str) -> Optional[AsyncIterator[rtc.AudioFrame]]:
+        """Frames for `text` if they are cached, for playing without any provider call"""
+        data = await self.cache.get(self.cache.key(self.voice, text))
+        if data is None:
+            return None
+        return self._frames_iter(data)
+
+    async def _frames_iter(self, data: bytes) -> AsyncIterator[rtc.AudioFrame]:
+        for frame in self.frames(data):
+            yield frame
+
+    def frames(self, data: bytes):
+        samples = self.sample_rate * CACHE_FRAME_MS // 1000
+        step = samples * self.num_channels * 2  # 16-bit PCM
+        for i in range(0, len(data), step):
+            chunk = data[i:i + step]
+            yield rtc.AudioFrame(
+                data=chunk,
+                sample_rate=self.sample_rate,
+                num_channels=self.num_channels,
+                samples_per_channel=len(chunk) // (2 * self.num_channels),
+            )
+
+    async def _synthesize_into_cache(self, key: str, text: str):
+        pcm = bytearray()
+        async with self.wrapped.synthesize(text) as stream:
+            async for ev in stream:
+                pcm += bytes(ev.frame.data)
+        if pcm and getattr(stream, "cacheable", True):
+            await self.cache.put(key, bytes(pcm), persist=True)
+
+    def prewarm(self):
+        self.wrapped.prewarm()
+
+    async def aclose(self):
+        await self.wrapped.aclose()
+
+
+class CachedChunkedStream(tts.ChunkedStream):
+    def __init__(self, *, tts: CachedTTS, input_text: str, conn_options: APIConnectOptions):
+        super().__init__(tts=tts, input_text=input_text, conn_options=conn_options)
+        self._cached_tts = tts
+
+    async def _run(self):
+        cached_tts = self._cached_tts
+        key = cached_tts.cache.key(cached_tts.voice, self._input_text)
+        request_id = utils.shortuuid()
+
+        data = await cached_tts.cache.get(key)
+        if data is not None:
+            for frame in cached_tts.frames(data):
+                self._event_ch.send_nowait(tts.SynthesizedAudio(request_id=request_id, frame=frame))
+            return
+
+        pcm = bytearray()
+        async with cached_tts.wrapped.synthesize(self._input_text, conn_options=self._conn_options) as stream:
+            async for ev in stream:
+                pcm += bytes(ev.frame.data)
+                self._event_ch.send_nowait(ev)
+        # Only complete syntheses reach this point (cancellation raises above);
+        # wrappers mark audio that is not the voice's own (a hedge's backup) as not cacheable
+        if pcm and getattr(stream, "cacheable", True):
+            await cached_tts.cache.put(key, bytes(pcm), persist=cached_tts.keep_on_disk(self._input_text))
+
+
+class CachedSynthesizeStream(tts.SynthesizeStream):
+    """
+    A streamed reply that only waits for the cache where it can pay off.
+
+    A sentence of up to TTS_CACHE_DISK_MAX_CHARS is held back until it is
+    complete, then played from the cache, or synthesized as a provider
+    segment of its own and cached. Anything longer is pushed to the wrapped
+    stream as it arrives (and flushed once it is complete), so a miss costs
+    what streaming costs. Cached audio
+    and provider segments are played in the order of the text.
+    """
+
+    def __init__(self, *, tts: CachedTTS, conn_options: APIConnectOptions):
+        super().__init__(tts=tts, conn_options=conn_options)
+        self._cached_tts = tts
+
+    async def _run(self):
+        cached_tts = self._cached_tts
+        request_id = utils.shortuuid()
+        inner: Optional[tts.SynthesizeStream] = None  # opened on the first text the provider has to speak
+        open_segment = False  # the wrapped stream has text that was not flushed yet
+        # What plays next, in text order: ("inner", key) for the wrapped
+        # stream's next segment (cached under `key` unless None), ("cached", pcm),
+        # and None once the input ended
+        order: asyncio.Queue = asyncio.Queue()
+
+        def _push(text: str, key: Optional[str] = None):
+            nonlocal inner, open_segment
+            if inner is None:
+                inner = cached_tts.wrapped.stream(conn_options=self._conn_options)
+            if not open_segment:
+                order.put_nowait(("inner", key))
+                open_segment = True
+            self._mark_started()
+            inner.push_text(text)
+
+        def _close_segment():
+            nonlocal open_segment
+            if open_segment:
+                inner.flush()
+                open_segment = False
+
+        async def _sentence_done(sentence: str, sent: int):
+            if sent:
+                # Too long to cache: the start of it is already streaming, and
+                # the flush lets the provider speak the rest without waiting for more
+                if sentence[sent:]:
+                    _push(sentence[sent:])
+                _close_segment()
+                return
+            if not sentence.strip():
+                return
+            key = cached_tts.cache.key(cached_tts.voice, sentence)
+            data = await cached_tts.cache.get(key)
+            _close_segment()
+            if data is not None:
+                order.put_nowait(("cached", data))
+            else:
+                _push(sentence, key)
+                _close_segment()
+
+        async def _read_input():
+            sentence, sent = "", 0  # the sentence being written, and how much of it is streaming already
+            async for data in self._input_ch:
+                if isinstance(data, str):
+                    sentence += data
+                    while match := _SENTENCE_END.search(sentence):
+                        done, sentence = sentence[:match.end()], sentence[match.end():]
+                        await _sentence_done(done, sent)
+                        sent = 0
+                    if sent or len(sentence) > TTS_CACHE_DISK_MAX_CHARS:
+                        if sentence[sent:]:
+                            _push(sentence[sent:])
+                        sent = len(sentence)
+                else:
+                    await _sentence_done(sentence, sent)
+                    sentence, sent = "", 0
+                    _close_segment()
+            await _sentence_done(sentence, sent)
+            _close_segment()
+            if inner is not None:
+                inner.end_input()
+            order.put_nowait(None)
+
+        async def _write_output():
+            while (item := await order.get()) is not None:
+                kind, value = item
+                if kind == "cached":
+                    for frame in cached_tts.frames(value):
+                        self._event_ch.send_nowait(tts.SynthesizedAudio(request_id=request_id, frame=frame))
+                    continue
+                pcm = bytearray()
+                complete = False
+                async for ev in inner:
+                    pcm += bytes(ev.frame.data)
+                    self._event_ch.send_nowait(ev)
+                    if ev.is_final:
+                        complete = True
+                        break
+                if value is not None and complete and pcm and getattr(inner, "cacheable", True):
+                    await cached_tts.cache.put(value, bytes(pcm), persist=True)
+
+        tasks = [asyncio.create_task(_read_input()), asyncio.create_task(_write_output())]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            await utils.aio.cancel_and_wait(*tasks)
+            if inner is not None:
+                await inner.aclose()
@@ -0,0 +1,202 @@
+import os
+import re
+import time
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from livekit import rtc
+
+from structured_log import get_logger
+
+# How long the persona that spoke last keeps the floor for unaddressed follow-ups
+TURN_CONTINUE_WINDOW = float(os.getenv("TURN_CONTINUE_WINDOW", "20"))
+# Minimum similarity (0-1) for a transcript word to count as a persona's alias
+TURN_FUZZY_THRESHOLD = float(os.getenv("TURN_FUZZY_THRESHOLD", "0.75"))
+# How long a decision is reused for the same transcript, so every persona of
+# the room sees the same answer
+TURN_DECISION_TTL = 5.0
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def normalize_transcript(text: str) -> str:
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def persona_from_identity(identity: str) -> Optional[str]:
+    """'alex-agent-myroom' -> 'alex'; None for anyone who is not one of our personas"""
+    if "-agent-" not in identity:
+        return None
+    return identity.split("-agent-", 1)[0]
+
+
+class AddressMatcher:
+    """
+    Finds which persona a transcript is addressed to.
+
+    Every persona has a list of aliases (single words or short phrases). A
+    transcript word (or pair of words, for two-word aliases) matches an alias
+    when it is similar enough to survive STT misspellings ("alec", "pria"),
+    and the persona mentioned first wins.
+    """
+
+    def __init__(self, aliases: Dict[str, Iterable[str]], threshold: float = TURN_FUZZY_THRESHOLD):
+        self.threshold = threshold
+        self._aliases: List[Tuple[str, str]] = [
+            (persona, normalize_transcript(alias))
+            for persona, names in aliases.items()
+            for alias in names
+        ]
+
+    def _similar(self, candidate: str, alias: str) -> bool:
+        if candidate == alias:
+            return True
+        if candidate[:2] != alias[:2]:
+            return False  # STT rarely gets the start of a name wrong
+        return SequenceMatcher(None, candidate, alias).ratio() >= self.threshold
+
+    def addressed(self, transcript: str) -> Optional[str]:
+        """The persona the transcript names first, or None"""
+        words = normalize_transcript(transcript).split()
+        for i in range(len(words)):
+            for persona, alias in self._aliases:
+                size = alias.count(" ") + 1
+                candidate = " ".join(words[i:i + size])
+                if len(candidate.split()) == size and self._similar(candidate, alias):
+                    return persona
+        return None
+
+
+class TurnArbiter:
+    """
+    Picks exactly one persona to answer each user turn in a room.
+
+    1. A persona addressed by name (or alias) answers, if it is in the room.
+    2. Otherwise the persona that spoke last keeps the floor for
+       TURN_CONTINUE_WINDOW seconds.
+    3. Otherwise the room's lead persona answers.
+
+    Personas in this process register with `join`; personas hosted by other
+    processes are seen as agent participants of the room, and their speech
+    through the room's active speaker updates.
+    """
+
+    def __init__(
+        self,
+        room_name: str,
+        matcher: AddressMatcher,
+        lead: Optional[str] = None,
+        continue_window: float = TURN_CONTINUE_WINDOW,
+    ):
+        self.room_name = room_name
+        self.matcher = matcher
+        self.lead = lead
+        self.continue_window = continue_window
+        self._local: Set[str] = set()
+        self._rooms: List[rtc.Room] = []
+        self._last_speaker: Optional[str] = None
+        self._last_spoke_at = 0.0
+        self._decisions: Dict[str, Tuple[float, Optional[str]]] = {}
+        self._log = get_logger(room=room_name)
+        self.turns = 0
+
+    @property
+    def attached(self) -> int:
+        return len(self._rooms)
+
+    # -- Presence --
+
+    def join(self, persona: str, room: rtc.Room):
+        self._local.add(persona)
+        self._rooms.append(room)
+        room.on("active_speakers_changed", self._on_active_speakers)
+
+    def leave(self, persona: str, room: rtc.Room):
+        self._local.discard(persona)
+        if room in self._rooms:
+            self._rooms.remove(room)
+
+    def present(self) -> Set[str]:
+        personas = set(self._local)
+        for room in self._rooms:
+            for participant in room.remote_participants.values():
+                persona = persona_from_identity(participant.identity)
+                if persona:
+                    personas.add(persona)
+        return personas
+
+    def _on_active_speakers(self, speakers: List[rtc.Participant]):
+        for participant in speakers:
+            persona = persona_from_identity(participant.identity)
+            if persona:
+                self.record_spoke(persona)
+
+    def record_spoke(self, persona: str):
+        self._last_speaker = persona
+        self._last_spoke_at = time.monotonic()
+
+    # -- Decisions --
+
+    def choose(self, transcript: str) -> Optional[str]:
+        """The persona that should answer `transcript`, decided once per transcript"""
+        key = normalize_transcript(transcript)
+        now = time.monotonic()
+        self._decisions = {k: v for k, v in self._decisions.items() if now - v[0] < TURN_DECISION_TTL}
+        if key in self._decisions:
+            return self._decisions[key][1]
+
+        chosen, why = self._decide(transcript)
+        self.turns += 1
+        self._log.info(
+            "turn", f"{chosen or 'no one'} answers ({why})",
+            turn=self.turns, persona=chosen, reason=why, transcript=transcript,
+        )
+        self._decisions[key] = (now, chosen)
+        return chosen
+
+    def predict(self, transcript: str) -> Optional[str]:
+        """Who would answer `transcript` right now, without deciding the turn"""
+        return self._decide(transcript)[0]
+
+    def _decide(self, transcript: str) -> Tuple[Optional[str], str]:
+        present = self.present()
+        addressed = self.matcher.addressed(transcript)
+        if addressed in present:
+            return addressed, "addressed"
+        if self._last_speaker in present and time.monotonic() - self._last_spoke_at < self.continue_window:
+            return self._last_speaker, "last speaker"
+        if self.lead in present:
+            return self.lead, "lead"
+        return None, "nobody suitable"
+
+    def should_respond(self, persona: str, transcript: str) -> bool:
+        return self.choose(transcript) == persona
+
+
+class TurnArbiterRegistry:
+    """One TurnArbiter per room in this process, kept while any persona uses it"""
+
+    def __init__(self, aliases: Dict[str, Iterable[str]], lead: Optional[str] = None):
+        self.matcher = AddressMatcher(aliases)
+        self.lead = lead
+        self._arbiters: Dict[str, TurnArbiter] = {}
+
+    def update(self, aliases: Dict[str, Iterable[str]], lead: Optional[str] = None):
+        """New aliases and lead for rooms opened from now on; running rooms keep theirs"""
+        self.matcher = AddressMatcher(aliases)
+        self.lead = lead
+
+    def join(self, room_name: str, persona: str, room: rtc.Room) -> TurnArbiter:
+        arbiter = self._arbiters.get(room_name)
+        if arbiter is None:
+            arbiter = self._arbiters[room_name] = TurnArbiter(room_name, self.matcher, self.lead)
+        arbiter.join(persona, room)
+        return arbiter
+
+    def leave(self, room_name: str, persona: str, room: rtc.Room):
+        arbiter = self._arbiters.get(room_name)
+        if arbiter is None:
+            return
+        arbiter.leave(persona, room)
+        if not arbiter.attached:
+            del self._arbiters[room_name]
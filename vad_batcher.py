@@ -0,0 +1,159 @@
+import os
+import time
+import queue
+import threading
+import concurrent.futures
+from typing import Dict, List, Tuple
+
+import numpy as np
+from livekit.plugins import silero
+from livekit.plugins.silero import onnx_model
+
+# Run every session's Silero windows as batches on dedicated threads ("0" keeps one inference thread per stream)
+VAD_BATCH = os.getenv("VAD_BATCH", "1") == "1"
+# How long a window may wait for others to join its batch
+VAD_BATCH_MAX_DELAY_MS = float(os.getenv("VAD_BATCH_MAX_DELAY_MS", "4"))
+# Windows run in one inference at most
+VAD_BATCH_MAX_SIZE = int(os.getenv("VAD_BATCH_MAX_SIZE", "64"))
+# Inference threads per process, all taking batches from the same queue
+VAD_BATCH_THREADS = int(os.getenv("VAD_BATCH_THREADS", "1"))
+
+
+class _StreamWindows:
+    """The audio context one VAD stream carries from window to window"""
+
+    def __init__(self, context_size: int):
+        self.context = np.zeros(context_size, dtype=np.float32)
+
+
+class VADBatcher:
+    """
+    Collects the inference windows of every VAD stream in the process and
+    runs them through one ONNX session as a batch, on threads of its own, so
+    inference never runs on the event loop and many small runs become a few
+    larger ones. A batch starts once it is full or its first window has
+    waited `max_delay` seconds.
+
+    Each stream has at most one window in flight (the plugin awaits every
+    result before cutting the next window), so a batch never holds two
+    windows of the same stream. Like the plugin's own OnnxModel, only the
+    audio context is carried between windows and the RNN state starts from
+    zero every time, so batched probabilities match unbatched ones.
+    """
+
+    def __init__(
+        self,
+        session,
+        sample_rate: int,
+        max_delay: float = VAD_BATCH_MAX_DELAY_MS / 1000,
+        max_batch: int = VAD_BATCH_MAX_SIZE,
+        threads: int = VAD_BATCH_THREADS,
+    ):
+        model = onnx_model.OnnxModel(onnx_session=session, sample_rate=sample_rate)
+        self.window_size = model.window_size_samples
+        self.context_size = model.context_size
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._session = session
+        self._sample_rate = np.array(sample_rate, dtype=np.int64)
+        self._zero_states: Dict[int, np.ndarray] = {}
+        self._pending: "queue.SimpleQueue[Tuple[_StreamWindows, np.ndarray, concurrent.futures.Future]]" = queue.SimpleQueue()
+        self.batches = 0
+        self.windows = 0
+        self._threads = [
+            threading.Thread(target=self._run, name=f"vad-batcher-{i}", daemon=True) for i in range(threads)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def executor(self) -> "_BatchedExecutor":
+        """Stand-in for one VAD stream's private inference thread"""
+        return _BatchedExecutor(self, _StreamWindows(self.context_size))
+
+    def submit(self, stream: _StreamWindows, window: np.ndarray) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        self._pending.put((stream, window, future))
+        return future
+
+    def close(self):
+        for _ in self._threads:
+            self._pending.put(None)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "windows": self.windows,
+            "mean_batch": round(self.windows / self.batches, 2) if self.batches else 0.0,
+        }
+
+    def _run(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._pending.get(timeout=remaining) if remaining > 0 else self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._pending.put(None)  # leave the stop for this thread's next turn
+                    break
+                batch.append(item)
+            self._infer(batch)
+
+    def _infer(self, batch: List[Tuple[_StreamWindows, np.ndarray, concurrent.futures.Future]]):
+        size = len(batch)
+        inputs = np.empty((size, self.context_size + self.window_size), dtype=np.float32)
+        for i, (stream, window, _) in enumerate(batch):
+            inputs[i, :self.context_size] = stream.context
+            inputs[i, self.context_size:] = window
+        state = self._zero_states.get(size)
+        if state is None:
+            state = self._zero_states[size] = np.zeros((2, size, 128), dtype=np.float32)
+
+        try:
+            out, _ = self._session.run(None, {"input": inputs, "state": state, "sr": self._sample_rate})
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.windows += size
+        for i, (stream, _, future) in enumerate(batch):
+            stream.context = inputs[i, -self.context_size:].copy()
+            future.set_result(float(out[i, 0]))
+
+
+class _BatchedExecutor(concurrent.futures.Executor):
+    """
+    Takes the place of a silero VADStream's single-thread executor: the
+    stream hands it its model and a window, and the window goes to the
+    shared batcher instead.
+    """
+
+    def __init__(self, batcher: VADBatcher, stream: _StreamWindows):
+        self._batcher = batcher
+        self._stream = stream
+
+    def submit(self, fn, window, /, *args, **kwargs) -> concurrent.futures.Future:
+        return self._batcher.submit(self._stream, window)
+
+
+class BatchedSileroVAD(silero.VAD):
+    """Silero VAD whose streams share one VADBatcher instead of each running inference alone"""
+
+    def __init__(self, *, session, opts) -> None:
+        super().__init__(session=session, opts=opts)
+        self.batcher = VADBatcher(session, opts.sample_rate)
+
+    def stream(self) -> silero.VADStream:
+        stream = super().stream()
+        # The stream's own executor was never started; the plugin only reaches it through run_in_executor
+        stream._executor.shutdown(wait=False)
+        stream._executor = self.batcher.executor()
+        return stream
@@ -0,0 +1,334 @@
+import os
+import sys
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from agent_runner import WORKER_MSG_PREFIX, AGENT_HOST_MAX_SESSIONS
+from structured_log import get_logger
+
+AGENT_RUNNER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent_runner.py")
+
+# How many already-initialized agent workers with spare capacity to keep around
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "2"))
+# How long a fresh worker may take to import plugins and load the VAD
+WORKER_READY_TIMEOUT = float(os.getenv("WORKER_READY_TIMEOUT", "60"))
+
+
+log = get_logger()
+
+
+class AgentWorker:
+    """A pre-warmed `agent_runner.py --worker` process we talk to over stdin/stdout"""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.pid = process.pid
+        self.spawned_at = time.monotonic()
+        self.ready = asyncio.Event()
+        self.max_sessions = 1
+        # (room, identity) -> job, for every session this worker is running
+        self.sessions: Dict[Tuple[str, str], dict] = {}
+        # room -> slots held for its personas that are still being dispatched
+        self.reserved: Dict[str, int] = {}
+        self._listeners: List[Callable[[dict], None]] = []
+        self._reader_task = asyncio.create_task(self._read_output())
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    @property
+    def free_slots(self) -> int:
+        return self.max_sessions - len(self.sessions) - sum(self.reserved.values())
+
+    def hosts(self, room_name: str) -> bool:
+        return room_name in self.reserved or any(key[0] == room_name for key in self.sessions)
+
+    def add_listener(self, callback: Callable[[dict], None]):
+        """Call `callback` with every structured message the worker sends"""
+        self._listeners.append(callback)
+
+    async def wait_for_event(self, event: str, timeout: Optional[float] = None, **match) -> dict:
+        """Wait until the worker reports `event` (with fields equal to `match`) and return it"""
+        future = asyncio.get_running_loop().create_future()
+
+        def _listener(msg: dict):
+            if msg.get("event") != event or future.done():
+                return
+            if all(msg.get(k) == v for k, v in match.items()):
+                future.set_result(msg)
+
+        self.add_listener(_listener)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._listeners.remove(_listener)
+
+    async def send(self, **msg):
+        """Send a JSON command line to the worker"""
+        self.process.stdin.write((json.dumps(msg) + "\n").encode())
+        await self.process.stdin.drain()
+
+    async def _read_output(self):
+        """Forward the worker's log output and dispatch its structured messages"""
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                break
+            text = line.decode(errors="replace").rstrip()
+            if not text.startswith(WORKER_MSG_PREFIX):
+                log.info("worker_output", text, worker=self.pid)
+                continue
+            try:
+                msg = json.loads(text[len(WORKER_MSG_PREFIX):])
+            except ValueError:
+                log.info("worker_output", text, worker=self.pid)
+                continue
+            event = msg.get("event")
+            if event == "ready":
+                self.max_sessions = msg.get("max_sessions", 1)
+                self.ready.set()
+            elif event in ("session_ended", "rejected"):
+                self.sessions.pop((msg.get("room"), msg.get("identity")), None)
+            for listener in list(self._listeners):
+                listener(msg)
+
+    async def stop(self, timeout: float = 5):
+        """Terminate the worker and wait for it to exit"""
+        if self.alive:
+            self.process.terminate()
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        self._reader_task.cancel()
+
+
+class WorkerPool:
+    """
+    Keeps `size` agent workers with spare capacity that have already imported
+    the plugins, loaded the VAD and built their provider clients, so joining a
+    room only costs an IPC message instead of a cold process start.
+
+    With `sessions_per_worker` > 1 every worker is a multi-room host; a pool of
+    one such worker per core runs many rooms while sharing each process's
+    model and HTTP session.
+    """
+
+    def __init__(
+        self,
+        size: int = AGENT_POOL_SIZE,
+        sessions_per_worker: int = AGENT_HOST_MAX_SESSIONS,
+        script: str = AGENT_RUNNER_SCRIPT,
+    ):
+        self.size = size
+        self.sessions_per_worker = sessions_per_worker
+        self.script = script
+        self._workers: Dict[int, AgentWorker] = {}
+        self._listeners: List[Callable[[dict], None]] = []
+        self._starting = 0
+        # room -> the cold start its concurrent dispatches wait on
+        self._placing: Dict[str, asyncio.Task] = {}
+        self._refill_needed = asyncio.Event()
+        self._refill_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start filling the pool in the background"""
+        self._refill_task = asyncio.create_task(self._refill_loop())
+        self._refill_needed.set()
+
+    async def wait_warm(self, timeout: float = WORKER_READY_TIMEOUT):
+        """Wait until the pool holds `size` ready workers with spare capacity"""
+        deadline = time.monotonic() + timeout
+        while self.idle_count < self.size:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Pool only warmed {self.idle_count}/{self.size} workers")
+            await asyncio.sleep(0.1)
+
+    @property
+    def idle_count(self) -> int:
+        """Ready workers that can still take a session"""
+        return sum(1 for w in self._workers.values() if w.alive and w.free_slots > 0)
+
+    @property
+    def active_sessions(self) -> int:
+        return sum(len(w.sessions) for w in self._workers.values())
+
+    @property
+    def worker_count(self) -> int:
+        return len(self._workers)
+
+    def add_listener(self, callback: Callable[[dict], None]):
+        """
+        Call `callback` with every structured message from any worker, plus a
+        synthesized "worker_exited" message when a worker process goes away.
+        """
+        self._listeners.append(callback)
+
+    def _emit(self, msg: dict):
+        for listener in list(self._listeners):
+            listener(msg)
+
+    async def _spawn(self) -> AgentWorker:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, self.script, "--worker",
+            "--max-sessions", str(self.sessions_per_worker),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        worker = AgentWorker(process)
+        try:
+            await asyncio.wait_for(worker.ready.wait(), WORKER_READY_TIMEOUT)
+        except asyncio.TimeoutError:
+            await worker.stop()
+            raise RuntimeError(f"Agent worker {worker.pid} did not become ready")
+        worker.add_listener(self._on_worker_message)
+        self._workers[worker.pid] = worker
+        asyncio.create_task(self._reap(worker))
+        return worker
+
+    async def _spawn_idle(self):
+        self._starting += 1
+        try:
+            worker = await self._spawn()
+            log.info("pool", f"Agent worker ready ({self.idle_count}/{self.size} idle)", worker=worker.pid)
+        except Exception as e:
+            log.error("pool", f"Failed to pre-warm agent worker: {e}")
+        finally:
+            self._starting -= 1
+
+    def _on_worker_message(self, msg: dict):
+        if msg.get("event") in ("session_ended", "rejected"):
+            self._refill_needed.set()
+        self._emit(msg)
+
+    async def _reap(self, worker: AgentWorker):
+        """Wait on the worker so it never lingers as a zombie, then report the exit"""
+        returncode = await worker.process.wait()
+        self._workers.pop(worker.pid, None)
+        self._refill_needed.set()
+        log.warning("pool", f"Agent worker exited with code {returncode}", worker=worker.pid, returncode=returncode)
+        self._emit({
+            "event": "worker_exited",
+            "pid": worker.pid,
+            "returncode": returncode,
+            "sessions": [list(key) for key in worker.sessions],
+        })
+
+    async def _refill_loop(self):
+        while True:
+            await self._refill_needed.wait()
+            self._refill_needed.clear()
+
+            # Retire finished workers beyond what we want to keep warm
+            empty = [w for w in self._workers.values() if w.alive and not w.sessions]
+            for worker in empty[self.size:]:
+                asyncio.create_task(worker.stop())
+
+            missing = self.size - self.idle_count - self._starting
+            if missing > 0:
+                await asyncio.gather(*(self._spawn_idle() for _ in range(missing)))
+
+    async def acquire(self, room_name: Optional[str] = None, slots: int = 1) -> AgentWorker:
+        """
+        Pick a ready worker with `slots` free and hold them for `room_name`,
+        spawning a cold one if none has room. A room lives on one worker, so
+        its personas share one process and its VAD/STT ingest: a worker that
+        already hosts it wins, and concurrent calls for a room that has none
+        yet wait on the same cold start. Otherwise the least-loaded worker
+        that fits all `slots` is used.
+        """
+        slots = min(slots, self.sessions_per_worker)
+        while room_name in self._placing:
+            await asyncio.wait([self._placing[room_name]])
+
+        candidates = [w for w in self._workers.values() if w.alive and w.free_slots >= slots]
+        same_room = [w for w in candidates if room_name is not None and w.hosts(room_name)]
+        if same_room:
+            worker = same_room[0]
+        elif candidates:
+            worker = max(candidates, key=lambda w: w.free_slots)
+        else:
+            log.warning("pool", "Agent pool empty, starting a cold worker", room=room_name)
+            spawn = asyncio.create_task(self._spawn())
+            if room_name is not None:
+                self._placing[room_name] = spawn
+                spawn.add_done_callback(lambda _: self._placing.pop(room_name, None))
+            # Resumes before the calls waiting on `spawn`, so the slots are held by the time they look
+            worker = await spawn
+        if room_name is not None:
+            worker.reserved[room_name] = worker.reserved.get(room_name, 0) + slots
+        self._refill_needed.set()
+        return worker
+
+    @asynccontextmanager
+    async def reserve(self, room_name: str, slots: int):
+        """
+        Hold `slots` sessions on one worker for the personas about to be
+        dispatched into `room_name` together; whatever they did not use is
+        given back on exit.
+        """
+        worker = await self.acquire(room_name, slots) if slots > 0 else None
+        try:
+            yield
+        finally:
+            if worker is not None:
+                worker.reserved.pop(room_name, None)
+                self._refill_needed.set()
+
+    async def dispatch(self, room_name: str, identity: str, agent_name: str, token: str) -> AgentWorker:
+        """Hand a room, persona and token to a pre-warmed worker"""
+        held = [w for w in self._workers.values() if w.alive and w.reserved.get(room_name)]
+        worker = held[0] if held else await self.acquire(room_name)
+        worker.reserved[room_name] -= 1
+        if not worker.reserved[room_name]:
+            del worker.reserved[room_name]
+        job = {"room": room_name, "identity": identity, "agent_name": agent_name}
+        # Take the slot before awaiting so concurrent joins don't overcommit
+        worker.sessions[(room_name, identity)] = job
+        await worker.send(cmd="start", token=token, **job)
+        return worker
+
+    async def stop_room(self, room_name: str, pids=None) -> int:
+        """
+        Ask every worker serving `room_name` to end those sessions. Callers that
+        already know which workers host the room pass their `pids`.
+        """
+        if pids is None:
+            workers = list(self._workers.values())
+        else:
+            workers = [self._workers[pid] for pid in pids if pid in self._workers]
+        stopped = 0
+        for worker in workers:
+            in_room = [key for key in worker.sessions if key[0] == room_name]
+            if not in_room or not worker.alive:
+                continue
+            log.info("pool", f"Stopping {len(in_room)} session(s)", room=room_name, worker=worker.pid)
+            await worker.send(cmd="stop", room=room_name)
+            stopped += len(in_room)
+        return stopped
+
+    async def reload_personas(self):
+        """Have every worker read the persona files now instead of at its next check"""
+        for worker in list(self._workers.values()):
+            if worker.alive:
+                await worker.send(cmd="reload_personas")
+
+    async def kill_worker(self, pid: int):
+        """Forcefully stop one worker, e.g. because it stopped sending heartbeats"""
+        worker = self._workers.get(pid)
+        if worker:
+            await worker.stop(timeout=2)
+
+    async def aclose(self):
+        """Stop the refill loop and every worker"""
+        if self._refill_task:
+            self._refill_task.cancel()
+        self._listeners.clear()
+        workers = list(self._workers.values())
+        self._workers.clear()
+        await asyncio.gather(*(w.stop() for w in workers), return_exceptions=True)